@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+from cash_flow_engine import DEFERRED_INTEREST_PAID
+
+
+PRINCIPAL_ACTIONS=("principal","principal_deferred_interest")
+
+INTEREST_ACTIONS=("interest","deferrable_interest","accrued_interest","residual","simple_residual",DEFERRED_INTEREST_PAID)
+
+METRICS=("wal","yield","modified_duration","irr")
+
+
+def tranche_cashflows(plan,payments):
+    """Per-tranche principal and interest flows, each ``(tranches, scenarios, periods)``.
+
+    ``payments`` is a ledger array ``(periods, columns)`` or a batch payment
+    array ``(periods, columns, scenarios)`` laid out by ``plan.columns``.
+    Principal-waterfall payments of deferred interest (``interest`` steps and
+    the ``DEFERRED_INTEREST_PAID`` part of ``principal_deferred_interest``
+    steps) count as interest;
+    coverage test cures are left out because the cure itself is paid
+    through the principal waterfall and recorded there.
+    """
+    payments=np.asarray(payments,dtype=float)
+    if payments.ndim==2:
+        payments=payments[:,:,None]
+    n_tranches=len(plan.tranche_names)
+    principal_map=np.zeros((n_tranches,len(plan.columns)))
+    interest_map=np.zeros((n_tranches,len(plan.columns)))
+    for col,(beneficiary,action) in enumerate(plan.columns):
+        tranche=plan.tranche_index.get(beneficiary)
+        if tranche is None:
+            continue
+        if action in PRINCIPAL_ACTIONS:
+            principal_map[tranche,col]=1.0
+        elif action in INTEREST_ACTIONS:
+            interest_map[tranche,col]=1.0
+    principal=np.einsum("tc,pcs->tsp",principal_map,payments)
+    interest=np.einsum("tc,pcs->tsp",interest_map,payments)
+    return principal,interest
+
+
+def default_prices(plan):
+    """Par for the rated notes, equity at closing for the residual tranche"""
+    prices=np.array(plan.initial_balances,dtype=float)
+    if plan.residual_tranche is not None:
+        prices[plan.tranche_index[plan.residual_tranche]]=plan.equity_at_closing
+    return prices
+
+
+def irr(cashflows,price,tol=1e-10,max_iter=50):
+    """Per-period IRR of ``cashflows[..., p]`` received at period p for ``price`` paid at period 0.
+
+    Every series is solved at once with Newton's method; series without
+    positive flows or price, or that do not converge, give NaN.
+    """
+    cashflows=np.asarray(cashflows,dtype=float)
+    price=np.broadcast_to(np.asarray(price,dtype=float),cashflows.shape[:-1])
+    periods=np.arange(cashflows.shape[-1],dtype=float)
+    total=cashflows.sum(axis=-1)
+    valid=(price>0) & (total>0)
+    with np.errstate(divide="ignore",invalid="ignore"):
+        mean_period=np.maximum((cashflows*periods).sum(axis=-1)/total,1.0)
+        rate=np.where(valid,(total/price)**(1/mean_period)-1,0.0)
+
+    converged=~valid
+    for _ in range(max_iter):
+        discount=(1+rate)[...,None]**-periods
+        npv=(cashflows*discount).sum(axis=-1)-price
+        slope=-(cashflows*periods*discount).sum(axis=-1)/(1+rate)
+        with np.errstate(divide="ignore",invalid="ignore"):
+            step=np.where(converged|(slope==0),0.0,npv/slope)
+        rate=np.maximum(rate-step,-0.99)
+        converged|=np.abs(step)<tol
+        if converged.all():
+            break
+    return np.where(valid&converged,rate,np.nan)
+
+
+def tranche_analytics(plan,payments,pay_freq,prices=None):
+    """WAL, yield, modified duration and IRR for every tranche in every scenario.
+
+    Returns ``(tranches, scenarios)`` arrays keyed by metric. Times are in
+    years from period 0, the period the residual hurdle discounts to.
+    ``yield`` is the IRR compounded ``pay_freq`` times a year, ``irr`` the
+    effective annual rate and ``modified_duration`` is taken at the yield.
+    ``prices`` defaults to ``default_prices(plan)``.
+    """
+    principal,interest=tranche_cashflows(plan,payments)
+    cashflows=principal+interest
+    prices=default_prices(plan) if prices is None else np.asarray(prices,dtype=float)
+    prices=np.broadcast_to(prices.reshape(prices.shape+(1,)*(2-prices.ndim)),cashflows.shape[:2])
+    periods=np.arange(cashflows.shape[-1],dtype=float)
+
+    with np.errstate(divide="ignore",invalid="ignore"):
+        wal=(principal*periods).sum(axis=-1)/principal.sum(axis=-1)/pay_freq
+        rate=irr(cashflows,prices)
+        discounted=cashflows*(1+rate)[...,None]**-periods
+        macaulay=(discounted*periods).sum(axis=-1)/discounted.sum(axis=-1)/pay_freq
+    return {
+        "wal":wal,
+        "yield":rate*pay_freq,
+        "modified_duration":macaulay/(1+rate),
+        "irr":(1+rate)**pay_freq-1,
+    }
+
+
+def engine_analytics(engine,prices=None):
+    """``tranche_analytics`` for a finished ``CashflowEngine`` (one scenario) or ``BatchCashflowEngine``"""
+    if hasattr(engine,"payments"):
+        return tranche_analytics(engine.plan,engine.payments,engine.pay_freq,prices)
+    return tranche_analytics(engine.plan,engine.dm.ledger.amounts,engine.dm.data["deal_info"]["payment_frequency"],prices)
+
+
+def analytics_frame(plan,metrics):
+    """Long table of ``tranche_analytics`` output: one row per (scenario, tranche)"""
+    n_tranches,n_scenarios=metrics["wal"].shape
+    table=pd.DataFrame({
+        "scenario":np.tile(np.arange(n_scenarios),n_tranches),
+        "tranche":np.repeat(np.array(plan.tranche_names,dtype=object),n_scenarios),
+    })
+    for metric in METRICS:
+        table[metric]=metrics[metric].ravel()
+    return table.sort_values(by=["scenario"],kind="stable").reset_index(drop=True)
@@ -0,0 +1,448 @@
+import pandas as pd
+import numpy as np
+
+from cash_flow_engine import CashflowEngine, DeferredInterestAccount, PaymentLedger, TrancheBook, DEFERRED_INTEREST_PAID, compile_plan
+from rate_paths import generate_sofr_paths
+from collateral import LoanTape, LoanCollateral
+from profiling import WaterfallProfiler
+
+
+class BatchCashflowEngine():
+    """Run the interest/principal waterfalls for many scenarios at once.
+
+    Every piece of deal state (collateral, tranche balances, deferred interest,
+    cash buckets) is held as an array with a trailing ``(n_scenarios,)`` axis so
+    each waterfall step executes once per period across all scenarios. The
+    step logic mirrors ``Interestwaterfallengine``/``Principalwaterfallengine``
+    scenario for scenario; scenarios drop out of the loop on their own when the
+    collateral is exhausted or the senior interest step defaults.
+    """
+
+    convert_date_to_period=staticmethod(CashflowEngine.convert_date_to_period)
+
+    def __init__(self,tranche_info,interest_waterfall_info,principal_payment_waterfall,coverage_test_info,prepayment_rates,default_rates,inputs_dict,sofr_paths=None,plan=None,
+                 sofr_model=None,sofr_seed=None,sofr_sampling="random",loan_tape=None,state=None):
+        self.tranche_info=tranche_info
+        self.interest_waterfall_info=interest_waterfall_info
+        self.principal_payment_waterfall=principal_payment_waterfall
+        self.coverage_test_info=coverage_test_info
+        self.inputs_dict=inputs_dict
+        if plan is None:
+            plan=compile_plan(tranche_info,interest_waterfall_info,principal_payment_waterfall,coverage_test_info)
+        self.plan=plan
+
+        prepayment_rates=np.atleast_1d(np.asarray(prepayment_rates,dtype=float))
+        default_rates=np.atleast_1d(np.asarray(default_rates,dtype=float))
+        reinvestment_period_end=np.atleast_1d(np.asarray(inputs_dict["reinvestment_period_end"]))
+        self.n_scenarios=int(np.broadcast_shapes(prepayment_rates.shape,default_rates.shape,reinvestment_period_end.shape)[0])
+        self.prepayment_rates=np.broadcast_to(prepayment_rates,(self.n_scenarios,))
+        self.default_rates=np.broadcast_to(default_rates,(self.n_scenarios,))
+        self.reinvestment_period_end=np.broadcast_to(reinvestment_period_end,(self.n_scenarios,))
+
+        self.pay_freq=inputs_dict["payment_frequency"]
+        self.portfolio_was=inputs_dict["portfolio_was"]
+        self.start_period=self.convert_date_to_period(inputs_dict["run_date"],inputs_dict["first_coupon_date"],self.pay_freq)
+        self.end_period=self.convert_date_to_period(inputs_dict["legal_maturity"],inputs_dict["first_coupon_date"],self.pay_freq)
+        self.loan_balloon_payments={20:0.30,28:0.30,35:1}
+
+        self.interest_waterfall=[(priority,action,getattr(self,"pay_"+handler),tranche) for priority,action,handler,tranche in plan.interest_steps]
+        self.principal_waterfall=[(priority,action,getattr(self,"distribute_"+handler),tranche) for priority,action,handler,tranche in plan.principal_steps]
+        self.profiler=None
+
+        if loan_tape is not None and not isinstance(loan_tape,LoanTape):
+            loan_tape=LoanTape.from_frame(loan_tape)
+        self.loan_tape=loan_tape
+        if loan_tape is not None:
+            self.loan_maturity=loan_tape.maturity_periods(lambda date:self.convert_date_to_period(date,inputs_dict["first_coupon_date"],self.pay_freq))
+
+        self.n_periods=self.end_period-self.start_period+1
+        self.sofr_model=sofr_model
+        self.sofr_seed=sofr_seed
+        self.sofr_sampling=sofr_sampling
+        if sofr_paths is None and state is not None:
+            sofr_paths=state.data["sofr"]
+        self.sofr_paths=self.sofr(self.n_periods) if sofr_paths is None else np.broadcast_to(np.asarray(sofr_paths,dtype=float),(self.n_scenarios,np.shape(sofr_paths)[-1]))
+        self.state=state
+        self.reset()
+
+    def enable_profiling(self,profiler=None):
+        """Attach a ``profiling.WaterfallProfiler`` to both waterfalls and return it; cash is summed over scenarios"""
+        profiler=WaterfallProfiler() if profiler is None else profiler
+        cash_at=lambda period,priority,action:float(self.payments[period,self.plan.step_columns[(priority,action)]].sum())
+        self.interest_waterfall=profiler.instrument("interest",[(priority,action,getattr(self,"pay_"+handler),tranche) for priority,action,handler,tranche in self.plan.interest_steps],cash_at)
+        self.principal_waterfall=profiler.instrument("principal",[(priority,action,getattr(self,"distribute_"+handler),tranche) for priority,action,handler,tranche in self.plan.principal_steps],cash_at)
+        self.profiler=profiler
+        return profiler
+
+    def disable_profiling(self):
+        self.interest_waterfall=[(priority,action,getattr(self,"pay_"+handler),tranche) for priority,action,handler,tranche in self.plan.interest_steps]
+        self.principal_waterfall=[(priority,action,getattr(self,"distribute_"+handler),tranche) for priority,action,handler,tranche in self.plan.principal_steps]
+        self.profiler=None
+
+    def sofr(self,periods):
+        return generate_sofr_paths(self.n_scenarios,periods+1,self.sofr_model,self.sofr_seed,self.sofr_sampling,self.pay_freq)
+
+    def reset(self):
+        n=self.n_scenarios
+        plan=self.plan
+        last_period=self.sofr_paths.shape[1]+1
+        self.collateral=None
+        self.interest_collections=None
+        if self.loan_tape is not None:
+            self.collateral=LoanCollateral(self.loan_tape,self.loan_maturity,self.pay_freq,self.end_period,self.default_rates,self.prepayment_rates,n_scenarios=n)
+            self.collateral_value=self.collateral.total()
+        else:
+            self.collateral_value=np.full(n,float(self.inputs_dict["current_collateral_value"]))
+        self.portfolio_value=np.full(n,float(self.inputs_dict["current_portfolio_value"]))
+        self.balances=np.repeat(plan.initial_balances[:,None],n,axis=1)
+        self.deferred_interest=np.zeros((len(plan.tranche_names),last_period+1,n))
+        self.payments=np.zeros((last_period+1,len(plan.columns),n))
+        self.reserves=np.zeros((last_period+1,n))
+        self.coverage_amounts=np.zeros((len(plan.coverage_groups),2,last_period+1,n))
+        self.coverage_failed=np.zeros((len(plan.coverage_groups),2,last_period+1,n),dtype=bool)
+        self.residual_discounted_sum=np.full(n,-plan.equity_at_closing)
+        self.residual_count=np.zeros(n,dtype=int)
+        self.written_down=np.zeros((len(plan.tranche_names),n))
+        self.live=np.ones(n,dtype=bool)
+        self.status=np.full(n,"running",dtype=object)
+        self.last_period=np.full(n,self.start_period-1)
+        if self.state is not None:
+            self.restore(self.state)
+
+    def restore(self,state):
+        """Put every scenario in the state of a ``CashflowEngine.snapshot()``; ``run()`` then continues from ``state.period+1``.
+
+        Only the periods after the snapshot see this engine's rates and SOFR
+        paths, so scenarios that agree up to a point can share one scalar
+        run of that prefix.
+        """
+        plan=self.plan
+        data=state.data
+        ledger=data["payment_history"]
+        rows=min(ledger.amounts.shape[0],self.payments.shape[0])
+        self.payments[:rows]=ledger.amounts[:rows,:,None]
+        self.balances[:]=data["tranches"].balances[:,None]
+        for name,account in data["deferred_interest"].items():
+            width=min(len(account.amounts),self.deferred_interest.shape[1])
+            self.deferred_interest[plan.tranche_index[name],:width]=account.amounts[:width,None]
+        for group,events in data["coverage_test_history"].items():
+            g=plan.coverage_groups.index(group)
+            for event in events[1:]:
+                j=("oc","ic").index(event["ic/oc"])
+                self.coverage_amounts[g,j,event["period"]]=event["amount"]
+                self.coverage_failed[g,j,event["period"]]=True
+        for period,amount in data["reserve_accounts"].items():
+            self.reserves[int(period)]=amount
+        self.collateral_value=np.full(self.n_scenarios,float(data["deal_info"]["current_collateral_value"]))
+        self.portfolio_value=np.full(self.n_scenarios,float(data["deal_info"]["current_portfolio_value"]))
+        if self.collateral is not None:
+            self.collateral.balances=np.repeat(state.collateral_balances[:,None],self.n_scenarios,axis=1)
+        if state.written_down is not None:
+            self.written_down[:]=state.written_down[:,None]
+        if plan.residual_tranche is not None:
+            col=plan.column_index[(plan.residual_tranche,"residual")]
+            recorded=np.flatnonzero(ledger.recorded[:,col])
+            r=0.12/self.pay_freq
+            self.residual_count[:]=len(recorded)
+            self.residual_discounted_sum[:]=-plan.equity_at_closing+sum(ledger.amounts[p,col]/((1+r) ** int(p)) for p in recorded)
+        self.last_period[:]=state.period
+
+    def record_payment(self,period,priority,action,amount,mask):
+        self.payments[period,self.plan.column_index[(priority,action)]]+=np.where(mask,amount,0.0)
+
+    def interest_due(self,tranche,sofr):
+        return self.balances[tranche]*(((sofr+self.plan.spreads[tranche])/100)/self.pay_freq)
+
+    def fee_mustpay(self,period,priority,interest_received):
+        payment_due=self.collateral_value*self.plan.spread_info[priority]
+        return np.where(interest_received >= payment_due,payment_due,0.0)
+
+    def current_pay(self,period,sofr,tranche,interest_received):
+        payment_due=self.interest_due(tranche,sofr)
+        amount_paid=np.minimum(payment_due,interest_received)
+        default=payment_due>interest_received
+        return {"amount_paid":amount_paid,"default":default}
+
+    def coverage_test(self,period,sofr,priority,interest_received,mask):
+        amount_paid_oc=np.zeros(self.n_scenarios)
+        amount_paid_ic=np.zeros(self.n_scenarios)
+        if self.interest_collections is None:
+            interest_received_without_deduction=self.collateral_value*((sofr+self.portfolio_was/100)/self.pay_freq)
+        else:
+            interest_received_without_deduction=self.interest_collections
+        tranche_oc_required=self.plan.oc_required[priority]
+        tranche_ic_required=self.plan.ic_required[priority]
+        group=self.plan.coverage_groups.index(priority)
+
+        principal_balances_of_rank=np.zeros(self.n_scenarios)
+        interest_due_of_rank=np.zeros(self.n_scenarios)
+        for tranche in self.plan.coverage_members[priority]:
+            principal_balances_of_rank=principal_balances_of_rank+self.balances[tranche]
+            interest_due_of_rank=interest_due_of_rank+self.interest_due(tranche,sofr)
+        tested=mask & (principal_balances_of_rank>0) & (interest_due_of_rank>0)
+
+        with np.errstate(divide="ignore",invalid="ignore"):
+            current_tranche_oc=np.where(tested,(self.collateral_value/principal_balances_of_rank)*100,0.0)
+            current_tranche_ic=np.where(tested,(interest_received_without_deduction/interest_due_of_rank)*100,0.0)
+
+        failed_oc=tested & (current_tranche_oc<tranche_oc_required)
+        if failed_oc.any():
+            cure_required=(principal_balances_of_rank*(tranche_oc_required/100))-(principal_balances_of_rank*(current_tranche_oc/100))
+            amount_paid_oc=np.where(failed_oc,np.minimum(interest_received,cure_required),0.0)
+            self.coverage_amounts[group,0,period]=np.where(failed_oc,amount_paid_oc,self.coverage_amounts[group,0,period])
+            self.coverage_failed[group,0,period]|=failed_oc
+            self.run_principal_waterfall(period,amount_paid_oc,failed_oc)
+            interest_received=interest_received-amount_paid_oc
+
+        failed_ic=tested & (current_tranche_ic<tranche_ic_required)
+        if failed_ic.any():
+            cure_required=(interest_due_of_rank*(tranche_ic_required/100))-(interest_due_of_rank*(current_tranche_ic/100))
+            amount_paid_ic=np.where(failed_ic,np.minimum(interest_received,cure_required),0.0)
+            self.coverage_amounts[group,1,period]=np.where(failed_ic,amount_paid_ic,self.coverage_amounts[group,1,period])
+            self.coverage_failed[group,1,period]|=failed_ic
+            self.run_principal_waterfall(period,amount_paid_ic,failed_ic)
+
+        return (amount_paid_oc,amount_paid_ic)
+
+    def deferrable_interest(self,period,sofr,tranche,interest_received):
+        payment_due=self.interest_due(tranche,sofr)
+        amount_paid=np.minimum(payment_due,interest_received)
+        deferred_interest=np.maximum(payment_due-amount_paid,0)
+        return {"amount_paid":amount_paid,"deferred_interest":deferred_interest}
+
+    def accrued_interest(self,period,tranche,interest_received):
+        payment_due=self.deferred_interest[tranche,period-1]
+        amount_paid=np.minimum(payment_due,interest_received)
+        deferred_interest=np.maximum(payment_due-amount_paid,0)
+        return {"amount_paid":amount_paid,"deferred_interest":deferred_interest}
+
+    def residual(self,period,tranche,interest_received):
+        r=0.12/self.pay_freq
+        payment_due=(-self.residual_discounted_sum)*((1+r) ** (period))
+        amount_paid=np.where(self.residual_count+1<=5,interest_received,np.maximum(np.minimum(payment_due,interest_received),0))
+        return np.where(self.balances[tranche]!=0,amount_paid,0.0)
+
+    def incentive(self,period,priority,interest_received):
+        return np.where(self.balances[self.plan.residual_index]!=0,0.20*interest_received,0.0)
+
+    def simple_residual(self,period,priority,incentive_paid,interest_received):
+        return np.where(incentive_paid!=0,interest_received,0.0)
+
+    def pay_fee_mustpay(self,period,sofr,priority,action,tranche,interest_received):
+        output=np.where(self.live,self.fee_mustpay(period,priority,interest_received),0.0)
+        self.record_payment(period,priority,action,output,self.live)
+        return interest_received-output
+
+    def pay_interest(self,period,sofr,priority,action,tranche,interest_received):
+        output=self.current_pay(period,sofr,tranche,interest_received)
+        defaulted=self.live & output["default"]
+        if defaulted.any():
+            self.status[defaulted]="default"
+            self.last_period[defaulted]=period
+            self.live=self.live & ~defaulted
+        amount_paid=np.where(self.live,output["amount_paid"],0.0)
+        self.record_payment(period,priority,action,amount_paid,self.live)
+        return interest_received-amount_paid
+
+    def pay_coverage_test(self,period,sofr,priority,action,tranche,interest_received):
+        output=self.coverage_test(period,sofr,priority,interest_received,self.live)
+        self.record_payment(period,priority,action,output[0]+output[1],self.live)
+        return interest_received
+
+    def pay_residual(self,period,sofr,priority,action,tranche,interest_received):
+        output=np.where(self.live,self.residual(period,tranche,interest_received),0.0)
+        self.record_payment(period,priority,action,output,self.live)
+        self.residual_discounted_sum=np.where(self.live,self.residual_discounted_sum+output/((1+0.12/self.pay_freq) ** (period)),self.residual_discounted_sum)
+        self.residual_count=self.residual_count+self.live
+        return interest_received-output
+
+    def pay_deferrable_interest(self,period,sofr,priority,action,tranche,interest_received):
+        output=self.deferrable_interest(period,sofr,tranche,interest_received)
+        amount_paid=np.where(self.live,output["amount_paid"],0.0)
+        self.record_payment(period,priority,action,amount_paid,self.live)
+        self.deferred_interest[tranche,period]+=np.where(self.live,output["deferred_interest"],0.0)
+        return interest_received-amount_paid
+
+    def pay_accrued_interest(self,period,sofr,priority,action,tranche,interest_received):
+        output=self.accrued_interest(period,tranche,interest_received)
+        amount_paid=np.where(self.live,output["amount_paid"],0.0)
+        self.record_payment(period,priority,action,amount_paid,self.live)
+        self.deferred_interest[tranche,period]+=np.where(self.live,output["deferred_interest"],0.0)
+        return interest_received-amount_paid
+
+    def pay_incentive(self,period,sofr,priority,action,tranche,interest_received):
+        output=np.where(self.live,self.incentive(period,priority,interest_received),0.0)
+        self.record_payment(period,priority,action,output,self.live)
+        return interest_received-output
+
+    def pay_simple_residual(self,period,sofr,priority,action,tranche,interest_received):
+        incentive_paid=self.incentive(period,priority,interest_received)
+        output=np.where(self.live,self.simple_residual(period,priority,incentive_paid,interest_received),0.0)
+        return interest_received-output
+
+    def run_interest_waterfall(self,period,sofr,interest_collections=None):
+        self.interest_collections=interest_collections
+        if interest_collections is None:
+            interest_received=self.collateral_value*(((sofr+self.portfolio_was)/100)/self.pay_freq)
+        else:
+            interest_received=interest_collections
+
+        for priority,action,handler,tranche in self.interest_waterfall:
+            interest_received=handler(period,sofr,priority,action,tranche,interest_received)
+
+        self.reserves[period]=np.where(self.live,interest_received,self.reserves[period])
+        self.record_payment(period,"reserves","reserves",interest_received,self.live)
+
+    def principal(self,period,tranche,principal_received):
+        curr_outstanding_principal=self.balances[tranche]
+        amount_paid=np.minimum(principal_received,curr_outstanding_principal)
+        return {"amount_paid":amount_paid,"updated_tranche_balance":curr_outstanding_principal-amount_paid}
+
+    def principal_deferred_interest_prorata(self,period,tranche,principal_received):
+        curr_outstanding_principal=self.balances[tranche]
+        deferred_interest=self.deferred_interest[tranche,period-1]
+        outstanding=curr_outstanding_principal!=0
+        with np.errstate(divide="ignore",invalid="ignore"):
+            total=curr_outstanding_principal+deferred_interest
+            prorata_principal=np.where(outstanding,np.minimum((curr_outstanding_principal/total)*principal_received,curr_outstanding_principal),0.0)
+            prorata_deferred_interest=np.where(outstanding,np.minimum((deferred_interest/total)*principal_received,curr_outstanding_principal),0.0)
+        amount_paid=np.minimum(principal_received,prorata_principal+prorata_deferred_interest)
+        return {"amount_paid":amount_paid,"prorata_principal":prorata_principal,"prorata_deferred_interest":prorata_deferred_interest,
+        "updated_tranche_balance":curr_outstanding_principal-prorata_principal}
+
+    def interest(self,period,tranche,principal_received):
+        payment_due=self.deferred_interest[tranche,period]
+        amount_paid=np.minimum(payment_due,principal_received)
+        return {"amount_paid":amount_paid,"deferred_interest":payment_due-amount_paid}
+
+    def distribute_principal(self,period,priority,action,tranche,principal_received,mask):
+        output=self.principal(period,tranche,principal_received)
+        self.record_payment(period,priority,action,output["amount_paid"],mask)
+        self.balances[tranche]=np.where(mask,output["updated_tranche_balance"],self.balances[tranche])
+        return principal_received-np.where(mask,output["amount_paid"],0.0)
+
+    def distribute_principal_deferred_interest(self,period,priority,action,tranche,principal_received,mask):
+        output=self.principal_deferred_interest_prorata(period,tranche,principal_received)
+        self.record_payment(period,priority,action,output["prorata_principal"],mask)
+        self.record_payment(period,priority,DEFERRED_INTEREST_PAID,output["prorata_deferred_interest"],mask)
+        self.balances[tranche]=np.where(mask,output["updated_tranche_balance"],self.balances[tranche])
+        self.deferred_interest[tranche,period]=np.where(mask,np.maximum(self.deferred_interest[tranche,period]-output["prorata_deferred_interest"],0.0),self.deferred_interest[tranche,period])
+        return principal_received-np.where(mask,output["amount_paid"],0.0)
+
+    def distribute_interest(self,period,priority,action,tranche,principal_received,mask):
+        output=self.interest(period,tranche,principal_received)
+        self.record_payment(period,priority,action,output["amount_paid"],mask)
+        self.deferred_interest[tranche,period+1]+=np.where(mask,output["deferred_interest"],0.0)
+        return principal_received-np.where(mask,output["amount_paid"],0.0)
+
+    def run_principal_waterfall(self,period,principal_received,mask):
+        principal_received=np.where(mask,principal_received,0.0)
+
+        for priority,action,handler,tranche in self.principal_waterfall:
+            principal_received=handler(period,priority,action,tranche,principal_received,mask)
+
+        self.reserves[period]=np.where(mask,principal_received,self.reserves[period])
+        self.record_payment(period,"reserves","reserves",principal_received,mask)
+        self.portfolio_value=self.balances.sum(axis=0)
+
+    def adjust_for_default(self,period):
+        default_amount=np.where(self.live,self.collateral_value*(self.default_rates/self.pay_freq),0.0)
+        self.write_down_defaults(default_amount)
+
+    def write_down_defaults(self,default_amount):
+        self.collateral_value=self.collateral_value-default_amount
+        for tranche in self.plan.risk_order:
+            amount_to_deduct=np.where((default_amount>0) & (self.balances[tranche]!=0),np.minimum(self.balances[tranche],default_amount),0.0)
+            self.balances[tranche]=self.balances[tranche]-amount_to_deduct
+            self.written_down[tranche]=self.written_down[tranche]+amount_to_deduct
+            default_amount=default_amount-amount_to_deduct
+        self.portfolio_value=self.balances.sum(axis=0)
+
+    def adjustment_to_collateral(self,period):
+        if self.collateral is not None:
+            self.write_down_defaults(self.collateral.default(period,self.live))
+            self.collateral_value=np.where(self.live,self.collateral.total(),self.collateral_value)
+            return self.collateral.principal(period)
+        self.adjust_for_default(period)
+        portfolio_percent_matured=self.loan_balloon_payments.get(period, 0)
+        ballon_payment=self.collateral_value*portfolio_percent_matured
+        prepaid_value=self.collateral_value*(self.prepayment_rates/4)
+        return {"prepaid_value":prepaid_value,"balloon_payment":ballon_payment}
+
+    def run(self):
+        self.reset()
+        period=self.start_period if self.state is None else self.state.period+1
+        while True:
+            finished=self.live & (self.collateral_value<=0)
+            self.status[finished]="complete"
+            self.live=self.live & ~finished
+            if not self.live.any():
+                break
+            if period-1>=self.sofr_paths.shape[1]:
+                self.status[self.live]="exhausted"
+                self.live=np.zeros(self.n_scenarios,dtype=bool)
+                break
+
+            sofr=self.sofr_paths[:,period-1]
+            self.last_period[self.live]=period
+            output=self.adjustment_to_collateral(period)
+            prepaid=output["prepaid_value"]
+            balloon=output["balloon_payment"]
+
+            interest_collections=None if self.collateral is None else self.collateral.interest(sofr)
+
+            self.run_interest_waterfall(period,sofr,interest_collections)
+            amortizing=self.live & (period>self.reinvestment_period_end)
+            if self.collateral is not None:
+                self.collateral.reinvest(self.live & ~amortizing)
+            if amortizing.any():
+                principal_received=np.where(amortizing,prepaid+balloon,0.0)
+                self.collateral_value=self.collateral_value-principal_received
+                if self.collateral is not None:
+                    self.collateral.pay_down(amortizing)
+                    self.collateral_value=np.where(amortizing,self.collateral.total(),self.collateral_value)
+                self.run_principal_waterfall(period,principal_received,amortizing)
+
+            period+=1
+
+    def payment_frame(self,scenario):
+        periods=np.arange(self.start_period,self.last_period[scenario]+1)
+        return pd.DataFrame(self.payments[periods,:,scenario],index=pd.RangeIndex(self.start_period,self.last_period[scenario]+1,name="period"),
+                            columns=[f"{priority}_{action}" for priority,action in self.plan.columns])
+
+    def scenario_data(self,scenario):
+        """Export one scenario in the CLODataManager.data layout"""
+        periods=np.arange(self.start_period,self.last_period[scenario]+1)
+        deferred_interest={}
+        for name,tranche in self.plan.tranche_index.items():
+            if self.deferred_interest[tranche,:,scenario].any():
+                account=DeferredInterestAccount(self.deferred_interest.shape[1]-1)
+                account.amounts[:]=self.deferred_interest[tranche,:,scenario]
+                account.recorded[:self.last_period[scenario]+2]=True
+                deferred_interest[name]=account
+        coverage_test_history={}
+        for g,group in enumerate(self.plan.coverage_groups):
+            events=[]
+            for p in periods.tolist():
+                for j,ic_oc in enumerate(("oc","ic")):
+                    if self.coverage_failed[g,j,p,scenario]:
+                        events.append({"period": p, "amount": float(self.coverage_amounts[g,j,p,scenario]), "ic/oc": ic_oc})
+            if events:
+                coverage_test_history[group]=[{"period": 0, "amount": 0,"ic/oc":0}]+events
+        payment_history=PaymentLedger(self.plan.columns,self.payments.shape[0]-1)
+        payment_history.amounts[periods]=self.payments[periods,:,scenario]
+        payment_history.recorded[periods]=True
+        return {
+            "deal_info": dict(self.inputs_dict,
+                              reinvestment_period_end=int(self.reinvestment_period_end[scenario]),
+                              initial_collateral_value=self.inputs_dict["initial_portfolio_value"],
+                              current_portfolio_value=float(self.portfolio_value[scenario]),
+                              current_collateral_value=float(self.collateral_value[scenario])),
+            "deferred_interest": deferred_interest,
+            "tranches": TrancheBook(self.plan,self.balances[:,scenario]),
+            "payment_history": payment_history,
+            "coverage_test_history": coverage_test_history,
+            "sofr": self.sofr_paths[scenario],
+            "reserve_accounts": {p:float(self.reserves[p,scenario]) for p in periods.tolist()},
+            "status": self.status[scenario],
+        }
@@ -0,0 +1,280 @@
+"""Throughput, memory and scaling benchmarks for the waterfall engines.
+
+    python benchmark.py                  # run every case, compare with the saved baseline
+    python benchmark.py --quick          # fewer repetitions
+    python benchmark.py --save-baseline  # store this run as the new baseline
+    python benchmark.py --cases sample,loans_5000
+
+Each case runs in a fresh process so its peak RSS is its own. Baselines are
+machine specific and live in .benchmarks/ (not committed); a baseline is only
+compared against runs made in the same ``--quick`` mode.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cash_flow_engine import CLODataManager, CashflowEngine, compile_plan, load_deal, default_inputs
+from batch_engine import BatchCashflowEngine
+from rate_paths import generate_sofr_paths
+from profiling import WaterfallProfiler
+
+
+DEFAULT_BASELINE=os.path.join(".benchmarks","baseline.json")
+
+# Higher is better for these metrics; anything else is compared lower-is-better.
+THROUGHPUT_METRICS=("scalar_periods_per_sec","scalar_scenarios_per_sec","batch_periods_per_sec","batch_scenarios_per_sec")
+
+
+def scale_tranches(deal,factor):
+    """Split every rated tranche into ``factor`` equal slices with the same rank, spread and coverage group"""
+    if factor==1:
+        return deal
+    tranche_info=deal["tranche_info"]
+    rated=set(tranche_info.dropna(subset=["Rank"])["Class"])
+    slices=lambda name:[f"{name}.{i+1}" for i in range(factor)] if name in rated else [name]
+
+    rows=[]
+    for _,row in tranche_info.iterrows():
+        for name in slices(row["Class"]):
+            row=row.copy()
+            if row["Class"] in rated:
+                row["Balance"]=row["Balance"]/factor
+            row["Class"]=name
+            rows.append(row)
+
+    def expand(waterfall):
+        steps=[(name,step["Condition"]) for _,step in waterfall.iterrows()
+               for name in (slices(step["Payment"]) if step["Condition"]!="coverage_test" else [step["Payment"]])]
+        return pd.DataFrame({"Priority":range(1,len(steps)+1),"Payment":[name for name,_ in steps],"Condition":[condition for _,condition in steps]})
+
+    return dict(deal,
+                tranche_info=pd.DataFrame(rows).reset_index(drop=True).astype(tranche_info.dtypes.to_dict()),
+                interest_waterfall_info=expand(deal["interest_waterfall_info"]),
+                principal_payment_waterfall=expand(deal["principal_payment_waterfall"]))
+
+
+def synthetic_loan_tape(n_loans,total_balance,first_maturity,last_maturity,seed=0):
+    rng=np.random.default_rng(seed)
+    balance=rng.lognormal(0,0.5,n_loans)
+    return pd.DataFrame({
+        "Loan ID":[f"L{i:05d}" for i in range(n_loans)],
+        "Balance":balance/balance.sum()*total_balance,
+        "Spread":rng.normal(3.36,0.5,n_loans).clip(1.5,7),
+        "Maturity":rng.integers(first_maturity,last_maturity+1,n_loans),
+        "Floor":np.where(rng.random(n_loans)<0.6,0.0,0.05),
+        "Default rate":np.where(rng.random(n_loans)<0.5,np.nan,rng.uniform(0,0.06,n_loans)),
+        "Prepayment rate":np.nan,
+    })
+
+
+CASES={
+    "sample":{"description":"clo_info.xlsx as shipped, pool collateral"},
+    "tranches_x4":{"description":"every rated tranche split in 4","tranche_factor":4},
+    "loans_500":{"description":"500-loan tape","n_loans":500},
+    "loans_5000":{"description":"5000-loan tape","n_loans":5000},
+    "long_horizon":{"description":"legal maturity +10y, 500-loan tape to the new maturity","n_loans":500,"extra_years":10},
+}
+
+
+def _case_inputs(spec):
+    deal=load_deal()
+    inputs=default_inputs()
+    if spec.get("extra_years"):
+        day,month,year=inputs["legal_maturity"].split("/")
+        inputs["legal_maturity"]=f"{day}/{month}/{int(year)+spec['extra_years']}"
+    deal=scale_tranches(deal,spec.get("tranche_factor",1))
+    loan_tape=None
+    if spec.get("n_loans"):
+        end_period=CashflowEngine.convert_date_to_period(inputs["legal_maturity"],inputs["first_coupon_date"],inputs["payment_frequency"])
+        loan_tape=synthetic_loan_tape(spec["n_loans"],inputs["current_collateral_value"],inputs["reinvestment_period_end"]+2,end_period)
+    return deal,inputs,loan_tape
+
+
+def _engine(deal,inputs,loan_tape,plan,dm,sofr_path,default_rate=0.02,prepayment_rate=0.02):
+    return CashflowEngine(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"],
+                          dm,prepayment_rate,default_rate,inputs,sofr_path=sofr_path,plan=plan,loan_tape=loan_tape)
+
+
+def _run(engine):
+    engine.run()
+    return engine.dm.ledger.last_period()
+
+
+def _best_of(fn,repeat=3):
+    times=[]
+    for _ in range(repeat):
+        start=time.perf_counter()
+        fn()
+        times.append(time.perf_counter()-start)
+    return min(times)
+
+
+def run_case(name,spec,scalar_runs,batch_scenarios):
+    """Measure one case; meant to run in its own process"""
+    deal,inputs,loan_tape=_case_inputs(spec)
+    plan=compile_plan(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"])
+    n_periods=CashflowEngine.convert_date_to_period(inputs["legal_maturity"],inputs["first_coupon_date"],inputs["payment_frequency"])+1
+    paths=generate_sofr_paths(max(scalar_runs,batch_scenarios),n_periods,seed=0)
+    default_rates=np.linspace(0.0,0.06,len(paths))
+
+    _run(_engine(deal,inputs,loan_tape,plan,CLODataManager(file_path=None),paths[0]))
+
+    periods=0
+    start=time.perf_counter()
+    for i in range(scalar_runs):
+        periods+=_run(_engine(deal,inputs,loan_tape,plan,CLODataManager(file_path=None),paths[i],default_rates[i]))
+    scalar_seconds=time.perf_counter()-start
+
+    start=time.perf_counter()
+    batch=BatchCashflowEngine(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"],
+                              0.02,default_rates[:batch_scenarios],inputs,sofr_paths=paths[:batch_scenarios],plan=plan,loan_tape=loan_tape)
+    batch.run()
+    batch_seconds=time.perf_counter()-start
+    batch_periods=int((batch.last_period-batch.start_period+1).sum())
+
+    engine=_engine(deal,inputs,loan_tape,plan,CLODataManager(file_path=None),paths[0])
+    profiler=engine.enable_profiling(WaterfallProfiler(per_period=False))
+    engine.adjustment_to_collateral=profiler.wrap("engine","collateral",engine.adjustment_to_collateral)
+    engine.dm.checkpoint=profiler.wrap("engine","checkpoint",engine.dm.checkpoint)
+    _run(engine)
+
+    tmp_dir=tempfile.mkdtemp(prefix="clo_bench.")
+    try:
+        dm=engine.dm
+        dm.file_path=os.path.join(tmp_dir,"clo_data.json")
+        save_data_seconds=_best_of(dm.save_data)
+        save_results_seconds=_best_of(lambda:dm.save_results(os.path.join(tmp_dir,"results")))
+    finally:
+        shutil.rmtree(tmp_dir,ignore_errors=True)
+
+    return {
+        "case":name,
+        "description":spec["description"],
+        "tranches":len(plan.tranche_names),
+        "waterfall_steps":len(plan.interest_steps)+len(plan.principal_steps),
+        "loans":0 if loan_tape is None else len(loan_tape),
+        "periods":n_periods-1,
+        "scalar_runs":scalar_runs,
+        "scalar_seconds":scalar_seconds,
+        "scalar_periods_per_sec":periods/scalar_seconds,
+        "scalar_scenarios_per_sec":scalar_runs/scalar_seconds,
+        "batch_scenarios":batch_scenarios,
+        "batch_seconds":batch_seconds,
+        "batch_periods_per_sec":batch_periods/batch_seconds,
+        "batch_scenarios_per_sec":batch_scenarios/batch_seconds,
+        "save_data_seconds":save_data_seconds,
+        "save_results_seconds":save_results_seconds,
+        "peak_rss_mb":resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024,
+        "step_split":profiler.split(),
+    }
+
+
+def run_benchmarks(cases,scalar_runs=20,batch_scenarios=2000):
+    """Run each case in a fresh spawned process and return its measurements in order"""
+    results=[]
+    context=multiprocessing.get_context("spawn")
+    for name in cases:
+        with ProcessPoolExecutor(max_workers=1,mp_context=context) as executor:
+            results.append(executor.submit(run_case,name,CASES[name],scalar_runs,batch_scenarios).result())
+    return results
+
+
+def load_baseline(path,quick):
+    """The saved baseline at ``path``, or None if there is none or it was recorded in the other ``--quick`` mode"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        baseline=json.load(f)
+    if bool(baseline.get("quick"))!=quick:
+        mode="quick" if baseline.get("quick") else "full"
+        print(f"baseline {path} is a {mode} run; not comparing (rerun with{'' if baseline.get('quick') else 'out'} --quick, or --save-baseline)")
+        return None
+    return baseline
+
+
+def compare(results,baseline,threshold=0.10):
+    """Regressions beyond ``threshold`` relative to ``baseline``, as (case, metric, baseline, current, change)"""
+    previous={result["case"]:result for result in baseline["results"]}
+    regressions=[]
+    for result in results:
+        before=previous.get(result["case"])
+        if before is None:
+            continue
+        for metric in THROUGHPUT_METRICS+("save_data_seconds","save_results_seconds","peak_rss_mb"):
+            old,new=before.get(metric),result.get(metric)
+            if not old or new is None:
+                continue
+            change=new/old-1
+            worse=-change if metric in THROUGHPUT_METRICS else change
+            if worse>threshold:
+                regressions.append((result["case"],metric,old,new,change))
+    return regressions
+
+
+def print_report(results,baseline=None):
+    previous={} if baseline is None else {result["case"]:result for result in baseline["results"]}
+    header=f"{'case':<14}{'tranches':>9}{'loans':>7}{'periods':>8}{'scalar p/s':>12}{'batch scen/s':>14}{'save_data s':>13}{'peak MB':>9}"
+    print(header)
+    print("-"*len(header))
+    for r in results:
+        line=(f"{r['case']:<14}{r['tranches']:>9}{r['loans']:>7}{r['periods']:>8}{r['scalar_periods_per_sec']:>12.0f}"
+              f"{r['batch_scenarios_per_sec']:>14.0f}{r['save_data_seconds']:>13.4f}{r['peak_rss_mb']:>9.0f}")
+        before=previous.get(r["case"])
+        if before:
+            line+=f"   vs baseline: scalar {r['scalar_periods_per_sec']/before['scalar_periods_per_sec']-1:+.1%}, batch {r['batch_scenarios_per_sec']/before['batch_scenarios_per_sec']-1:+.1%}"
+        print(line)
+    for r in results:
+        top=", ".join(f"{key} {share:.0%}" for key,share in list(r["step_split"].items())[:5])
+        print(f"  {r['case']}: {top}")
+
+
+def main(argv=None):
+    parser=argparse.ArgumentParser(description=__doc__,formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases",default=",".join(CASES),help="comma-separated subset of: "+", ".join(CASES))
+    parser.add_argument("--quick",action="store_true",help="fewer scalar runs and batch scenarios")
+    parser.add_argument("--baseline",default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline",action="store_true")
+    parser.add_argument("--threshold",type=float,default=0.10,help="relative slowdown reported as a regression")
+    parser.add_argument("--output",help="also write this run's results as JSON")
+    args=parser.parse_args(argv)
+
+    cases=[name.strip() for name in args.cases.split(",") if name.strip()]
+    unknown=[name for name in cases if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {unknown}")
+    scalar_runs,batch_scenarios=(5,500) if args.quick else (20,2000)
+
+    results=run_benchmarks(cases,scalar_runs,batch_scenarios)
+    run={"created":time.strftime("%Y-%m-%dT%H:%M:%S"),"python":platform.python_version(),"numpy":np.__version__,
+         "machine":platform.machine(),"quick":args.quick,"results":results}
+
+    baseline=load_baseline(args.baseline,args.quick)
+    print_report(results,baseline)
+
+    regressions=compare(results,baseline,args.threshold) if baseline else []
+    for case,metric,old,new,change in regressions:
+        print(f"REGRESSION {case} {metric}: {old:.4g} -> {new:.4g} ({change:+.1%})")
+
+    if args.output:
+        with open(args.output,"w") as f:
+            json.dump(run,f,indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)),exist_ok=True)
+        with open(args.baseline,"w") as f:
+            json.dump(run,f,indent=2)
+        print(f"baseline saved to {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__=="__main__":
+    raise SystemExit(main())
@@ -0,0 +1,250 @@
+import json
+import os
+import shutil
+import stat
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+CACHE_FORMAT=1
+
+_KIND_NA,_KIND_STR,_KIND_NUMBER,_KIND_TIMESTAMP=0,1,2,3
+
+
+def _json_scalar(obj):
+    if isinstance(obj,np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def replacement_mode(path,new_mode):
+    """Permission bits for a file or directory replacing ``path``: its current mode, or ``new_mode`` less the umask.
+
+    ``mkstemp``/``mkdtemp`` create owner-only entries, which an
+    ``os.replace`` onto ``path`` would otherwise carry over.
+    """
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask=os.umask(0)
+        os.umask(umask)
+        return new_mode & ~umask
+
+
+def _write_dir(directory,arrays,manifest):
+    """Write one .npy per array plus manifest.json, swapping the directory in atomically"""
+    directory=os.path.abspath(directory)
+    parent=os.path.dirname(directory)
+    os.makedirs(parent,exist_ok=True)
+    tmp_dir=tempfile.mkdtemp(dir=parent,prefix="."+os.path.basename(directory)+".")
+    try:
+        os.chmod(tmp_dir,replacement_mode(directory,0o777))
+        for name,values in arrays.items():
+            np.save(os.path.join(tmp_dir,name+".npy"),np.ascontiguousarray(values),allow_pickle=False)
+        manifest=dict(manifest,format=CACHE_FORMAT,arrays=sorted(arrays))
+        with open(os.path.join(tmp_dir,"manifest.json"),"w") as f:
+            json.dump(manifest,f,indent=2,default=_json_scalar)
+        if os.path.exists(directory):
+            old_dir=tempfile.mkdtemp(dir=parent,prefix="."+os.path.basename(directory)+".old.")
+            os.rmdir(old_dir)
+            os.replace(directory,old_dir)
+            os.replace(tmp_dir,directory)
+            shutil.rmtree(old_dir,ignore_errors=True)
+        else:
+            os.replace(tmp_dir,directory)
+    except BaseException:
+        shutil.rmtree(tmp_dir,ignore_errors=True)
+        raise
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory,"manifest.json")) as f:
+            manifest=json.load(f)
+    except (OSError,ValueError):
+        return None
+    if manifest.get("format")!=CACHE_FORMAT:
+        return None
+    return manifest
+
+
+def _read_dir(directory,mmap=True):
+    manifest=_read_manifest(directory)
+    if manifest is None:
+        return None,None
+    mode="r" if mmap else None
+    arrays={name:np.load(os.path.join(directory,name+".npy"),mmap_mode=mode,allow_pickle=False) for name in manifest["arrays"]}
+    return manifest,arrays
+
+
+def _encode_frame(prefix,frame):
+    """Split a frame into one array per column; text and mixed columns keep a per-cell kind tag"""
+    arrays={}
+    columns=[]
+    for i,column in enumerate(frame.columns):
+        key=f"{prefix}.{i}"
+        series=frame[column]
+        spec={"name":column,"dtype":str(series.dtype)}
+        if series.dtype.kind in "biufM":
+            arrays[key]=series.to_numpy()
+            spec["encoding"]="numeric"
+        else:
+            values=series.to_numpy(dtype=object)
+            kinds=np.full(len(values),_KIND_NA,dtype=np.int8)
+            text=np.full(len(values),"",dtype=object)
+            numbers=np.full(len(values),np.nan)
+            for j,value in enumerate(values):
+                if isinstance(value,str):
+                    kinds[j]=_KIND_STR
+                    text[j]=value
+                elif hasattr(value,"isoformat"):
+                    kinds[j]=_KIND_TIMESTAMP
+                    text[j]=value.isoformat()
+                elif not pd.isna(value):
+                    kinds[j]=_KIND_NUMBER
+                    numbers[j]=value
+            arrays[key+".kind"]=kinds
+            arrays[key+".str"]=text.astype(str)
+            arrays[key+".num"]=numbers
+            spec["encoding"]="tagged"
+        columns.append(spec)
+    return arrays,{"columns":columns,"length":len(frame)}
+
+
+def _decode_frame(prefix,spec,arrays):
+    data={}
+    for i,column in enumerate(spec["columns"]):
+        key=f"{prefix}.{i}"
+        if column["encoding"]=="numeric":
+            data[column["name"]]=np.asarray(arrays[key])
+            continue
+        kinds=np.asarray(arrays[key+".kind"])
+        values=np.full(len(kinds),np.nan,dtype=object)
+        is_str=kinds==_KIND_STR
+        is_number=kinds==_KIND_NUMBER
+        values[is_str]=np.asarray(arrays[key+".str"])[is_str].tolist()
+        values[is_number]=np.asarray(arrays[key+".num"])[is_number].tolist()
+        for j in np.flatnonzero(kinds==_KIND_TIMESTAMP):
+            values[j]=pd.Timestamp(str(arrays[key+".str"][j]))
+        data[column["name"]]=pd.Series(values,dtype=column["dtype"])
+    return pd.DataFrame(data,index=pd.RangeIndex(spec["length"]))
+
+
+def _source_stamp(source_path):
+    stat=os.stat(source_path)
+    return {"source":os.path.abspath(source_path),"source_mtime_ns":stat.st_mtime_ns,"source_size":stat.st_size}
+
+
+def save_deal(deal,directory,source_path):
+    """Store parsed deal sheets under ``directory``, stamped with the workbook's mtime and size"""
+    arrays={}
+    sheets={}
+    for name,frame in deal.items():
+        frame_arrays,spec=_encode_frame(name,frame)
+        arrays.update(frame_arrays)
+        sheets[name]=spec
+    _write_dir(directory,arrays,dict(_source_stamp(source_path),sheets=sheets))
+
+
+def load_cached_deal(directory,source_path):
+    """Parsed deal sheets from ``directory``, or None if missing, damaged or older than the workbook.
+
+    A reader racing another process's ``save_deal`` can also see a half
+    swapped directory; that reads as a miss too, so the caller re-parses.
+    """
+    try:
+        manifest=_read_manifest(directory)
+        if manifest is None:
+            return None
+        stamp=_source_stamp(source_path)
+        if manifest["source_mtime_ns"]!=stamp["source_mtime_ns"] or manifest["source_size"]!=stamp["source_size"]:
+            return None
+        _,arrays=_read_dir(directory,mmap=False)
+        if arrays is None:
+            return None
+        return {name:_decode_frame(name,spec,arrays) for name,spec in manifest["sheets"].items()}
+    except (OSError,ValueError,KeyError,EOFError):
+        return None
+
+
+def save_results(data,directory):
+    """Write a run's ``dm.data`` as columnar arrays: payments, coverage tests, deferred interest, SOFR and reserves"""
+    ledger=data["payment_history"]
+    arrays={
+        "payments":ledger.amounts,
+        "payments_recorded":ledger.recorded,
+        "payment_columns":np.array(ledger.labels(),dtype=str),
+        "payment_beneficiaries":np.array([beneficiary for beneficiary,_ in ledger.columns],dtype=str),
+        "payment_types":np.array([payment_type for _,payment_type in ledger.columns],dtype=str),
+    }
+
+    sofr=data["sofr"]
+    if isinstance(sofr,dict):
+        path=np.full(max(sofr,default=-1)+1,np.nan)
+        for period,rate in sofr.items():
+            path[int(period)]=rate
+        sofr=path
+    arrays["sofr"]=np.asarray(sofr,dtype=float)
+
+    reserves=data["reserve_accounts"]
+    arrays["reserve_periods"]=np.array(sorted(int(p) for p in reserves),dtype=np.int64)
+    arrays["reserve_amounts"]=np.array([reserves[p] for p in sorted(reserves,key=int)],dtype=float)
+
+    rows=[(tranche,event) for tranche,events in data["coverage_test_history"].items() for event in events]
+    arrays["coverage_tranche"]=np.array([tranche for tranche,_ in rows],dtype=str)
+    arrays["coverage_period"]=np.array([event["period"] for _,event in rows],dtype=np.int64)
+    arrays["coverage_type"]=np.array([event["ic/oc"] if isinstance(event["ic/oc"],str) else "" for _,event in rows],dtype=str)
+    arrays["coverage_amount"]=np.array([event["amount"] for _,event in rows],dtype=float)
+
+    accounts=data["deferred_interest"]
+    width=max((len(account.amounts) for account in accounts.values()),default=0)
+    amounts=np.zeros((len(accounts),width))
+    recorded=np.zeros((len(accounts),width),dtype=bool)
+    for i,account in enumerate(accounts.values()):
+        amounts[i,:len(account.amounts)]=account.amounts
+        recorded[i,:len(account.recorded)]=account.recorded
+    arrays["deferred_tranches"]=np.array(list(accounts),dtype=str)
+    arrays["deferred_amounts"]=amounts
+    arrays["deferred_recorded"]=recorded
+
+    manifest={"deal_info":data["deal_info"],"tranches":data["tranches"].to_dict()}
+    if "status" in data:
+        manifest["status"]=data["status"]
+    _write_dir(directory,arrays,manifest)
+
+
+def load_results(directory,mmap=True):
+    """Arrays written by ``save_results``, memory-mapped read-only by default.
+
+    Returns a dict of the arrays plus ``deal_info``, ``tranches`` and, for
+    batch runs, ``status`` from the manifest.
+    """
+    manifest,arrays=_read_dir(directory,mmap=mmap)
+    if manifest is None:
+        raise FileNotFoundError(f"no cached results in {directory}")
+    results=dict(arrays)
+    for key in ("deal_info","tranches","status"):
+        if key in manifest:
+            results[key]=manifest[key]
+    return results
+
+
+def payments_frame(results):
+    """Payments recorded in cached results, one row per period and one column per payment"""
+    periods=np.flatnonzero(np.asarray(results["payments_recorded"]).any(axis=1))
+    stop=int(periods[-1]) if len(periods) else 0
+    return pd.DataFrame(results["payments"][1:stop+1],index=pd.RangeIndex(1,stop+1,name="period"),
+                        columns=list(results["payment_columns"]),copy=False)
+
+
+def coverage_frame(results):
+    return pd.DataFrame({"tranche":results["coverage_tranche"],"period":results["coverage_period"],
+                         "test_type":results["coverage_type"],"diverted_amount":results["coverage_amount"]})
+
+
+def deferred_frame(results):
+    tranche,period=np.nonzero(np.asarray(results["deferred_recorded"]))
+    return pd.DataFrame({"tranche":np.asarray(results["deferred_tranches"])[tranche],"period":period,
+                         "differed_amount":np.asarray(results["deferred_amounts"])[tranche,period]})
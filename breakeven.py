@@ -0,0 +1,133 @@
+import numpy as np
+
+from cash_flow_engine import CLODataManager, CashflowEngine, compile_plan, default_inputs
+from batch_engine import BatchCashflowEngine
+from collateral import LoanTape
+from rate_paths import generate_sofr_paths
+
+
+SOLVED_RATES=("default_rate","prepayment_rate")
+
+SENIOR_INTEREST="senior_interest"
+
+UNRATED=("NR",)
+
+
+def rated_tranches(plan):
+    """Indices of the written-down tranches with a rating, leaving out unrated (NR) and residual tranches"""
+    return [tranche for tranche in sorted(set(plan.risk_order))
+            if plan.ratings[tranche] is not None and plan.ratings[tranche].split()[0].upper() not in UNRATED
+            and plan.tranche_names[tranche]!=plan.residual_tranche]
+
+
+def run_candidates(deal,inputs_dict,rate,candidates,fixed_rate,sofr_path,plan,loan_tape=None,state=None,par_tolerance=1.0):
+    """Run every candidate rate in one ``BatchCashflowEngine``.
+
+    Returns ``(impaired, senior_default)``: ``impaired`` is
+    ``(tranches, candidates)`` and is True where a tranche was written down
+    or still has more than ``par_tolerance`` outstanding at the end of the run;
+    ``senior_default`` is True where the senior interest step defaulted.
+    """
+    candidates=np.asarray(candidates,dtype=float)
+    rates={rate:candidates,[name for name in SOLVED_RATES if name!=rate][0]:fixed_rate}
+    engine=BatchCashflowEngine(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"],
+                               rates["prepayment_rate"],rates["default_rate"],inputs_dict,sofr_paths=sofr_path,plan=plan,loan_tape=loan_tape,state=state)
+    engine.run()
+    impaired=(engine.written_down>par_tolerance) | (engine.balances>par_tolerance)
+    return impaired,engine.status=="default"
+
+
+def _shared_prefix(deal,inputs_dict,rate,fixed_rate,sofr_path,plan,loan_tape):
+    """Snapshot after the periods every candidate agrees on, or None.
+
+    With pool collateral, prepayments during the reinvestment period are
+    reinvested without changing the pool, so prepayment candidates only
+    diverge after ``reinvestment_period_end``. Default rates apply from the
+    first period, so they share nothing.
+    """
+    if rate!="prepayment_rate" or loan_tape is not None:
+        return None
+    engine=CashflowEngine(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"],
+                          CLODataManager(file_path=None,persistence="never"),0.0,fixed_rate,inputs_dict,sofr_path=sofr_path,plan=plan)
+    try:
+        return engine.advance(inputs_dict["reinvestment_period_end"])
+    except RuntimeError:
+        return None
+
+
+def breakeven_rates(deal,rate="default_rate",inputs_dict=None,fixed_rate=0.02,sofr_path=None,sofr_seed=None,lower=0.0,upper=1.0,
+                    tol=1e-4,points=8,max_rounds=40,warm_start=None,state=None,par_tolerance=1.0):
+    """Breakeven ``default_rate`` or ``prepayment_rate`` for every rated tranche and for the senior interest default.
+
+    A tranche passes at a rate when it is neither written down nor left
+    outstanding; the ``"senior_interest"`` entry passes while the senior
+    ``interest`` step does not default. Each target's boundary is assumed
+    unique in ``[lower, upper]``. Every round runs ``points`` candidates
+    inside each open bracket as one batch, and every candidate narrows the
+    bracket of every target, so the table is built from a handful of batched
+    runs. ``warm_start`` maps targets to earlier breakevens (e.g. from a
+    neighbouring SOFR path) whose neighbourhood is tried first. The other
+    rate is held at ``fixed_rate``.
+
+    Returns ``{target: {"breakeven", "lower", "upper", "passes_below"}}``:
+    the boundary lies between the evaluated rates ``lower`` and ``upper``
+    and ``breakeven`` is whichever of them passes, or None when the target
+    passes or fails over the whole range. ``passes_below`` says which side
+    of the boundary passes.
+    """
+    if rate not in SOLVED_RATES:
+        raise ValueError(f"Unknown rate {rate!r}; expected one of {SOLVED_RATES}")
+    inputs_dict=default_inputs() if inputs_dict is None else inputs_dict
+    plan=compile_plan(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"])
+    loan_tape=deal.get("loan_tape")
+    if loan_tape is not None and not isinstance(loan_tape,LoanTape):
+        loan_tape=LoanTape.from_frame(loan_tape)
+    if sofr_path is None:
+        start=CashflowEngine.convert_date_to_period(inputs_dict["run_date"],inputs_dict["first_coupon_date"],inputs_dict["payment_frequency"])
+        end=CashflowEngine.convert_date_to_period(inputs_dict["legal_maturity"],inputs_dict["first_coupon_date"],inputs_dict["payment_frequency"])
+        sofr_path=generate_sofr_paths(1,end-start+2,seed=sofr_seed,periods_per_year=inputs_dict["payment_frequency"])[0]
+    if state is None:
+        state=_shared_prefix(deal,inputs_dict,rate,fixed_rate,sofr_path,plan,loan_tape)
+
+    rated=np.array(rated_tranches(plan),dtype=int)
+    targets=[plan.tranche_names[i] for i in rated]+[SENIOR_INTEREST]
+    tried=np.empty(0)
+    failed=np.empty((len(targets),0),dtype=bool)
+
+    def evaluate(candidates):
+        nonlocal tried,failed
+        candidates=np.setdiff1d(np.clip(np.asarray(candidates,dtype=float),lower,upper),tried)
+        if len(candidates)==0:
+            return
+        impaired,senior_default=run_candidates(deal,inputs_dict,rate,candidates,fixed_rate,sofr_path,plan,loan_tape,state,par_tolerance)
+        tried=np.concatenate([tried,candidates])
+        failed=np.concatenate([failed,np.vstack([impaired[rated],senior_default[None,:]])],axis=1)
+
+    evaluate([lower,upper]+[value*scale for value in (warm_start or {}).values() if value is not None for scale in (0.98,1.02)])
+
+    def brackets():
+        order=np.argsort(tried)
+        rates,outcome=tried[order],failed[:,order]
+        result={}
+        for t,target in enumerate(targets):
+            passes_below=not outcome[t,0]
+            if outcome[t,0]==outcome[t,-1]:
+                result[target]=(None,None,passes_below)
+                continue
+            flips=np.flatnonzero(outcome[t,1:]!=outcome[t,:-1])
+            result[target]=(rates[flips[0]],rates[flips[0]+1],passes_below)
+        return result
+
+    for _ in range(max_rounds):
+        open_brackets=[(lo,hi) for lo,hi,_ in brackets().values() if lo is not None and hi-lo>tol]
+        if not open_brackets:
+            break
+        evaluate(np.concatenate([np.linspace(lo,hi,points+2)[1:-1] for lo,hi in open_brackets]))
+
+    table={}
+    for target,(lo,hi,passes_below) in brackets().items():
+        if lo is None:
+            table[target]={"breakeven":None,"lower":lower,"upper":upper,"passes_below":passes_below}
+        else:
+            table[target]={"breakeven":float(lo if passes_below else hi),"lower":float(lo),"upper":float(hi),"passes_below":passes_below}
+    return table
@@ -2,16 +2,315 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
+from dataclasses import dataclass
+from types import MappingProxyType
 import json
+import os
+import tempfile
+
+import binary_cache
+import reporting
+from rate_paths import generate_sofr_paths
+from collateral import LoanTape, LoanCollateral, LOAN_TAPE_SHEET
+from profiling import WaterfallProfiler
+
+PERSISTENCE_POLICIES=("never","periodic","end")
+
+# Inputs CashflowEngine.rerun can change without starting over; the others set the initial state.
+RESUMABLE_INPUTS=("portfolio_was","reinvestment_period_end")
+
+DEFAULT_DEAL_PATH=os.path.join(os.path.dirname(os.path.abspath(__file__)),"clo_info.xlsx")
+
+DEAL_SHEETS={"tranche_info":"Tranche_info","interest_waterfall_info":"Interest_waterfall",
+             "coverage_test_info":"Coverage_test","principal_payment_waterfall":"Principal_waterfall"}
+
+OPTIONAL_DEAL_SHEETS={"loan_tape":LOAN_TAPE_SHEET}
+
+_deal_cache={}
+
+
+def deal_cache_dir(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)),".clo_cache",os.path.basename(path))
+
+
+def load_deal(path=DEFAULT_DEAL_PATH,cache_dir=None):
+    """Read the four deal sheets from one workbook open, cached by path and mtime.
+
+    Returns a dict keyed like ``DEAL_SHEETS``, plus ``loan_tape`` when the
+    workbook has a ``Loan_tape`` sheet. The frames are shared between
+    callers of the same cached workbook, so treat them as read-only.
+
+    Parsed sheets are also kept on disk in ``cache_dir`` (``.clo_cache/``
+    next to the workbook by default) and rebuilt when the workbook's mtime or
+    size changes. Pass ``cache_dir=False`` to always parse the workbook.
+    """
+    path=os.path.abspath(path)
+    mtime=os.stat(path).st_mtime_ns
+    cached=_deal_cache.get(path)
+    if cached is not None and cached[0]==mtime:
+        return dict(cached[1])
+    if cache_dir is None:
+        cache_dir=deal_cache_dir(path)
+    deal=binary_cache.load_cached_deal(cache_dir,path) if cache_dir else None
+    if deal is None:
+        with pd.ExcelFile(path) as xl:
+            wanted={**DEAL_SHEETS,**{key:sheet for key,sheet in OPTIONAL_DEAL_SHEETS.items() if sheet in xl.sheet_names}}
+            sheets=pd.read_excel(xl,sheet_name=list(wanted.values()))
+        deal={key:sheets[sheet] for key,sheet in wanted.items()}
+        if cache_dir:
+            try:
+                binary_cache.save_deal(deal,cache_dir,path)
+            except OSError:
+                pass
+    _deal_cache[path]=(mtime,deal)
+    return dict(deal)
+
+
+def default_inputs():
+    """Deal-level inputs for the sample presale in clo_info.xlsx"""
+    return {"initial_portfolio_value":554980000,"current_portfolio_value":554980000,"current_collateral_value":554980000,
+            "reinvestment_period_end":16,"portfolio_was":3.36,"first_coupon_date":"15/01/2026",
+            "payment_frequency":4,"legal_maturity":"15/12/2035","run_date":"15/12/2025"}
+
+
+class PaymentLedger:
+    """Period x payment-column cash ledger backed by preallocated arrays.
+
+    There is one column per distinct (beneficiary, type) pair of the compiled
+    waterfall and one row per period, so a payment is a single in-place add.
+    Iterating yields records in the ``payment_history`` dict layout, which is
+    also how the ledger is written to JSON.
+    """
+    def __init__(self,columns,n_periods):
+        self.columns=tuple(columns)
+        self.column_index={key:i for i,key in enumerate(self.columns)}
+        self.amounts=np.zeros((n_periods+1,len(self.columns)))
+        self.recorded=np.zeros((n_periods+1,len(self.columns)),dtype=bool)
+
+    def record(self,period,beneficiary,payment_type,amount):
+        col=self.column_index[(beneficiary,payment_type)]
+        self.amounts[period,col]+=amount
+        self.recorded[period,col]=True
+
+    def labels(self):
+        return [f"{beneficiary}_{payment_type}" for beneficiary,payment_type in self.columns]
+
+    def last_period(self):
+        periods=np.flatnonzero(self.recorded.any(axis=1))
+        return int(periods[-1]) if len(periods) else 0
+
+    def frame(self,start=None,stop=None):
+        """DataFrame view (no copy) of the period rows start..stop inclusive"""
+        start=1 if start is None else start
+        stop=self.last_period() if stop is None else stop
+        return pd.DataFrame(self.amounts[start:stop+1],index=pd.RangeIndex(start,stop+1,name="period"),columns=self.labels(),copy=False)
+
+    def totals(self):
+        return dict(zip(self.labels(),self.amounts.sum(axis=0).tolist()))
+
+    def copy(self):
+        ledger=PaymentLedger.__new__(PaymentLedger)
+        ledger.columns=self.columns
+        ledger.column_index=self.column_index
+        ledger.amounts=self.amounts.copy()
+        ledger.recorded=self.recorded.copy()
+        return ledger
+
+    def __len__(self):
+        return int(self.recorded.sum())
+
+    def __iter__(self):
+        for period,col in zip(*np.nonzero(self.recorded)):
+            beneficiary,payment_type=self.columns[col]
+            yield {"period": int(period), "type": payment_type, "beneficiary": beneficiary, "amount": float(self.amounts[period,col])}
+
+
+class DeferredInterestAccount:
+    """Deferred interest of one tranche, held as an array indexed by period.
+
+    ``balance_at(period)`` is a direct index, so it stays correct when a
+    tranche starts deferring mid-life or some periods never touch the
+    account. The interest waterfall carries the unpaid balance forward
+    period by period; deferred interest paid out of principal is taken off
+    with ``pay_down``. Iterating yields ``{"period", "amount"}`` records for every
+    period the account was written to, matching the JSON layout.
+    """
+    def __init__(self,n_periods):
+        self.amounts=np.zeros(n_periods+1)
+        self.recorded=np.zeros(n_periods+1,dtype=bool)
+        self.recorded[0]=True
+
+    def _ensure_capacity(self,period):
+        if period>=len(self.amounts):
+            extra=max(period+1,2*len(self.amounts))-len(self.amounts)
+            self.amounts=np.concatenate([self.amounts,np.zeros(extra)])
+            self.recorded=np.concatenate([self.recorded,np.zeros(extra,dtype=bool)])
+
+    def accrue(self,period,amount):
+        self._ensure_capacity(period)
+        self.amounts[period]+=amount
+        self.recorded[period]=True
+
+    def pay_down(self,period,amount):
+        """Take a payment off the balance at ``period``; it never goes below zero"""
+        self._ensure_capacity(period)
+        self.amounts[period]=max(self.amounts[period]-amount,0.0)
+        self.recorded[period]=True
+
+    def balance_at(self,period):
+        if 0<=period<len(self.amounts):
+            return self.amounts[period]
+        return 0.0
+
+    def copy(self):
+        account=DeferredInterestAccount.__new__(DeferredInterestAccount)
+        account.amounts=self.amounts.copy()
+        account.recorded=self.recorded.copy()
+        return account
+
+    def __iter__(self):
+        for period in np.flatnonzero(self.recorded):
+            yield {"period": int(period), "amount": float(self.amounts[period])}
+
+
+class RankAggregates:
+    """Tranche balances and balance*spread summed by rank, with prefix sums over rank.
+
+    Each balance change recomputes its rank bucket from the bucket's
+    members and refreshes the prefix sums from that rank up. A coverage
+    test then reads the "Rank <= rank" principal and interest due in O(1).
+    Buckets are summed from scratch rather than adjusted by deltas, so a
+    fully paid-down set of tranches aggregates to exactly zero.
+    """
+    def __init__(self,ranks,spreads):
+        self.levels=sorted({float(r) for r in ranks if not np.isnan(r)})
+        self.level_index={rank:i for i,rank in enumerate(self.levels)}
+        self.bucket=[self.level_index[float(r)] if not np.isnan(r) else -1 for r in ranks]
+        self.members=[[i for i,b in enumerate(self.bucket) if b==level] for level in range(len(self.levels))]
+        self.spreads=[float(x) for x in spreads]
+        self.balances=[0.0]*len(self.bucket)
+        self.bucket_balance=[0.0]*len(self.levels)
+        self.bucket_weighted=[0.0]*len(self.levels)
+        self.cum_balance=[0.0]*len(self.levels)
+        self.cum_weighted=[0.0]*len(self.levels)
+
+    def update(self,tranche,balance):
+        self.balances[tranche]=balance
+        level=self.bucket[tranche]
+        if level<0:
+            return
+        members=self.members[level]
+        self.bucket_balance[level]=sum(self.balances[i] for i in members)
+        self.bucket_weighted[level]=sum(self.balances[i]*self.spreads[i] for i in members)
+        for level in range(level,len(self.levels)):
+            below_balance=self.cum_balance[level-1] if level else 0.0
+            below_weighted=self.cum_weighted[level-1] if level else 0.0
+            self.cum_balance[level]=below_balance+self.bucket_balance[level]
+            self.cum_weighted[level]=below_weighted+self.bucket_weighted[level]
+
+    def balance_through(self,rank):
+        return self.cum_balance[self.level_index[rank]]
+
+    def interest_due_through(self,rank,sofr,pay_freq):
+        level=self.level_index[rank]
+        return ((sofr*self.cum_balance[level]+self.cum_weighted[level])/100)/pay_freq
+
+
+class TrancheBook:
+    """Tranche state of one run in parallel arrays, indexed like ``plan.tranche_names``.
+
+    Waterfall steps carry their tranche's index (resolved by ``compile_plan``),
+    so the handlers read and write ``balances`` and ``spreads`` by position.
+    ``to_dict`` gives the ``{name: {"Balance", "Rank"}}`` layout that is
+    written to JSON; ``from_dict`` reads it back.
+    """
+    __slots__=("names","index","balances","ranks","spreads")
+
+    def __init__(self,plan,balances=None):
+        self.names=plan.tranche_names
+        self.index=plan.tranche_index
+        self.balances=np.array(plan.initial_balances if balances is None else balances,dtype=float)
+        self.ranks=plan.ranks
+        self.spreads=plan.spreads
+
+    @classmethod
+    def from_dict(cls,plan,tranches):
+        """Book for ``plan`` with the balances of a loaded ``{name: {"Balance", ...}}`` dict; missing tranches start at par"""
+        book=cls(plan)
+        for name,info in tranches.items():
+            book.balances[book.index[name]]=info["Balance"]
+        return book
+
+    def total(self):
+        return sum(self.balances.tolist())
+
+    def balance_dict(self):
+        return dict(zip(self.names,self.balances.tolist()))
+
+    def to_dict(self):
+        return {name:{"Balance":balance,"Rank":rank} for name,balance,rank in zip(self.names,self.balances.tolist(),self.ranks.tolist())}
+
+    def copy(self):
+        book=TrancheBook.__new__(TrancheBook)
+        for name in TrancheBook.__slots__:
+            setattr(book,name,getattr(self,name))
+        book.balances=self.balances.copy()
+        return book
+
+    def __len__(self):
+        return len(self.names)
+
+
+def _copy_run_state(data):
+    """Copy of ``dm.data``: arrays are copied, event lists and small dicts one level deep"""
+    return {
+        "deal_info":dict(data["deal_info"]),
+        "deferred_interest":{name:account.copy() for name,account in data["deferred_interest"].items()},
+        "tranches":data["tranches"].copy() if isinstance(data["tranches"],TrancheBook) else {name:dict(info) for name,info in data["tranches"].items()},
+        "payment_history":data["payment_history"].copy(),
+        "coverage_test_history":{name:list(events) for name,events in data["coverage_test_history"].items()},
+        "sofr":np.array(data["sofr"],dtype=float),
+        "reserve_accounts":dict(data["reserve_accounts"]),
+    }
+
+
+def _json_default(obj):
+    if isinstance(obj,(PaymentLedger,DeferredInterestAccount)):
+        return list(obj)
+    if isinstance(obj,TrancheBook):
+        return obj.to_dict()
+    if isinstance(obj,np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
 
 class CLODataManager:
-    def __init__(self, file_path='clo_data.json'):
+    """In-memory store for one deal run.
+
+    ``persistence`` controls when the state is written to ``file_path``:
+    ``"never"``, ``"periodic"`` (every ``checkpoint_every`` periods and at the
+    end of the run) or ``"end"`` (once, when the run finishes or stops).
+    """
+    def __init__(self, file_path='clo_data.json', persistence="end", checkpoint_every=1):
+        if persistence not in PERSISTENCE_POLICIES:
+            raise ValueError(f"persistence must be one of {PERSISTENCE_POLICIES}, got {persistence!r}")
+        if checkpoint_every < 1:
+            raise ValueError(f"checkpoint_every must be >= 1, got {checkpoint_every}")
         self.file_path = file_path
+        self.persistence = persistence if file_path is not None else "never"
+        self.checkpoint_every = checkpoint_every
         self.data = None
+        self.ledger = None
+        self.tranches = None
+        self.n_periods = 0
+        self.rank_aggregates = None
 
         
     def load_data(self,initial_portfolio_value,current_portfolio_value,current_collateral_value,reinvestment_period_end,portfolio_was,first_coupon_date,payment_frequency,legal_maturity,run_date):
         """Load or initialize shared CLO data"""
+        if self.file_path is None:
+            self.data = self.initialize_defaults(initial_portfolio_value,current_portfolio_value,current_collateral_value,reinvestment_period_end,portfolio_was,first_coupon_date,payment_frequency,legal_maturity,run_date)
+            return
         try:
             with open(self.file_path, 'r') as f:
                 self.data = json.load(f)
@@ -42,8 +341,50 @@ class CLODataManager:
             }
 
     
-    def update_tranche_balance(self,tranche_name, new_balance):
-        self.data["tranches"][tranche_name]["Balance"]= new_balance
+    def init_ledger(self,columns,n_periods):
+        """Swap payment_history for a PaymentLedger, replaying any loaded records"""
+        records=self.data["payment_history"]
+        if not isinstance(records,PaymentLedger):
+            ledger=PaymentLedger(columns,n_periods)
+            for p in records:
+                ledger.record(p["period"],p["beneficiary"],p["type"],p["amount"])
+            self.data["payment_history"]=ledger
+        self.ledger=self.data["payment_history"]
+
+    def init_tranches(self,plan):
+        """Swap the tranche dict for a TrancheBook; an empty one starts every tranche at its initial balance"""
+        tranches=self.data["tranches"]
+        if not isinstance(tranches,TrancheBook):
+            self.data["tranches"]=TrancheBook.from_dict(plan,tranches)
+        self.tranches=self.data["tranches"]
+
+    def init_deferred_interest(self,n_periods):
+        """Convert loaded deferred-interest event lists into DeferredInterestAccounts"""
+        self.n_periods=n_periods
+        for tranche_name,events in self.data["deferred_interest"].items():
+            if not isinstance(events,DeferredInterestAccount):
+                account=DeferredInterestAccount(n_periods)
+                for info in events:
+                    account.accrue(info["period"],info["amount"])
+                self.data["deferred_interest"][tranche_name]=account
+
+    def snapshot(self):
+        return _copy_run_state(self.data)
+
+    def restore(self,snapshot):
+        """Make ``snapshot`` the current state; it is copied, so one snapshot can be restored many times"""
+        self.data=_copy_run_state(snapshot)
+        self.ledger=self.data["payment_history"]
+        tranches=self.data["tranches"]
+        self.tranches=tranches if isinstance(tranches,TrancheBook) else None
+
+    def update_tranche_balance(self,tranche, new_balance):
+        balances=self.tranches.balances
+        if balances[tranche]==new_balance:
+            return
+        balances[tranche]=new_balance
+        if self.rank_aggregates is not None:
+            self.rank_aggregates.update(tranche,new_balance)
 
     def update_coverage_test(self,period,tranche_name,amount,ic_oc):
         if tranche_name not in self.data["coverage_test_history"]:
@@ -55,18 +396,26 @@ class CLODataManager:
             "ic/oc":ic_oc
         })
     
+    def init_rank_aggregates(self,plan):
+        self.rank_aggregates=RankAggregates(plan.ranks,plan.spreads)
+        for tranche,balance in enumerate(self.tranches.balances.tolist()):
+            self.rank_aggregates.update(tranche,balance)
+
+    def deferred_interest_account(self, tranche_name):
+        account=self.data["deferred_interest"].get(tranche_name)
+        if account is None:
+            account=self.data["deferred_interest"][tranche_name]=DeferredInterestAccount(self.n_periods)
+        return account
+
+    def deferred_interest_balance(self, tranche_name, period):
+        account=self.data["deferred_interest"].get(tranche_name)
+        return 0 if account is None else account.balance_at(period)
+
     def add_deferred_interest(self, period, tranche_name, amount):
-        if tranche_name not in self.data["deferred_interest"]:
-            self.data["deferred_interest"][tranche_name] = [ {"period": 0, "amount": 0} ]
-
-        for info in self.data["deferred_interest"][tranche_name]:
-            if info["period"] == period:
-                info["amount"] += amount
-                return  
-        self.data["deferred_interest"][tranche_name].append({
-            "period": period,
-            "amount": amount
-        })
+        self.deferred_interest_account(tranche_name).accrue(period,amount)
+
+    def pay_down_deferred_interest(self, period, tranche_name, amount):
+        self.deferred_interest_account(tranche_name).pay_down(period,amount)
 
 
     def update_reserve_account(self,period,amount):
@@ -74,39 +423,199 @@ class CLODataManager:
 
     
     def record_payment(self, period, payment_type, beneficiary, amount):
-        self.data["payment_history"].append({
-            "period": period,
-            "type": payment_type,
-            "beneficiary": beneficiary,
-            "amount": amount
-        })
+        self.ledger.record(period,beneficiary,payment_type,amount)
     
+    def checkpoint(self, period, final=False):
+        if self.persistence=="never":
+            return
+        if final or (self.persistence=="periodic" and period % self.checkpoint_every == 0):
+            self.save_data()
+
+    def save_results(self,directory):
+        """Write the run as memory-mappable arrays; read back with ``binary_cache.load_results``"""
+        binary_cache.save_results(self.data,directory)
+
     def save_data(self):
-        with open(self.file_path, 'w') as f:
-            json.dump(self.data, f, indent=2)
+        """Write the state atomically: a crash mid-write leaves the previous file intact"""
+        if self.file_path is None:
+            return
+        directory=os.path.dirname(os.path.abspath(self.file_path))
+        fd,tmp_path=tempfile.mkstemp(dir=directory,prefix=".clo_data.",suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.data, f, indent=2, default=_json_default)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path,binary_cache.replacement_mode(self.file_path,0o666))
+            os.replace(tmp_path,self.file_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+INTEREST_STEP_HANDLERS={
+    "fee/must_pay":"fee_mustpay",
+    "interest":"interest",
+    "coverage_test":"coverage_test",
+    "residual":"residual",
+    "deferrable_interest":"deferrable_interest",
+    "accrued_interest":"accrued_interest",
+    "incentive":"incentive",
+    "simple_residual":"simple_residual",
+}
+
+PRINCIPAL_STEP_HANDLERS={
+    "principal":"principal",
+    "principal_deferred_interest":"principal_deferred_interest",
+    "interest":"interest",
+}
+
+# ledger column of the deferred interest paid by a principal_deferred_interest step; its principal part stays under the step's own column
+DEFERRED_INTEREST_PAID="deferred_interest_paid"
+
+
+@dataclass(frozen=True)
+class WaterfallPlan:
+    """Immutable, pandas-free view of the four deal sheets.
+
+    Built once by ``compile_plan`` and shared by every engine (scalar or
+    batched) running the deal, so nothing in the period loop has to index
+    a DataFrame.
+    """
+    tranche_names: tuple
+    tranche_index: MappingProxyType
+    initial_balances: np.ndarray
+    ranks: np.ndarray
+    spreads: np.ndarray
+    spread_info: MappingProxyType
+    ratings: tuple
+    risk_order: tuple
+    coverage_groups: tuple
+    coverage_rank: MappingProxyType
+    coverage_members: MappingProxyType
+    oc_required: MappingProxyType
+    ic_required: MappingProxyType
+    interest_steps: tuple
+    principal_steps: tuple
+    columns: tuple
+    column_index: MappingProxyType
+    step_columns: MappingProxyType
+    residual_tranche: str
+    residual_index: int
+    equity_at_closing: float
+
+
+def _frozen_array(values):
+    array=np.array(values,dtype=float)
+    array.flags.writeable=False
+    return array
+
+
+def _resolve_steps(waterfall,handlers,name,tranche_index):
+    """``(priority, action, handler, tranche)`` per row; ``tranche`` is the priority's tranche index, or None for fees and test groups"""
+    steps=[]
+    for priority,action in waterfall[["Payment", "Condition"]].itertuples(index=False, name=None):
+        if action not in handlers:
+            raise ValueError(f"Unknown {name} waterfall condition {action!r} for {priority!r}")
+        steps.append((priority,action,handlers[action],tranche_index.get(priority)))
+    return tuple(steps)
+
+
+def compile_plan(tranche_info,interest_waterfall_info,principal_payment_waterfall,coverage_test_info):
+    """Compile the deal sheets into a WaterfallPlan"""
+    df=tranche_info.dropna(subset=["Balance"])
+    tranche_names=tuple(df["Class"])
+    tranche_index={name:i for i,name in enumerate(tranche_names)}
+    ranks=df["Rank"].to_numpy(dtype=float)
+    spread_info=tranche_info.set_index("Class")["Spread or coupon"].to_dict()
+    spreads=[spread_info[name] if isinstance(spread_info[name],(int,float)) else np.nan for name in tranche_names]
+
+    interest_steps=_resolve_steps(interest_waterfall_info,INTEREST_STEP_HANDLERS,"interest",tranche_index)
+    principal_steps=_resolve_steps(principal_payment_waterfall,PRINCIPAL_STEP_HANDLERS,"principal",tranche_index)
+
+    tests_info=coverage_test_info.set_index("Class")[["O/C required","I/C required"]].to_dict(orient="index")
+    coverage_groups=tuple(priority for priority,action,handler,tranche in interest_steps if action=="coverage_test")
+    coverage_rank={}
+    coverage_members={}
+    for group in coverage_groups:
+        rank=tranche_info.loc[tranche_info["coverage_test_group"] == group,"Rank"].unique()[0]
+        coverage_rank[group]=float(rank)
+        coverage_members[group]=tuple(i for i,r in enumerate(ranks) if r <= rank)
+
+    risk_order=tranche_info.dropna(subset=["Preliminary rating"])["Class"][-1::-1]
+
+    columns=[]
+    step_keys={}
+    for priority,action,handler,tranche in interest_steps+principal_steps+(("reserves","reserves",None,None),):
+        keys=[(priority,action)]
+        if action=="principal_deferred_interest":
+            keys.append((priority,DEFERRED_INTEREST_PAID))
+        step_keys[(priority,action)]=keys
+        for key in keys:
+            if key not in columns:
+                columns.append(key)
+    column_index={key:i for i,key in enumerate(columns)}
+
+    residual_tranche=next((priority for priority,action,handler,tranche in interest_steps if action=="residual"),None)
+    equity_at_closing=float(df.loc[df["Class"] == residual_tranche,"Balance"].iloc[0]) if residual_tranche is not None else 0.0
+
+    return WaterfallPlan(
+        tranche_names=tranche_names,
+        tranche_index=MappingProxyType(tranche_index),
+        initial_balances=_frozen_array(df["Balance"]),
+        ranks=_frozen_array(ranks),
+        spreads=_frozen_array(spreads),
+        spread_info=MappingProxyType(spread_info),
+        ratings=tuple(rating if isinstance(rating,str) else None for rating in df["Preliminary rating"]),
+        risk_order=tuple(tranche_index[name] for name in risk_order),
+        coverage_groups=coverage_groups,
+        coverage_rank=MappingProxyType(coverage_rank),
+        coverage_members=MappingProxyType(coverage_members),
+        oc_required=MappingProxyType({group:tests_info[group]["O/C required"] for group in coverage_groups}),
+        ic_required=MappingProxyType({group:tests_info[group]["I/C required"] for group in coverage_groups}),
+        interest_steps=interest_steps,
+        principal_steps=principal_steps,
+        columns=tuple(columns),
+        column_index=MappingProxyType(column_index),
+        step_columns=MappingProxyType({step:[column_index[key] for key in keys] for step,keys in step_keys.items()}),
+        residual_tranche=residual_tranche,
+        residual_index=tranche_index.get(residual_tranche),
+        equity_at_closing=equity_at_closing,
+    )
 
 
 class Interestwaterfallengine:
 
-    def __init__(self,tranche_info,interest_payment_waterfall,coverage_tests,dm,principal_waterfall_engine):
-        self.tranche_info=tranche_info
-        self.interest_payment_waterfall=interest_payment_waterfall
-        self.coverage_tests=coverage_tests
+    def __init__(self,plan,dm,principal_waterfall_engine):
+        self.plan=plan
         self.dm=dm
         self.principal_engine=principal_waterfall_engine
+        self.waterfall=[(priority,action,getattr(self,"pay_"+handler),tranche) for priority,action,handler,tranche in plan.interest_steps]
+        self.profiler=None
+        self.residual_accounts={}
+        self.interest_collections=None
+        self.coverage_ratios={}
+
+    def set_profiler(self,profiler):
+        """Run wrapped handlers that report to ``profiler``, or the plain ones again when it is None"""
+        steps=[(priority,action,getattr(self,"pay_"+handler),tranche) for priority,action,handler,tranche in self.plan.interest_steps]
+        self.waterfall=steps if profiler is None else profiler.instrument("interest",steps,self.step_cash)
+        self.profiler=profiler
+
+    def step_cash(self,period,priority,action):
+        return float(self.dm.ledger.amounts[period,self.plan.step_columns[(priority,action)]].sum())
 
     def fee_mustpay(self,period,priority,interest_received):
-        spread_info=self.tranche_info.set_index("Class")["Spread or coupon"].to_dict()
         curr_outstanding_collateral=self.dm.data["deal_info"]["current_collateral_value"]
-        payment_due=curr_outstanding_collateral*spread_info[priority]
+        payment_due=curr_outstanding_collateral*self.plan.spread_info[priority]
         amount_paid=payment_due if interest_received >= payment_due else 0
         return amount_paid
 
 
-    def current_pay(self,period,sofr,pay_freq,priority,interest_received):
+    def current_pay(self,period,sofr,pay_freq,tranche,interest_received):
         default=None
-        spread_info=self.tranche_info.set_index("Class")["Spread or coupon"].to_dict()
-        payment_due=self.dm.data["tranches"][priority]["Balance"]*(((sofr+spread_info[priority])/100)/pay_freq)
+        tranches=self.dm.tranches
+        payment_due=tranches.balances[tranche]*(((sofr+tranches.spreads[tranche])/100)/pay_freq)
         amount_paid=min(payment_due,interest_received)
         if payment_due>interest_received:
             default=payment_due-interest_received
@@ -116,30 +625,26 @@ class Interestwaterfallengine:
     def coverage_test(self,period,sofr,pay_freq,priority,interest_received):
         amount_paid_ic=0
         amount_paid_oc=0
-        interest_received_without_deduction=(self.dm.data["deal_info"]["current_collateral_value"])*((sofr+self.dm.data["deal_info"]["portfolio_was"]/100)/pay_freq)
-        tests_info=self.coverage_tests.set_index("Class")[["O/C required","I/C required"]].to_dict(orient="index")
-        spread_info=self.tranche_info.set_index("Class")["Spread or coupon"].to_dict()
-        rank=self.tranche_info.loc[self.tranche_info["coverage_test_group"] == priority,
-                                        "Rank"].unique()[0]
-    
+        if self.interest_collections is None:
+            interest_received_without_deduction=(self.dm.data["deal_info"]["current_collateral_value"])*((sofr+self.dm.data["deal_info"]["portfolio_was"]/100)/pay_freq)
+        else:
+            interest_received_without_deduction=self.interest_collections
+        rank=self.plan.coverage_rank[priority]
 
-        principal_balances_of_rank=sum(info["Balance"]
-                                    for info in self.dm.data["tranches"].values()
-                                    if info["Rank"] <= rank)
+        principal_balances_of_rank=self.dm.rank_aggregates.balance_through(rank)
 
-        interest_due_of_rank=sum(v["Balance"]*(((sofr+spread_info[k])/100)/pay_freq)
-                                    for k,v in self.dm.data["tranches"].items()
-                                    if v["Rank"] <= rank)
+        interest_due_of_rank=self.dm.rank_aggregates.interest_due_through(rank,sofr,pay_freq)
         
         if principal_balances_of_rank >0 and interest_due_of_rank >0:
          
-            tranche_oc_required=tests_info[priority]["O/C required"]
-            tranche_ic_required=tests_info[priority]["I/C required"]
+            tranche_oc_required=self.plan.oc_required[priority]
+            tranche_ic_required=self.plan.ic_required[priority]
     
             current_tranche_oc=(self.dm.data["deal_info"]["current_collateral_value"]/principal_balances_of_rank)*100
 
 
             current_tranche_ic=(interest_received_without_deduction/interest_due_of_rank)*100
+            self.coverage_ratios[priority]={"oc":float(current_tranche_oc),"ic":float(current_tranche_ic),"oc_cure":0.0,"ic_cure":0.0}
         
             if current_tranche_oc<tranche_oc_required:
                 
@@ -147,6 +652,7 @@ class Interestwaterfallengine:
                 amount_paid_oc=min(interest_received,cure_required)
 
                 self.dm.update_coverage_test(period,priority,amount_paid_oc,"oc")
+                self.coverage_ratios[priority]["oc_cure"]=float(amount_paid_oc)
                 self.principal_engine.run_principal_waterfall(period,amount_paid_oc)
                 interest_received-=amount_paid_oc
                 
@@ -154,6 +660,7 @@ class Interestwaterfallengine:
                 cure_required=(interest_due_of_rank*(tranche_ic_required/100))-(interest_due_of_rank*(current_tranche_ic/100))
                 amount_paid_ic=min(interest_received,cure_required)
                 self.dm.update_coverage_test(period,priority,amount_paid_ic,"ic")
+                self.coverage_ratios[priority]["ic_cure"]=float(amount_paid_ic)
                 self.principal_engine.run_principal_waterfall(period,amount_paid_ic)
                 interest_received-=amount_paid_ic
         
@@ -161,17 +668,16 @@ class Interestwaterfallengine:
 
         return (amount_paid_oc,amount_paid_ic)
     
-    def deferrable_interest(self,period,sofr,pay_freq,priority,interest_received):
-        spread_info=self.tranche_info.set_index("Class")["Spread or coupon"].to_dict()
-
-        payment_due=self.dm.data["tranches"][priority]["Balance"]*(((sofr+spread_info[priority])/100)/pay_freq)
+    def deferrable_interest(self,period,sofr,pay_freq,tranche,interest_received):
+        tranches=self.dm.tranches
+        payment_due=tranches.balances[tranche]*(((sofr+tranches.spreads[tranche])/100)/pay_freq)
         amount_paid=min(payment_due,interest_received)
         deferred_interest=max(payment_due-amount_paid,0)
         return {"amount_paid":amount_paid,"deferred_interest":deferred_interest}
     
     def accrued_interest(self,period,priority,interest_received):
         if priority in self.dm.data["deferred_interest"]:
-            payment_due=self.dm.data["deferred_interest"][priority][period-1]["amount"]
+            payment_due=self.dm.data["deferred_interest"][priority].balance_at(period-1)
             amount_paid=min(payment_due,interest_received)
             deferred_interest=max(payment_due-amount_paid,0)
         else:
@@ -179,27 +685,39 @@ class Interestwaterfallengine:
 
         return {"amount_paid":amount_paid,"deferred_interest":deferred_interest}
     
-    def residual(self, period, priority,action, interest_received):
+    def residual_account(self,priority,action):
+        """Running count and 12% discounted sum of the equity cashflows, closing outflow included.
+
+        Built from the ledger the first time it is needed (so a run resumed
+        from JSON picks up earlier payments), then updated in O(1) by
+        pay_residual as each period's payment is recorded.
+        """
+        account=self.residual_accounts.get(priority)
+        if account is None:
+            r = 0.12/self.dm.data["deal_info"]["payment_frequency"]
+            account={"cashflows":1,"discounted_sum":0}
+            account["discounted_sum"]+=-self.plan.equity_at_closing/((1+r) ** 0)
+            col=self.dm.ledger.column_index[(priority,action)]
+            for p in np.flatnonzero(self.dm.ledger.recorded[:,col]):
+                account["cashflows"]+=1
+                account["discounted_sum"]+=self.dm.ledger.amounts[p,col]/((1+r) ** int(p))
+            self.residual_accounts[priority]=account
+        return account
+
+    def residual(self, period, priority,action,tranche, interest_received):
         amount_paid=0
-        if self.dm.data["tranches"][priority]["Balance"]!=0:
-            equity_at_closing = float(
-                self.tranche_info.loc[self.tranche_info["Class"] == priority, "Balance"].iloc[0]
-            )
-            cashflows = [(-equity_at_closing,0)]
-            for p in self.dm.data["payment_history"]:
-                if p["beneficiary"] == priority and p["type"]==action:
-                    cashflows.append((p["amount"], p["period"]))
+        if self.dm.tranches.balances[tranche]!=0:
+            account=self.residual_account(priority,action)
             
             freq = self.dm.data["deal_info"]["payment_frequency"] # quarterly discount factor
             r = 0.12/freq
 
-            if len(cashflows)<=5:
+            if account["cashflows"]<=5:
                  # ~3% per quarter
                 amount_paid = interest_received
                 return amount_paid
 
-            discounted_sum = sum(cf / ((1+r) ** (t)) for cf, t in cashflows)
-            payment_due = (-discounted_sum) * ((1+r) ** (period))
+            payment_due = (-account["discounted_sum"]) * ((1+r) ** (period))
             amount_paid = max(min(payment_due, interest_received),0)
         
         return amount_paid
@@ -207,7 +725,7 @@ class Interestwaterfallengine:
 
     def incentive(self,period,priority,interest_received):
         amount_paid=0
-        if self.dm.data["tranches"]["Subordinated notes"]["Balance"]!=0:
+        if self.dm.tranches.balances[self.plan.residual_index]!=0:
             amount_paid=0.20*interest_received
         return amount_paid
     
@@ -216,67 +734,71 @@ class Interestwaterfallengine:
         if incentive_paid!=0:
             amount_paid=interest_received
 
-            for p in self.dm.data["payment_history"]:
-                if p["beneficiary"]==priority and p["period"]==period and p["type"]==action:
-                    p["amount"]+=amount_paid
+            col=self.dm.ledger.column_index[(priority,action)]
+            if self.dm.ledger.recorded[period,col]:
+                self.dm.ledger.amounts[period,col]+=amount_paid
         
         return amount_paid
 
-   
+    def pay_fee_mustpay(self,period,sofr,pay_freq,priority,action,tranche,interest_received):
+        output=self.fee_mustpay(period,priority,interest_received)
+        self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output)
+        return interest_received-output
+
+    def pay_interest(self,period,sofr,pay_freq,priority,action,tranche,interest_received):
+        output=self.current_pay(period,sofr,pay_freq,tranche,interest_received)
+        if output["default"]:
+            self.dm.checkpoint(period,final=True)
+            raise RuntimeError(f"STOP: senior tranche payment due / default at period {period}")
+        self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output["amount_paid"])
+        return interest_received-output["amount_paid"]
+
+    def pay_coverage_test(self,period,sofr,pay_freq,priority,action,tranche,interest_received):
+        output=self.coverage_test(period,sofr,pay_freq,priority,interest_received)
+        self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=sum(output))
+        return interest_received
+
+    def pay_residual(self,period,sofr,pay_freq,priority,action,tranche,interest_received):
+        account=self.residual_account(priority,action)
+        output=self.residual(period,priority,action,tranche,interest_received)
+        self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output)
+        account["cashflows"]+=1
+        account["discounted_sum"]+=output/((1+0.12/self.dm.data["deal_info"]["payment_frequency"]) ** (period))
+        return interest_received-output
+
+    def pay_deferrable_interest(self,period,sofr,pay_freq,priority,action,tranche,interest_received):
+        output=self.deferrable_interest(period,sofr,pay_freq,tranche,interest_received)
+        self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output["amount_paid"])
+        self.dm.add_deferred_interest(period,tranche_name=priority,amount=output["deferred_interest"])
+        return interest_received-output["amount_paid"]
+
+    def pay_accrued_interest(self,period,sofr,pay_freq,priority,action,tranche,interest_received):
+        output=self.accrued_interest(period,priority,interest_received)
+        self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output["amount_paid"])
+        self.dm.add_deferred_interest(period,tranche_name=priority,amount=output["deferred_interest"])
+        return interest_received-output["amount_paid"]
+
+    def pay_incentive(self,period,sofr,pay_freq,priority,action,tranche,interest_received):
+        output=self.incentive(period,priority,interest_received)
+        self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output)
+        return interest_received-output
+
+    def pay_simple_residual(self,period,sofr,pay_freq,priority,action,tranche,interest_received):
+        incentive_paid=self.incentive(period,priority,interest_received)
+        output=self.simple_residual(period,priority,action,incentive_paid,interest_received)
+        return interest_received-output
         
-    def run_interest_waterfall(self,period,sofr,pay_freq):
-        waterfall=list(self.interest_payment_waterfall[["Payment", "Condition"]].itertuples(index=False, name=None))
-        
-        interest_received=self.dm.data["deal_info"]["current_collateral_value"]*(((sofr+self.dm.data["deal_info"]["portfolio_was"])/100)/pay_freq)
-
-
-
-        for priority,action in waterfall:
-            if action in ("fee/must_pay"):
-                output=self.fee_mustpay(period,priority,interest_received)
-                interest_received-=output
-                self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output)
-            elif action in ["interest"]:
-                output=self.current_pay(period,sofr,pay_freq,priority,interest_received)
-                if output["default"]:
-                    self.dm.save_data()
-                    raise RuntimeError(f"STOP: senior tranche payment due / default at period {period}")
-                interest_received-=output["amount_paid"]
-                self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output["amount_paid"])
-            elif action in ["coverage_test"]:
-                output=self.coverage_test(period,sofr,pay_freq,priority,interest_received)
-                self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=sum(output))
-            
-            elif action in ["residual"]:
-                output=self.residual(period,priority,action,interest_received)
-                interest_received-=output
-                self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output)
-        
-    
-            elif action in ["deferrable_interest"]:
-                output=self.deferrable_interest(period,sofr,pay_freq,priority,interest_received)
-                interest_received-=output["amount_paid"]
-                self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output["amount_paid"])
-                self.dm.add_deferred_interest(period,tranche_name=priority,amount=output["deferred_interest"])
-
-            elif action in ["accrued_interest"]:
-                output=self.accrued_interest(period,priority,interest_received)
-                interest_received-=output["amount_paid"]
-                self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output["amount_paid"])
-                self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output["amount_paid"])
-                self.dm.add_deferred_interest(period,tranche_name=priority,amount=output["deferred_interest"])
-                
-            
-            elif action in ["incentive"]:
-                output=self.incentive(period,priority,interest_received)
-                interest_received-=output
-                self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output)
-
-            elif action in ["simple_residual"]:
-                incentive_paid=self.incentive(period,priority,interest_received)
-                output=self.simple_residual(period,priority,action,incentive_paid,interest_received)
-                interest_received-=output
+    def run_interest_waterfall(self,period,sofr,pay_freq,interest_collections=None):
+        """Distribute the period's interest; loan-level collateral passes its collections in, the pool model derives them from the WAS"""
+        self.interest_collections=interest_collections
+        self.coverage_ratios={}
+        if interest_collections is None:
+            interest_received=self.dm.data["deal_info"]["current_collateral_value"]*(((sofr+self.dm.data["deal_info"]["portfolio_was"])/100)/pay_freq)
+        else:
+            interest_received=interest_collections
 
+        for priority,action,handler,tranche in self.waterfall:
+            interest_received=handler(period,sofr,pay_freq,priority,action,tranche,interest_received)
 
         self.dm.update_reserve_account(period,interest_received)
         self.dm.record_payment(period,payment_type="reserves",beneficiary="reserves",amount=interest_received)
@@ -290,24 +812,33 @@ class Interestwaterfallengine:
 class Principalwaterfallengine():
 
     
-    def __init__(self,tranche_info,principal_payment_waterfall,dm):
-        self.tranche_info=tranche_info
-        self.principal_payment_waterfall=principal_payment_waterfall
+    def __init__(self,plan,dm):
+        self.plan=plan
         self.dm=dm
+        self.waterfall=[(priority,action,getattr(self,"pay_"+handler),tranche) for priority,action,handler,tranche in plan.principal_steps]
+        self.profiler=None
+
+    def set_profiler(self,profiler):
+        steps=[(priority,action,getattr(self,"pay_"+handler),tranche) for priority,action,handler,tranche in self.plan.principal_steps]
+        self.waterfall=steps if profiler is None else profiler.instrument("principal",steps,self.step_cash)
+        self.profiler=profiler
+
+    def step_cash(self,period,priority,action):
+        return float(self.dm.ledger.amounts[period,self.plan.step_columns[(priority,action)]].sum())
 
-    def principal(self,period,priority,principal_received):
+    def principal(self,period,tranche,principal_received):
         
-        curr_outstanding_principal=self.dm.data["tranches"][priority]["Balance"]
+        curr_outstanding_principal=self.dm.tranches.balances[tranche]
         amount_paid=min(principal_received,curr_outstanding_principal)
         updated_tranche_balance=curr_outstanding_principal-amount_paid
         return {"amount_paid":amount_paid,"updated_tranche_balance":updated_tranche_balance}
 
 
-    def principal_deferred_interest_prorata(self,period,priority,principal_received):
+    def principal_deferred_interest_prorata(self,period,priority,tranche,principal_received):
         prorata_principal=0
         prorata_deferred_interest=0
-        curr_outstanding_principal=self.dm.data["tranches"][priority]["Balance"]
-        deferred_interest=self.dm.data["deferred_interest"][priority][period-1]["amount"]
+        curr_outstanding_principal=self.dm.tranches.balances[tranche]
+        deferred_interest=self.dm.deferred_interest_balance(priority,period-1)
         if curr_outstanding_principal!=0:
             prorata_principal=min((curr_outstanding_principal/(curr_outstanding_principal+deferred_interest))*principal_received,curr_outstanding_principal)
         if curr_outstanding_principal!=0:
@@ -321,57 +852,91 @@ class Principalwaterfallengine():
 
     
     def interest(self,period,priority,principal_received):
-        payment_due=self.dm.data["deferred_interest"][priority][period]["amount"]
+        payment_due=self.dm.deferred_interest_balance(priority,period)
         amount_paid=min(payment_due,principal_received)
         deferred_interest=payment_due-amount_paid
         return {"amount_paid":amount_paid,"deferred_interest":deferred_interest}
+
+    def pay_principal(self,period,priority,action,tranche,principal_received):
+        output=self.principal(period,tranche,principal_received)
+        self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output["amount_paid"])
+        self.dm.update_tranche_balance(tranche,output["updated_tranche_balance"])
+        return principal_received-output["amount_paid"]
+
+    def pay_principal_deferred_interest(self,period,priority,action,tranche,principal_received):
+        output=self.principal_deferred_interest_prorata(period,priority,tranche,principal_received)
+        self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output["prorata_principal"])
+        self.dm.record_payment(period,payment_type=DEFERRED_INTEREST_PAID,beneficiary=priority,amount=output["prorata_deferred_interest"])
+        self.dm.update_tranche_balance(tranche,output["updated_tranche_balance"])
+        self.dm.pay_down_deferred_interest(period,tranche_name=priority,amount=output["prorata_deferred_interest"])
+        return principal_received-output["amount_paid"]
+
+    def pay_interest(self,period,priority,action,tranche,principal_received):
+        output=self.interest(period,priority,principal_received)
+        self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output["amount_paid"])
+        self.dm.add_deferred_interest(period+1,tranche_name=priority,amount=output["deferred_interest"])
+        return principal_received-output["amount_paid"]
         
     def run_principal_waterfall(self,period,principal_received):
-        waterfall=list(self.principal_payment_waterfall[["Payment", "Condition"]].itertuples(index=False, name=None))
-
-
-
-        for priority,action in waterfall:
-            if action in ["principal"]:
-                output=self.principal(period,priority,principal_received)
-                principal_received-=output["amount_paid"]
-                self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output["amount_paid"])
-                self.dm.update_tranche_balance(priority,output["updated_tranche_balance"])
-            elif action in ["principal_deferred_interest"]:
-                output=self.principal_deferred_interest_prorata(period,priority,principal_received)
-                principal_received-=output["amount_paid"]
-                self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output["prorata_principal"])
-                self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output["prorata_deferred_interest"])
-                self.dm.update_tranche_balance(priority,output["updated_tranche_balance"])
-                self.dm.add_deferred_interest(period,tranche_name=priority,amount=output["prorata_deferred_interest"])
-
-                
-            elif action in ["interest"]:
-                
-                output=self.interest(period,priority,principal_received)
-                principal_received-=output["amount_paid"]
-                self.dm.record_payment(period,payment_type=action,beneficiary=priority,amount=output["amount_paid"])
-                self.dm.add_deferred_interest(period+1,tranche_name=priority,amount=output["deferred_interest"])
+        for priority,action,handler,tranche in self.waterfall:
+            principal_received=handler(period,priority,action,tranche,principal_received)
 
-        
         self.dm.update_reserve_account(period,principal_received)
         self.dm.record_payment(period,payment_type="reserves",beneficiary="reserves",amount=principal_received)
         principal_received-=principal_received
 
-        self.dm.data["deal_info"]["current_portfolio_value"]=sum(tranche["Balance"] for tranche in self.dm.data["tranches"].values())
+        self.dm.data["deal_info"]["current_portfolio_value"]=self.dm.tranches.total()
         if principal_received != 0:
             raise ValueError(f"Waterfall error: leftover principal = {principal_received}")
 
 
 
+@dataclass(frozen=True)
+class EngineState:
+    """``CashflowEngine`` state after ``period``; see ``CashflowEngine.snapshot`` and ``fork``"""
+    period: int
+    data: dict
+    residual_accounts: dict
+    collateral_balances: object
+    written_down: np.ndarray = None
+
+
 class CashflowEngine():
-    def __init__(self,tranche_info,interest_waterfall_info,principal_payment_waterfall,coverage_test_info,dm,prepayment_rate,default_rate,inputs_dict):
+    """Runs one deal scenario period by period.
+
+    The SOFR path is ``sofr_path`` when given (one rate per period from the
+    run date, e.g. a row of ``rate_paths.generate_sofr_paths``), otherwise it
+    is drawn from ``sofr_model`` (``rate_paths.FlatShockModel`` by default)
+    with a Generator seeded by ``sofr_seed``.
+
+    Collateral is one pool balance with the fixed balloon schedule unless a
+    ``loan_tape`` (``collateral.LoanTape`` or a loan tape DataFrame) is given,
+    in which case defaults, prepayments, maturities and interest come from
+    ``collateral.LoanCollateral`` and the pool starts at the tape's balance.
+    """
+    def __init__(self,tranche_info,interest_waterfall_info,principal_payment_waterfall,coverage_test_info,dm,prepayment_rate,default_rate,inputs_dict,sofr_path=None,plan=None,
+                 sofr_model=None,sofr_seed=None,loan_tape=None,record_states=False):
         self.prepayment_rate=prepayment_rate
         self.default_rate=default_rate
+        if loan_tape is not None and not isinstance(loan_tape,LoanTape):
+            loan_tape=LoanTape.from_frame(loan_tape)
+        self.loan_tape=loan_tape
+        self.collateral=None
+        self.inputs_dict=inputs_dict
+        self.next_period=None
+        self.record_states=record_states
+        self.period_states={}
+        self.coverage_history={}
+        self.sofr_path=sofr_path
+        self.sofr_model=sofr_model
+        self.sofr_seed=sofr_seed
         self.tranche_info=tranche_info
         self.principal_payment_waterfall=principal_payment_waterfall
         self.interest_waterfall_info=interest_waterfall_info
         self.coverage_test_info=coverage_test_info
+        if plan is None:
+            plan=compile_plan(tranche_info,interest_waterfall_info,principal_payment_waterfall,coverage_test_info)
+        self.plan=plan
 
 
         dm.load_data(inputs_dict["initial_portfolio_value"],inputs_dict["current_portfolio_value"],inputs_dict["current_collateral_value"],
@@ -379,46 +944,68 @@ class CashflowEngine():
                                            inputs_dict["first_coupon_date"],inputs_dict["payment_frequency"],
                                            inputs_dict["legal_maturity"],inputs_dict["run_date"])
         self.dm=dm
+        deal_info=self.dm.data["deal_info"]
+        end_period=self.convert_date_to_period(deal_info["legal_maturity"],deal_info["first_coupon_date"],deal_info["payment_frequency"])
+        self.dm.init_ledger(self.plan.columns,end_period+1)
+        self.dm.init_deferred_interest(end_period+2)
         
-        self.principal_engine=Principalwaterfallengine(self.tranche_info,self.principal_payment_waterfall,self.dm)
-        self.interest_engine=Interestwaterfallengine(self.tranche_info,self.interest_waterfall_info,self.coverage_test_info,self.dm,self.principal_engine)
+        self.principal_engine=Principalwaterfallengine(self.plan,self.dm)
+        self.interest_engine=Interestwaterfallengine(self.plan,self.dm,self.principal_engine)
         self.loan_balloon_payments={20:0.30,28:0.30,35:1}
+        self.written_down=np.zeros(len(self.plan.tranche_names))
+
 
+    def enable_profiling(self,profiler=None):
+        """Attach a ``profiling.WaterfallProfiler`` (a new one by default) to both waterfalls and return it"""
+        profiler=WaterfallProfiler() if profiler is None else profiler
+        self.interest_engine.set_profiler(profiler)
+        self.principal_engine.set_profiler(profiler)
+        return profiler
 
-    def adjust_for_default(self,period,current_collateral_value,default_rate,tranche_info):
+    def disable_profiling(self):
+        self.interest_engine.set_profiler(None)
+        self.principal_engine.set_profiler(None)
+
+    def adjust_for_default(self,period,current_collateral_value,default_rate):
         default_amount=current_collateral_value*(default_rate/self.dm.data["deal_info"]["payment_frequency"])
-        
+        self.write_down_defaults(default_amount)
+
+    def write_down_defaults(self,default_amount):
         self.dm.data["deal_info"]["current_collateral_value"]-=default_amount
-        risk_order=tranche_info.dropna(subset=["Preliminary rating"])
-        risk_order=risk_order["Class"][-1::-1]
-        for priority in risk_order:
+        balances=self.dm.tranches.balances
+        for tranche in self.plan.risk_order:
             if default_amount<=0:
                 break
-            if self.dm.data["tranches"][priority]["Balance"]!=0:
-                amount_to_deduct=min(self.dm.data["tranches"][priority]["Balance"],default_amount)
-                updated_tranche_balance=self.dm.data["tranches"][priority]["Balance"]-amount_to_deduct
-                self.dm.update_tranche_balance(priority,updated_tranche_balance)
+            balance=balances[tranche]
+            if balance!=0:
+                amount_to_deduct=min(balance,default_amount)
+                updated_tranche_balance=balance-amount_to_deduct
+                self.dm.update_tranche_balance(tranche,updated_tranche_balance)
+                self.written_down[tranche]+=amount_to_deduct
                 default_amount-=amount_to_deduct
             continue
-        self.dm.data["deal_info"]["current_portfolio_value"]=sum(tranche["Balance"] for tranche in self.dm.data["tranches"].values())
+        self.dm.data["deal_info"]["current_portfolio_value"]=self.dm.tranches.total()
 
 
-    def sofr(self,periods,base_sofr = 0.053,mean_reversion = 0.0002,vol = 0.0005):
-        for period in range(periods+1):
-            shock = np.random.normal(0, vol)
-            rate = max(0.002, base_sofr - mean_reversion + shock)
-            self.dm.data["sofr"][period]=rate
-        
+    def sofr(self,periods):
+        return generate_sofr_paths(1,periods+1,self.sofr_model,self.sofr_seed,periods_per_year=self.dm.data["deal_info"]["payment_frequency"])[0]
+
     def adjustment_to_collateral(self,period,reinvestment_period_end):
+        if self.collateral is not None:
+            self.write_down_defaults(float(self.collateral.default(period)))
+            self.dm.data["deal_info"]["current_collateral_value"]=float(self.collateral.total())
+            output=self.collateral.principal(period)
+            return {"prepaid_value":float(output["prepaid_value"]),"balloon_payment":float(output["balloon_payment"])}
         current_collateral_value=self.dm.data["deal_info"]["current_collateral_value"]
-        self.adjust_for_default(period,current_collateral_value,self.default_rate,self.tranche_info)
+        self.adjust_for_default(period,current_collateral_value,self.default_rate)
         portfolio_percent_matured= self.loan_balloon_payments.get(period, 0)
         ballon_payment=self.dm.data["deal_info"]["current_collateral_value"]*portfolio_percent_matured
         prepaid_value=self.dm.data["deal_info"]["current_collateral_value"]*(self.prepayment_rate/4)
         return {"prepaid_value":prepaid_value,"balloon_payment":ballon_payment}
 
     
-    def convert_date_to_period(self,date,first_coupon_date,payment_frequency):
+    @staticmethod
+    def convert_date_to_period(date,first_coupon_date,payment_frequency):
         first_coupon_date=datetime.strptime(first_coupon_date, "%d/%m/%Y")
         dt = datetime.strptime(date, "%d/%m/%Y")
         if dt<=first_coupon_date:
@@ -435,151 +1022,268 @@ class CashflowEngine():
 
 
         
-    def run(self):
-        period=self.convert_date_to_period(self.dm.data["deal_info"]["run_date"],self.dm.data["deal_info"]["first_coupon_date"],self.dm.data["deal_info"]["payment_frequency"])
-        end_period=self.convert_date_to_period(self.dm.data["deal_info"]["legal_maturity"],self.dm.data["deal_info"]["first_coupon_date"],self.dm.data["deal_info"]["payment_frequency"])
+    def init_collateral(self,end_period):
+        deal_info=self.dm.data["deal_info"]
+        maturity=self.loan_tape.maturity_periods(lambda date:self.convert_date_to_period(date,deal_info["first_coupon_date"],deal_info["payment_frequency"]))
+        self.collateral=LoanCollateral(self.loan_tape,maturity,deal_info["payment_frequency"],end_period,self.default_rate,self.prepayment_rate)
+        deal_info["current_collateral_value"]=float(self.collateral.total())
+
+    def start(self):
+        """Set up a fresh run: tranche balances, rank aggregates, loan collateral and the SOFR path"""
+        deal_info=self.dm.data["deal_info"]
+        period=self.convert_date_to_period(deal_info["run_date"],deal_info["first_coupon_date"],deal_info["payment_frequency"])
+        self.end_period=self.convert_date_to_period(deal_info["legal_maturity"],deal_info["first_coupon_date"],deal_info["payment_frequency"])
+        periods=(self.end_period-period)+1
+        self.dm.init_tranches(self.plan)
+        self.dm.init_rank_aggregates(self.plan)
+        if self.loan_tape is not None:
+            self.init_collateral(self.end_period)
+        if self.sofr_path is None:
+            self.sofr_path=self.sofr(periods)
+        self.dm.data["sofr"]=np.asarray(self.sofr_path,dtype=float)
+        self.start_period=period
+        self.next_period=period
+        if self.record_states:
+            self.period_states[period-1]=self.snapshot()
+
+    def step(self):
+        """Run the next period and return its ``period_snapshot``"""
+        period=self.next_period
         reinvestment_period_end=self.dm.data["deal_info"]["reinvestment_period_end"]
-        periods=(end_period-period)+1
-        if len(self.dm.data["tranches"])==0 :
-            df=self.tranche_info.dropna(subset=["Balance"])
-            self.dm.data["tranches"]=df.set_index("Class")[["Balance","Rank"]].to_dict(orient="index")
-        else:
-            pass
-        self.sofr(periods)
-        while self.dm.data["deal_info"]["current_collateral_value"]>0:
-            sofr=self.dm.data["sofr"][period-1]
-            output = self.adjustment_to_collateral(period, reinvestment_period_end)
-            prepaid = output["prepaid_value"]
-            balloon = output["balloon_payment"]
+        sofr=float(self.dm.data["sofr"][period-1])
+        output = self.adjustment_to_collateral(period, reinvestment_period_end)
+        prepaid = output["prepaid_value"]
+        balloon = output["balloon_payment"]
             
 
-            if period <= reinvestment_period_end:
-                self.interest_engine.run_interest_waterfall(period,sofr,self.dm.data["deal_info"]["payment_frequency"])
+        interest_collections=None if self.collateral is None else float(self.collateral.interest(sofr))
+
+        if period <= reinvestment_period_end:
+            self.interest_engine.run_interest_waterfall(period,sofr,self.dm.data["deal_info"]["payment_frequency"],interest_collections)
+            if self.collateral is not None:
+                self.collateral.reinvest()
                 
-            else:
-                principal_received = prepaid + balloon
-                self.interest_engine.run_interest_waterfall(period,sofr,self.dm.data["deal_info"]["payment_frequency"])
+        else:
+            principal_received = prepaid + balloon
+            self.interest_engine.run_interest_waterfall(period,sofr,self.dm.data["deal_info"]["payment_frequency"],interest_collections)
                 
-                self.dm.data["deal_info"]["current_collateral_value"]-=(prepaid+balloon)
-                self.principal_engine.run_principal_waterfall(period, principal_received)
-
-            period+=1
-            self.dm.save_data()
-
-
-
-
-tranche_info=pd.read_excel('clo_info.xlsx',sheet_name="Tranche_info")
-interest_waterfall_info=pd.read_excel('clo_info.xlsx',sheet_name="Interest_waterfall")
-coverage_test_info=pd.read_excel('clo_info.xlsx',sheet_name="Coverage_test")
-principal_payment_waterfall=pd.read_excel('clo_info.xlsx',sheet_name="Principal_waterfall")
-prepayment_rate=0.02
-default_rate=0.02
-
-inputs_dict={"initial_portfolio_value":554980000,"current_portfolio_value":554980000,"current_collateral_value":554980000,
-             "reinvestment_period_end":16,"portfolio_was":3.36,"first_coupon_date":"15/01/2026",
-             "payment_frequency":4,"legal_maturity":"15/12/2035","run_date":"15/12/2025"}
-
-
+            self.dm.data["deal_info"]["current_collateral_value"]-=(prepaid+balloon)
+            if self.collateral is not None:
+                self.collateral.pay_down()
+                self.dm.data["deal_info"]["current_collateral_value"]=float(self.collateral.total())
+            self.principal_engine.run_principal_waterfall(period, principal_received)
+
+        self.dm.checkpoint(period)
+        self.next_period=period+1
+        if self.record_states:
+            self.period_states[period]=self.snapshot()
+            self.coverage_history[period]=dict(self.interest_engine.coverage_ratios)
+        return self.period_snapshot(period,sofr)
+
+    def iter_periods(self):
+        """Run the deal one period at a time, yielding a ``period_snapshot`` after each period.
+
+        Closing the generator early leaves ``dm.data`` as of the last yielded
+        period and writes the final checkpoint. A senior interest shortfall
+        still raises ``RuntimeError`` out of the period that hits it. A forked
+        engine continues from the period after its snapshot.
+        """
+        if self.next_period is None:
+            self.start()
+        last_period=self.next_period-1
+        try:
+            while self.dm.data["deal_info"]["current_collateral_value"]>0:
+                period_snapshot=self.step()
+                last_period=period_snapshot["period"]
+                yield period_snapshot
+        except GeneratorExit:
+            self.dm.checkpoint(last_period,final=True)
+            raise
+        self.dm.checkpoint(last_period,final=True)
+
+    def advance(self,to_period):
+        """Run up to and including ``to_period`` (or until the collateral runs out) and return ``snapshot()``"""
+        if self.next_period is None:
+            self.start()
+        while self.next_period<=to_period and self.dm.data["deal_info"]["current_collateral_value"]>0:
+            self.step()
+        return self.snapshot()
+
+    def snapshot(self):
+        """Compact copy of the run state after the last completed period, for ``fork``"""
+        if self.next_period is None:
+            self.start()
+        return EngineState(
+            period=self.next_period-1,
+            data=self.dm.snapshot(),
+            residual_accounts={name:dict(account) for name,account in self.interest_engine.residual_accounts.items()},
+            collateral_balances=None if self.collateral is None else self.collateral.balances.copy(),
+            written_down=self.written_down.copy(),
+        )
 
+    def fork(self,state=None,prepayment_rate=None,default_rate=None,sofr_path=None,sofr_seed=None,sofr_model=None,dm=None):
+        """New engine that continues from ``state`` (by default the current one) under its own assumptions.
+
+        Rates already applied before the fork are kept. ``sofr_path`` (a full
+        path, or ``sofr_seed``/``sofr_model`` to draw one) only replaces the
+        rates from the fork onwards; without either the fork reuses this
+        engine's path. The fork's ``dm`` defaults to an in-memory data manager.
+        """
+        state=self.snapshot() if state is None else state
+        dm=CLODataManager(file_path=None) if dm is None else dm
+        engine=CashflowEngine(self.tranche_info,self.interest_waterfall_info,self.principal_payment_waterfall,self.coverage_test_info,dm,
+                              self.prepayment_rate if prepayment_rate is None else prepayment_rate,
+                              self.default_rate if default_rate is None else default_rate,
+                              self.inputs_dict,plan=self.plan,
+                              sofr_model=self.sofr_model if sofr_model is None else sofr_model,
+                              sofr_seed=self.sofr_seed if sofr_seed is None else sofr_seed,
+                              loan_tape=self.loan_tape)
+        if sofr_path is None and (sofr_seed is not None or sofr_model is not None):
+            sofr_path=engine.sofr(len(state.data["sofr"])-1)
+        engine.restore(state,sofr_path)
+        return engine
+
+    def restore(self,state,sofr_path=None):
+        self.dm.restore(state.data)
+        deal_info=self.dm.data["deal_info"]
+        self.start_period=self.convert_date_to_period(deal_info["run_date"],deal_info["first_coupon_date"],deal_info["payment_frequency"])
+        self.end_period=self.convert_date_to_period(deal_info["legal_maturity"],deal_info["first_coupon_date"],deal_info["payment_frequency"])
+        self.dm.init_tranches(self.plan)
+        self.dm.init_rank_aggregates(self.plan)
+        self.interest_engine.residual_accounts={name:dict(account) for name,account in state.residual_accounts.items()}
+        if state.written_down is not None:
+            self.written_down=state.written_down.copy()
+        if self.loan_tape is not None:
+            collateral_value=deal_info["current_collateral_value"]
+            self.init_collateral(self.end_period)
+            self.collateral.balances=state.collateral_balances.copy()
+            deal_info["current_collateral_value"]=collateral_value
+        if sofr_path is not None:
+            path=np.array(sofr_path,dtype=float)
+            path[:state.period]=self.dm.data["sofr"][:state.period]
+            self.dm.data["sofr"]=path
+        self.sofr_path=self.dm.data["sofr"]
+        self.next_period=state.period+1
+
+    def first_affected_period(self,inputs=None,coverage_test_info=None,sofr=None,default_rate=None,prepayment_rate=None):
+        """First period whose cashflows can differ under the edits, or None if none can.
+
+        ``inputs`` holds changed ``inputs_dict`` entries, ``coverage_test_info``
+        a replacement Coverage_test sheet and ``sofr`` ``{period: rate}`` edits.
+        A changed OC/IC requirement only matters from the first period whose
+        recorded ratio is below the old or the new requirement, so this needs
+        a run with ``record_states=True``. Edits ``rerun`` cannot resume from a
+        checkpoint give the first period of the run.
+        """
+        plan=None if coverage_test_info is None else compile_plan(self.tranche_info,self.interest_waterfall_info,self.principal_payment_waterfall,coverage_test_info)
+        return self._first_affected_period(inputs,plan,sofr,default_rate,prepayment_rate)
+
+    def _first_affected_period(self,inputs,plan,sofr,default_rate,prepayment_rate):
+        if self.next_period is None:
+            self.start()
+        start=self.start_period
+        if not self._resumable(inputs,plan):
+            return start
+        periods=[]
+        inputs={name:value for name,value in (inputs or {}).items() if self.inputs_dict.get(name)!=value}
+        if "portfolio_was" in inputs and self.collateral is None:
+            periods.append(start)
+        reinvestment_period_end=self.inputs_dict["reinvestment_period_end"]
+        if "reinvestment_period_end" in inputs:
+            reinvestment_period_end=min(reinvestment_period_end,inputs["reinvestment_period_end"])
+            periods.append(reinvestment_period_end+1)
+        if default_rate is not None and default_rate!=self.default_rate:
+            periods.append(start)
+        if prepayment_rate is not None and prepayment_rate!=self.prepayment_rate:
+            periods.append(start if self.collateral is not None else reinvestment_period_end+1)
+        path=self.dm.data["sofr"]
+        periods+=[int(period) for period,rate in (sofr or {}).items() if not 0<period<=len(path) or path[period-1]!=rate]
+        if plan is not None:
+            for group in plan.coverage_groups:
+                tests=[(test,max(old[group],new[group])) for test,old,new in (("oc",self.plan.oc_required,plan.oc_required),("ic",self.plan.ic_required,plan.ic_required))
+                       if old[group]!=new[group]]
+                for period in sorted(self.coverage_history):
+                    ratios=self.coverage_history[period].get(group)
+                    if ratios is not None and any(ratios[test]<required for test,required in tests):
+                        periods.append(period)
+                        break
+        return max(min(periods),start) if periods else None
+
+    def _resumable(self,inputs,plan):
+        if not self.record_states or not self.period_states:
+            return False
+        if any(self.inputs_dict.get(name)!=value for name,value in (inputs or {}).items() if name not in RESUMABLE_INPUTS):
+            return False
+        if plan is not None:
+            return plan.coverage_groups==self.plan.coverage_groups and dict(plan.coverage_rank)==dict(self.plan.coverage_rank)
+        return True
+
+    def rerun(self,inputs=None,coverage_test_info=None,sofr=None,default_rate=None,prepayment_rate=None,dm=None):
+        """New engine for the edited deal, run to the end from the first period the edits can affect.
+
+        Earlier periods are restored from this run's checkpoints (it must
+        have been built with ``record_states=True``; otherwise, or for edits
+        such as a new run date, the new engine runs from the start). The new
+        engine records states too, so edits can be chained. Arguments are as
+        for ``first_affected_period``.
+        """
+        new_inputs=dict(self.inputs_dict,**(inputs or {}))
+        path=np.array(self.dm.data["sofr"],dtype=float)
+        for period,rate in (sofr or {}).items():
+            path[period-1]=rate
+        plan=None if coverage_test_info is None else compile_plan(self.tranche_info,self.interest_waterfall_info,self.principal_payment_waterfall,coverage_test_info)
+        first_period=self._first_affected_period(inputs,plan,sofr,default_rate,prepayment_rate)
+        engine=CashflowEngine(self.tranche_info,self.interest_waterfall_info,self.principal_payment_waterfall,
+                              self.coverage_test_info if coverage_test_info is None else coverage_test_info,
+                              CLODataManager(file_path=None) if dm is None else dm,
+                              self.prepayment_rate if prepayment_rate is None else prepayment_rate,
+                              self.default_rate if default_rate is None else default_rate,
+                              new_inputs,sofr_path=path,plan=self.plan if plan is None else plan,
+                              sofr_model=self.sofr_model,sofr_seed=self.sofr_seed,loan_tape=self.loan_tape,record_states=True)
+        if self._resumable(inputs,plan):
+            resume_after=self.next_period-1 if first_period is None else first_period-1
+            resume_after=max(period for period in self.period_states if period<=resume_after)
+            engine.restore(self.period_states[resume_after],path)
+            for name in RESUMABLE_INPUTS:
+                engine.dm.data["deal_info"][name]=new_inputs[name]
+            engine.period_states={period:state for period,state in self.period_states.items() if period<=resume_after}
+            engine.coverage_history={period:ratios for period,ratios in self.coverage_history.items() if period<=resume_after}
+        engine.run()
+        return engine
+
+    def period_snapshot(self,period,sofr):
+        """Compact view of one finished period: cash by waterfall step, balances, OC/IC ratios, deferred interest, collateral"""
+        ledger=self.dm.ledger
+        deal_info=self.dm.data["deal_info"]
+        return {
+            "period":period,
+            "sofr":sofr,
+            "collateral_value":deal_info["current_collateral_value"],
+            "portfolio_value":deal_info["current_portfolio_value"],
+            "payments":{label:float(amount) for label,amount,recorded in zip(ledger.labels(),ledger.amounts[period],ledger.recorded[period]) if recorded},
+            "tranche_balances":self.dm.tranches.balance_dict(),
+            "coverage":self.interest_engine.coverage_ratios,
+            "deferred_interest":{name:float(account.balance_at(period)) for name,account in self.dm.data["deferred_interest"].items()},
+        }
 
+    def run(self):
+        for _ in self.iter_periods():
+            pass
+        return self.dm.data
 
 
-payment_cols = [
-    "period",
 
-    # Fees
-    "Taxes and fees, and then administrative expenses (capped)._fee/must_pay",
-    "To the payment of the base management fee._fee/must_pay",
 
-    # Interest – senior to junior
-    "A-1_interest",
-    "A-1_principal",
-    "A-2_interest",
-    "A-2_principal",
-    "B_interest",
-    "B_principal",
-    "A/B_coverage_test",
-    "C_deferrable_interest"
-    "C_coverage_test",
-    "C_accrued_interest",
-    "D-1a_deferrable_interest",
-    "D-1b_deferrable_interest",
-    "D-2_deferrable_interest",
-    "D_coverage_test"
-    "E_deferrable_interest",
-    "E_coverage_test",
-    "E_accrued_interest",
-    "To the payment of subordinated management fees and any deferred subordinated management fees._fee/must_pay",
-    "Subordinated notes_residual",
-    "20% of remaining proceeds to the incentive management fee_incentive",
-    "Subordinated notes_principal",
-    "reserves_reserves"
 
-]
 
 
-        
 if __name__=="__main__":
+    prepayment_rate=0.02
+    default_rate=0.02
+    deal=load_deal()
     dm=CLODataManager()
-    cf_engine=CashflowEngine(tranche_info,interest_waterfall_info,principal_payment_waterfall,coverage_test_info,dm,prepayment_rate,default_rate,inputs_dict)
+    cf_engine=CashflowEngine(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"],
+                             dm,prepayment_rate,default_rate,default_inputs(),loan_tape=deal.get("loan_tape"))
     cf_engine.run()
-    with open("clo_data.json",'r') as f:
-        info = json.load(f)
-    payment_history_df = pd.DataFrame(info["payment_history"])
-    payment_history_df["col"] = payment_history_df["beneficiary"] + "_" + payment_history_df["type"]
-    payment_history_df= (
-        payment_history_df.pivot_table(
-            index="period",
-            columns="col",
-            values="amount",
-            aggfunc="sum",
-            fill_value=0
-        )
-        .reset_index())
-    payment_history_df = payment_history_df.reindex(
-    columns=payment_cols,
-    fill_value=0
-)
-    
-    
-    rows = []
-    df_coverage = pd.DataFrame(rows)
-    if info["coverage_test_history"]:
-        for tranche, events in info["coverage_test_history"].items():
-            for event in events:
-                rows.append({
-                    "tranche": tranche,
-                    "period": event["period"],
-                    "test_type": event.get("ic/oc"),
-                    "diverted_amount": event.get("amount")
-                })
-        df_coverage = pd.DataFrame(rows)
-        df_coverage = df_coverage.sort_values(
-        by=["period", "tranche", "test_type"]
-        ).reset_index(drop=True)
-
-    rows = []
-
-    for tranche, events in info["deferred_interest"].items():
-        for event in events:
-            rows.append({
-                "tranche": tranche,
-                "period": event["period"],      # OC / IC
-                "differed_amount": event.get("amount")
-            })
-
-    deferred_interest_history_df = pd.DataFrame(rows)
-    deferred_interest_history_df = deferred_interest_history_df.sort_values(
-    by=["period", "tranche", "differed_amount"]
-    ).reset_index(drop=True)
-
-    
-    with pd.ExcelWriter("clo_outputs.xlsx", engine="xlsxwriter") as writer:
-        payment_history_df.to_excel(writer, sheet_name="Payments", index=False)
-        df_coverage.to_excel(writer, sheet_name="Coverage_Tests", index=False)
-        deferred_interest_history_df.to_excel(writer, sheet_name="deferred_interest", index=False)
-    # df_reserves.to_excel(writer, sheet_name="Reserves", index=False)
-    
-    
-
+    dm.save_results("clo_results")
+    reporting.write_excel(reporting.run_tables(dm.data),"clo_outputs.xlsx")
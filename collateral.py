@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+
+
+LOAN_TAPE_SHEET="Loan_tape"
+
+LOAN_TAPE_COLUMNS={"balance":"Balance","spread":"Spread","maturity":"Maturity","floor":"Floor",
+                   "default_rate":"Default rate","prepayment_rate":"Prepayment rate"}
+
+REQUIRED_LOAN_COLUMNS=("balance","spread","maturity")
+
+
+class LoanTape:
+    """Loan-level collateral as one NumPy array per tape column.
+
+    ``spread`` is in percent like ``portfolio_was`` and ``floor`` is in the
+    units of the SOFR path. ``maturity`` is a payment period or a
+    date (``dd/mm/yyyy`` or ISO). ``default_rate`` and ``prepayment_rate`` are annual
+    rates; a missing column or blank cell falls back to the engine's rate.
+    """
+    def __init__(self,balance,spread,maturity,floor=None,default_rate=None,prepayment_rate=None,loan_ids=None):
+        self.balance=np.asarray(balance,dtype=float)
+        n=len(self.balance)
+        self.spread=np.asarray(spread,dtype=float)
+        self.maturity=np.asarray(maturity,dtype=object)
+        self.floor=np.zeros(n) if floor is None else np.nan_to_num(np.asarray(floor,dtype=float))
+        self.default_rate=np.full(n,np.nan) if default_rate is None else np.asarray(default_rate,dtype=float)
+        self.prepayment_rate=np.full(n,np.nan) if prepayment_rate is None else np.asarray(prepayment_rate,dtype=float)
+        self.loan_ids=np.arange(n) if loan_ids is None else np.asarray(loan_ids)
+
+    @classmethod
+    def from_frame(cls,frame):
+        missing=[LOAN_TAPE_COLUMNS[key] for key in REQUIRED_LOAN_COLUMNS if LOAN_TAPE_COLUMNS[key] not in frame.columns]
+        if missing:
+            raise ValueError(f"Loan tape is missing columns: {missing}")
+        columns={key:frame[name].to_numpy() for key,name in LOAN_TAPE_COLUMNS.items() if name in frame.columns}
+        loan_ids=frame["Loan ID"].to_numpy() if "Loan ID" in frame.columns else None
+        return cls(loan_ids=loan_ids,**columns)
+
+    def __len__(self):
+        return len(self.balance)
+
+    def total(self):
+        return float(self.balance.sum())
+
+    def maturity_periods(self,convert_date):
+        """Maturities as payment periods; ``convert_date`` maps a date string to a period"""
+        periods=[]
+        for m in self.maturity:
+            if isinstance(m,(int,float,np.integer,np.floating)):
+                periods.append(int(m))
+            elif hasattr(m,"strftime"):
+                periods.append(convert_date(m.strftime("%d/%m/%Y")))
+            elif str(m).strip().isdigit():
+                periods.append(int(m))
+            else:
+                text=str(m).strip()
+                if "/" not in text:
+                    text=pd.Timestamp(text).strftime("%d/%m/%Y")
+                periods.append(convert_date(text))
+        return np.array(periods,dtype=int)
+
+
+def read_loan_tape(path,sheet_name=LOAN_TAPE_SHEET):
+    """Read a loan tape from a CSV file or from ``sheet_name`` of a workbook"""
+    if str(path).lower().endswith(".csv"):
+        frame=pd.read_csv(path)
+    else:
+        frame=pd.read_excel(path,sheet_name=sheet_name)
+    return LoanTape.from_frame(frame)
+
+
+class LoanCollateral:
+    """Per-period collateral cashflows computed across every loan at once.
+
+    Balances are ``(n_loans,)``, or ``(n_loans, n_scenarios)`` when
+    ``n_scenarios`` is given, so one vectorized step per period serves both
+    ``CashflowEngine`` and ``BatchCashflowEngine``. Each period the engine
+    calls ``default``, then ``principal`` and ``interest`` on the post-default
+    balances, and finally ``pay_down`` (amortization) or ``reinvest``
+    (reinvestment period: proceeds are spread pro rata over the surviving
+    loans so only defaults shrink the pool, as in the pool-level model).
+    Every loan matures at the latest at ``end_period``.
+    """
+    def __init__(self,tape,maturity,pay_freq,end_period,default_rate,prepayment_rate,n_scenarios=None):
+        self.pay_freq=pay_freq
+        self.n_scenarios=n_scenarios
+        self.maturity=self._per_loan(np.minimum(np.asarray(maturity,dtype=int),end_period))
+        self.spread=self._per_loan(tape.spread)
+        self.floor=self._per_loan(tape.floor)
+        self.default_rate=self._fill(tape.default_rate,default_rate)
+        self.prepayment_rate=self._fill(tape.prepayment_rate,prepayment_rate)
+        self.balances=np.array(self._per_loan(tape.balance),dtype=float)
+        if n_scenarios is not None:
+            self.balances=np.repeat(self.balances,n_scenarios,axis=1)
+        self.prepaid=np.zeros_like(self.balances)
+        self.matured=np.zeros_like(self.balances)
+
+    def _per_loan(self,values):
+        values=np.asarray(values)
+        return values if self.n_scenarios is None else values[:,None]
+
+    def _fill(self,tape_rates,engine_rates):
+        """Tape rates, falling back per loan to the engine's (possibly per-scenario) rate"""
+        tape_rates=self._per_loan(tape_rates)
+        engine_rates=np.asarray(engine_rates,dtype=float)
+        if self.n_scenarios is not None:
+            engine_rates=np.broadcast_to(engine_rates,(self.n_scenarios,))[None,:]
+        return np.where(np.isnan(tape_rates),engine_rates,tape_rates)
+
+    def _masked(self,values,mask):
+        if mask is None:
+            return values
+        return np.where(mask,values,0.0)
+
+    def total(self):
+        return self.balances.sum(axis=0)
+
+    def default(self,period,mask=None):
+        defaults=self._masked(self.balances*(self.default_rate/self.pay_freq),mask)
+        self.balances=self.balances-defaults
+        return defaults.sum(axis=0)
+
+    def principal(self,period):
+        due=self.maturity<=period
+        self.matured=np.where(due,self.balances,0.0)
+        self.prepaid=np.where(due,0.0,self.balances*(self.prepayment_rate/self.pay_freq))
+        return {"prepaid_value":self.prepaid.sum(axis=0),"balloon_payment":self.matured.sum(axis=0)}
+
+    def interest(self,sofr):
+        rate=np.maximum(sofr,self.floor)
+        return (self.balances*(((rate+self.spread)/100)/self.pay_freq)).sum(axis=0)
+
+    def pay_down(self,mask=None):
+        self.balances=self.balances-self._masked(self.prepaid+self.matured,mask)
+
+    def reinvest(self,mask=None):
+        proceeds=self._masked(self.prepaid+self.matured,mask)
+        self.balances=self.balances-proceeds
+        remaining=self.balances.sum(axis=0)
+        with np.errstate(divide="ignore",invalid="ignore"):
+            scale=np.where(remaining>0,1+proceeds.sum(axis=0)/remaining,1.0)
+        self.balances=self.balances*scale
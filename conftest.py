@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+from batch_engine import BatchCashflowEngine
+from cash_flow_engine import CashflowEngine, CLODataManager, compile_plan, load_deal, default_inputs
+from benchmark import synthetic_loan_tape
+from rate_paths import generate_sofr_paths
+
+
+# (prepayment_rate, default_rate): base case, heavy defaults, and the stress
+# cases that used to raise KeyError when an OC cure hit a tranche with no deferred interest yet
+SCENARIOS=[(0.02,0.02),(0.05,0.01),(0.0,0.0),(0.02,0.12),(0.25,0.3),(1.0,0.0),(0.0,1.0)]
+
+
+@pytest.fixture(scope="session")
+def deal():
+    return load_deal()
+
+
+@pytest.fixture(scope="session")
+def inputs():
+    return default_inputs()
+
+
+@pytest.fixture(scope="session")
+def plan(deal):
+    return compile_plan(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"])
+
+
+@pytest.fixture(scope="session")
+def end_period(inputs):
+    return CashflowEngine.convert_date_to_period(inputs["legal_maturity"],inputs["first_coupon_date"],inputs["payment_frequency"])
+
+
+@pytest.fixture(scope="session")
+def scenarios():
+    return SCENARIOS
+
+
+@pytest.fixture(scope="session")
+def sofr_paths(end_period):
+    return generate_sofr_paths(len(SCENARIOS),end_period+1,seed=0)
+
+
+@pytest.fixture(scope="session")
+def loan_tape(inputs,end_period):
+    return synthetic_loan_tape(200,inputs["current_collateral_value"],inputs["reinvestment_period_end"]+2,end_period)
+
+
+@pytest.fixture(scope="session")
+def make_engine(deal,plan):
+    """``CashflowEngine`` factory on the sample deal with an in-memory data manager"""
+    def make(inputs,sofr_path,prepayment_rate=0.02,default_rate=0.02,loan_tape=None,record_states=False):
+        return CashflowEngine(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"],
+                              CLODataManager(file_path=None),prepayment_rate,default_rate,inputs,sofr_path=sofr_path,plan=plan,
+                              loan_tape=loan_tape,record_states=record_states)
+    return make
+
+
+@pytest.fixture(scope="session")
+def make_batch(deal,plan):
+    """``BatchCashflowEngine`` over ``(prepayment_rate, default_rate)`` scenarios on the sample deal"""
+    def make(inputs,scenarios,sofr_paths,loan_tape=None,state=None):
+        return BatchCashflowEngine(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"],
+                                   [prepayment_rate for prepayment_rate,_ in scenarios],[default_rate for _,default_rate in scenarios],inputs,
+                                   sofr_paths=sofr_paths,plan=plan,loan_tape=loan_tape,state=state)
+    return make
+
+
+@pytest.fixture(scope="session")
+def assert_batch_matches():
+    """Check each batch scenario against the matching finished ``CashflowEngine`` and its status"""
+    def check(batch,scalars,statuses,rtol=0.0,atol=0.0):
+        for i,(cf_engine,status) in enumerate(zip(scalars,statuses)):
+            assert batch.status[i]==status
+            ledger=cf_engine.dm.ledger
+            assert batch.last_period[i]==ledger.last_period()
+            rows=min(ledger.amounts.shape[0],batch.payments.shape[0])
+            np.testing.assert_allclose(batch.payments[:rows,:,i],ledger.amounts[:rows],rtol=rtol,atol=atol)
+            np.testing.assert_allclose(batch.balances[:,i],cf_engine.dm.tranches.balances,rtol=rtol,atol=atol)
+    return check
+
+
+@pytest.fixture(scope="session")
+def run_engine():
+    """Run an engine to the end; returns the status ``BatchCashflowEngine`` would report"""
+    def run(cf_engine):
+        try:
+            cf_engine.run()
+        except RuntimeError:
+            return "default"
+        return "complete"
+    return run
+
+
+@pytest.fixture(scope="session")
+def assert_same_run():
+    def check(actual,expected,rtol=0.0,atol=0.0):
+        np.testing.assert_allclose(actual.dm.ledger.amounts,expected.dm.ledger.amounts,rtol=rtol,atol=atol)
+        np.testing.assert_array_equal(actual.dm.ledger.recorded,expected.dm.ledger.recorded)
+        np.testing.assert_allclose(actual.dm.tranches.balances,expected.dm.tranches.balances,rtol=rtol,atol=atol)
+        assert set(actual.dm.data["deferred_interest"])==set(expected.dm.data["deferred_interest"])
+        for name,account in expected.dm.data["deferred_interest"].items():
+            np.testing.assert_allclose(actual.dm.data["deferred_interest"][name].amounts,account.amounts,rtol=rtol,atol=atol)
+        assert actual.dm.data["coverage_test_history"].keys()==expected.dm.data["coverage_test_history"].keys()
+    return check
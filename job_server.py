@@ -0,0 +1,269 @@
+import asyncio
+import copy
+import hashlib
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cash_flow_engine import CLODataManager, CashflowEngine, DEAL_SHEETS, OPTIONAL_DEAL_SHEETS, compile_plan, default_inputs
+from collateral import LoanTape
+import reporting
+from sweep import summarize, sofr_path, deal_periods
+
+
+SCENARIO_KEYS=("prepayment_rate","default_rate","sofr_seed","reinvestment_period_end")
+
+RUN_KEYS=SCENARIO_KEYS+("sofr_path",)
+
+_worker_plans=OrderedDict()
+
+_worker_plans_lock=threading.Lock()
+
+_WORKER_PLAN_CACHE=8
+
+
+def _hash_frame(digest,frame):
+    digest.update(json.dumps([str(column) for column in frame.columns]).encode())
+    digest.update(json.dumps([str(dtype) for dtype in frame.dtypes]).encode())
+    digest.update(pd.util.hash_pandas_object(frame,index=True).to_numpy().tobytes())
+
+
+def deal_key(deal):
+    """SHA-256 of the deal sheets' columns, dtypes and cell values"""
+    digest=hashlib.sha256()
+    for name in list(DEAL_SHEETS)+list(OPTIONAL_DEAL_SHEETS):
+        frame=deal.get(name)
+        digest.update(name.encode())
+        if frame is not None:
+            _hash_frame(digest,frame)
+    return digest.hexdigest()
+
+
+def job_key(deal,scenario,inputs_dict):
+    """Dedup key of a request: the deal hash plus the canonical JSON of its inputs and of the scenario keys ``run_job`` reads"""
+    request={"scenario":{key:scenario.get(key) for key in RUN_KEYS},"inputs":inputs_dict}
+    payload=json.dumps(request,sort_keys=True,default=lambda obj:np.asarray(obj).tolist())
+    return hashlib.sha256((deal_key(deal)+payload).encode()).hexdigest()
+
+
+def _random_sofr(scenario):
+    """True when the run draws a fresh, unseeded SOFR path, so its result cannot be shared"""
+    return scenario.get("sofr_seed") is None and scenario.get("sofr_path") is None
+
+
+def _worker_plan(key,deal):
+    """Compiled plan and loan tape of a deal, cached per worker process by deal hash.
+
+    The cache is shared by every thread of the process (a thread pool
+    executor runs all jobs here), so it is only touched under a lock.
+    """
+    with _worker_plans_lock:
+        cached=_worker_plans.get(key)
+        if cached is not None:
+            _worker_plans.move_to_end(key)
+            return cached
+    plan=compile_plan(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"])
+    loan_tape=deal.get("loan_tape")
+    cached=(plan,None if loan_tape is None else LoanTape.from_frame(loan_tape))
+    with _worker_plans_lock:
+        cached=_worker_plans.setdefault(key,cached)
+        _worker_plans.move_to_end(key)
+        while len(_worker_plans)>_WORKER_PLAN_CACHE:
+            _worker_plans.popitem(last=False)
+    return cached
+
+
+def run_job(deal,scenario,inputs_dict,key=None):
+    """Run one deal scenario entirely in memory and return its summary and report tables.
+
+    Nothing is written to disk, so any number of jobs can run side by side.
+    A senior interest default is a result (status ``"default"``), not an error.
+    """
+    plan,loan_tape=_worker_plan(deal_key(deal) if key is None else key,deal)
+    inputs=dict(inputs_dict)
+    if scenario.get("reinvestment_period_end") is not None:
+        inputs["reinvestment_period_end"]=scenario["reinvestment_period_end"]
+    path=scenario.get("sofr_path")
+    if path is None:
+        path=sofr_path(scenario.get("sofr_seed"),deal_periods(inputs))
+
+    dm=CLODataManager(file_path=None,persistence="never")
+    engine=CashflowEngine(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"],
+                          dm,scenario["prepayment_rate"],scenario["default_rate"],inputs,sofr_path=path,plan=plan,loan_tape=loan_tape)
+    status,error="complete",None
+    try:
+        engine.run()
+    except RuntimeError as e:
+        status,error="default",str(e)
+    return {"summary":summarize(dm.data,{key:scenario.get(key) for key in SCENARIO_KEYS},status,error),"tables":reporting.run_tables(dm.data)}
+
+
+class JobServer:
+    """Asyncio front end that queues deal runs onto a process pool.
+
+    ``submit`` returns a job id immediately; ``result`` awaits the job and
+    releases the id.
+    Requests with the same deal sheets, scenario and inputs share one run:
+    while it is in flight later requests attach to it, and once it finishes
+    its result stays in an LRU cache of ``cache_size`` entries. Scenarios
+    with neither ``sofr_seed`` nor ``sofr_path`` draw a random SOFR path,
+    so they always get a run of their own and are not cached. Every job runs
+    on an in-memory data manager, so concurrent jobs share no files.
+    ``executor`` defaults to a ``ProcessPoolExecutor(max_workers)`` created on
+    first use; pass a thread pool to keep everything in one process.
+    """
+    def __init__(self,max_workers=None,cache_size=128,executor=None):
+        self.max_workers=max_workers
+        self.cache_size=cache_size
+        self.executor=executor
+        self._owns_executor=executor is None
+        self.cache=OrderedDict()
+        self.in_flight={}
+        self.jobs={}
+        self.stats={"submitted":0,"runs":0,"cache_hits":0,"in_flight_hits":0,"failures":0}
+
+    def _executor(self):
+        if self.executor is None:
+            self.executor=ProcessPoolExecutor(max_workers=self.max_workers)
+        return self.executor
+
+    def _cache_put(self,key,result):
+        self.cache[key]=result
+        self.cache.move_to_end(key)
+        while len(self.cache)>self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def _run(self,key,deal,scenario,inputs_dict):
+        loop=asyncio.get_running_loop()
+        self.stats["runs"]+=1
+        try:
+            result=await loop.run_in_executor(self._executor(),run_job,deal,scenario,inputs_dict,deal_key(deal))
+        except Exception:
+            self.stats["failures"]+=1
+            raise
+        finally:
+            if key is not None:
+                self.in_flight.pop(key,None)
+        if key is not None:
+            self._cache_put(key,result)
+        return result
+
+    async def submit(self,deal,scenario,inputs_dict=None):
+        """Queue one scenario of ``deal`` (the dict returned by ``load_deal``) and return its job id"""
+        missing=[name for name in ("prepayment_rate","default_rate") if name not in scenario]
+        if missing:
+            raise ValueError(f"Scenario is missing {missing}")
+        inputs_dict=default_inputs() if inputs_dict is None else inputs_dict
+        key=None if _random_sofr(scenario) else job_key(deal,scenario,inputs_dict)
+        self.stats["submitted"]+=1
+        job_id=uuid.uuid4().hex
+        if key is None:
+            future=asyncio.ensure_future(self._run(None,deal,dict(scenario),dict(inputs_dict)))
+        elif key in self.cache:
+            self.cache.move_to_end(key)
+            self.stats["cache_hits"]+=1
+            future=asyncio.get_running_loop().create_future()
+            future.set_result(self.cache[key])
+        elif key in self.in_flight:
+            self.stats["in_flight_hits"]+=1
+            future=self.in_flight[key]
+        else:
+            future=asyncio.ensure_future(self._run(key,deal,dict(scenario),dict(inputs_dict)))
+            self.in_flight[key]=future
+        self.jobs[job_id]={"key":key,"future":future}
+        return job_id
+
+    def status(self,job_id):
+        future=self.jobs[job_id]["future"]
+        if not future.done():
+            return "pending"
+        if future.cancelled() or future.exception() is not None:
+            return "failed"
+        return "done"
+
+    async def result(self,job_id):
+        """Await a job and release its id; the result is a private copy, so callers may modify it.
+
+        The server keeps no reference to a delivered job (a cached result
+        lives only as long as the LRU keeps it), so each id can be collected
+        once. A caller cancelled while the job is still running may await it
+        again.
+        """
+        future=self.jobs[job_id]["future"]
+        try:
+            result=await asyncio.shield(future)
+        finally:
+            if future.done():
+                self.forget(job_id)
+        return copy.deepcopy(result)
+
+    def forget(self,job_id):
+        self.jobs.pop(job_id,None)
+
+    async def run(self,deal,scenario,inputs_dict=None):
+        job_id=await self.submit(deal,scenario,inputs_dict)
+        try:
+            return await self.result(job_id)
+        finally:
+            self.forget(job_id)
+
+    async def close(self):
+        if self.in_flight:
+            await asyncio.gather(*self.in_flight.values(),return_exceptions=True)
+        if self._owns_executor and self.executor is not None:
+            self.executor.shutdown()
+            self.executor=None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self,*exc):
+        await self.close()
+
+
+class LocalClient:
+    """Blocking in-process client for a ``JobServer`` running on its own event loop thread"""
+    def __init__(self,server=None,**server_options):
+        self.loop=asyncio.new_event_loop()
+        self.thread=threading.Thread(target=self.loop.run_forever,name="job-server",daemon=True)
+        self.thread.start()
+        self.server=server if server is not None else self._call(self._make_server(server_options))
+
+    @staticmethod
+    async def _make_server(options):
+        return JobServer(**options)
+
+    def _call(self,coroutine,timeout=None):
+        return asyncio.run_coroutine_threadsafe(coroutine,self.loop).result(timeout)
+
+    def submit(self,deal,scenario,inputs_dict=None):
+        return self._call(self.server.submit(deal,scenario,inputs_dict))
+
+    def result(self,job_id,timeout=None):
+        return self._call(self.server.result(job_id),timeout)
+
+    def status(self,job_id):
+        return self._call(self._status(job_id))
+
+    async def _status(self,job_id):
+        return self.server.status(job_id)
+
+    def run(self,deal,scenario,inputs_dict=None,timeout=None):
+        return self._call(self.server.run(deal,scenario,inputs_dict),timeout)
+
+    def close(self):
+        self._call(self.server.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
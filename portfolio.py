@@ -0,0 +1,187 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from cash_flow_engine import compile_plan, load_deal, default_inputs, DEFAULT_DEAL_PATH
+from batch_engine import BatchCashflowEngine
+from analytics import tranche_cashflows
+from collateral import LoanTape
+from rate_paths import generate_sofr_paths
+from sweep import deal_periods
+
+
+SCENARIO_ARRAYS=("sofr","default_rate","prepayment_rate")
+
+RESULT_ARRAYS=("principal","interest","defaulted")
+
+_worker_deals=None
+
+_worker_blocks=None
+
+
+def scenario_set(n_scenarios,n_periods,default_rates=0.02,prepayment_rates=0.02,sofr_model=None,seed=None,sampling="random",periods_per_year=4):
+    """One set of rate and credit scenarios for every deal in a portfolio.
+
+    ``sofr`` is ``(n_scenarios, n_periods+1)``; column p is the rate for the
+    (p+1)-th period after the run date. ``default_rates`` and
+    ``prepayment_rates`` are scalars or one value per scenario.
+    """
+    return {
+        "sofr":generate_sofr_paths(n_scenarios,n_periods+1,sofr_model,seed,sampling,periods_per_year),
+        "default_rate":np.broadcast_to(np.asarray(default_rates,dtype=float),(n_scenarios,)).copy(),
+        "prepayment_rate":np.broadcast_to(np.asarray(prepayment_rates,dtype=float),(n_scenarios,)).copy(),
+    }
+
+
+def _position_name(position):
+    return position.get("name") or os.path.splitext(os.path.basename(position.get("deal_path",DEFAULT_DEAL_PATH)))[0]
+
+
+def _load_position(position):
+    """Deal sheets, compiled plan, loan tape and per-tranche weights (face held / initial balance) of one position"""
+    deal=load_deal(position.get("deal_path",DEFAULT_DEAL_PATH))
+    plan=compile_plan(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"])
+    loan_tape=deal.get("loan_tape")
+    weights=np.zeros(len(plan.tranche_names))
+    for tranche,face in position["holdings"].items():
+        if tranche not in plan.tranche_index:
+            raise ValueError(f"Unknown tranche {tranche!r} in position {_position_name(position)!r}")
+        weights[plan.tranche_index[tranche]]=face/plan.initial_balances[plan.tranche_index[tranche]]
+    return {
+        "deal":deal,
+        "plan":plan,
+        "loan_tape":None if loan_tape is None else LoanTape.from_frame(loan_tape),
+        "inputs":position.get("inputs") or default_inputs(),
+        "weights":weights,
+    }
+
+
+def _share(arrays):
+    """Copy each array into its own shared memory block; returns the blocks and the specs workers attach with"""
+    blocks={}
+    specs={}
+    for name,array in arrays.items():
+        array=np.asarray(array)
+        block=shared_memory.SharedMemory(create=True,size=max(array.nbytes,1))
+        blocks[name]=block
+        np.ndarray(array.shape,array.dtype,buffer=block.buf)[...]=array
+        specs[name]=(block.name,array.shape,array.dtype.str)
+    return blocks,specs
+
+
+def _view(blocks,specs,name):
+    block_name,shape,dtype=specs[name]
+    return np.ndarray(shape,np.dtype(dtype),buffer=blocks[name].buf)
+
+
+def _release(blocks):
+    for block in blocks.values():
+        block.close()
+        block.unlink()
+
+
+def _init_worker(positions,specs):
+    global _worker_deals,_worker_blocks
+    _worker_deals=[_load_position(position) for position in positions]
+    _worker_blocks=({name:shared_memory.SharedMemory(name=block_name) for name,(block_name,shape,dtype) in specs.items()},specs)
+
+
+def _run_block(task):
+    """Run scenarios ``lo:hi`` of deal ``d`` as one batch and write its weighted cashflows into the shared result arrays"""
+    d,lo,hi=task
+    position=_worker_deals[d]
+    blocks,specs=_worker_blocks
+    deal,plan,inputs=position["deal"],position["plan"],position["inputs"]
+
+    start=BatchCashflowEngine.convert_date_to_period(inputs["run_date"],inputs["first_coupon_date"],inputs["payment_frequency"])
+    sofr=_view(blocks,specs,"sofr")[lo:hi]
+    sofr=np.concatenate([np.zeros((hi-lo,start-1)),sofr],axis=1)
+    engine=BatchCashflowEngine(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"],
+                               _view(blocks,specs,"prepayment_rate")[lo:hi],_view(blocks,specs,"default_rate")[lo:hi],inputs,
+                               sofr_paths=sofr,plan=plan,loan_tape=position["loan_tape"])
+    engine.run()
+
+    principal,interest=tranche_cashflows(plan,engine.payments)
+    n_periods=specs["principal"][1][2]
+    width=min(n_periods,principal.shape[2]-start)
+    _view(blocks,specs,"principal")[d,lo:hi,:width]=np.einsum("t,tsp->sp",position["weights"],principal[:,:,start:start+width])
+    _view(blocks,specs,"interest")[d,lo:hi,:width]=np.einsum("t,tsp->sp",position["weights"],interest[:,:,start:start+width])
+    _view(blocks,specs,"defaulted")[d,lo:hi]=engine.status=="default"
+    return task
+
+
+def run_portfolio(positions,n_scenarios=100,default_rates=0.02,prepayment_rates=0.02,sofr_model=None,seed=None,scenarios=None,max_workers=None,batch_size=None):
+    """Run every deal of a portfolio under one shared scenario set and aggregate the position cashflows.
+
+    ``positions`` is a list of ``{"deal_path", "holdings": {tranche: face},
+    "inputs", "name"}``; ``inputs`` defaults to ``default_inputs()``. The
+    scenarios come from ``scenario_set`` unless ``scenarios`` is given, and
+    are placed in shared memory once: workers attach to them in their
+    initializer, and each task only names a deal and a block of
+    ``batch_size`` scenarios (all of them by default), run as one
+    ``BatchCashflowEngine``. Workers write their results into shared
+    arrays too, so nothing large is pickled either way.
+
+    Periods are counted from each deal's run date, so every deal sees the
+    same SOFR in the same column. Returns ``principal`` and ``interest``
+    ``(deals, scenarios, periods)`` received on the holdings, ``defaulted``
+    ``(deals, scenarios)`` where the senior interest step defaulted, the
+    portfolio ``cashflows`` ``(scenarios, periods)`` and the scenario set.
+    """
+    loaded=[_load_position(position) for position in positions]
+    frequencies={position["inputs"]["payment_frequency"] for position in loaded}
+    if len(frequencies)>1:
+        raise ValueError(f"Deals in one portfolio must share a payment frequency, got {sorted(frequencies)}")
+    n_periods=max(deal_periods(position["inputs"]) for position in loaded)
+    if scenarios is None:
+        scenarios=scenario_set(n_scenarios,n_periods,default_rates,prepayment_rates,sofr_model,seed,periods_per_year=frequencies.pop())
+    n_scenarios=len(scenarios["default_rate"])
+    if scenarios["sofr"].shape[1]<n_periods+1:
+        raise ValueError(f"Scenario SOFR paths cover {scenarios['sofr'].shape[1]} periods, the portfolio needs {n_periods+1}")
+
+    arrays={name:np.asarray(scenarios[name],dtype=float) for name in SCENARIO_ARRAYS}
+    arrays["principal"]=np.zeros((len(positions),n_scenarios,n_periods))
+    arrays["interest"]=np.zeros((len(positions),n_scenarios,n_periods))
+    arrays["defaulted"]=np.zeros((len(positions),n_scenarios),dtype=bool)
+    blocks,specs=_share(arrays)
+    del arrays
+    try:
+        batch_size=batch_size or n_scenarios
+        tasks=[(d,lo,min(lo+batch_size,n_scenarios)) for d in range(len(positions)) for lo in range(0,n_scenarios,batch_size)]
+        with ProcessPoolExecutor(max_workers=max_workers,initializer=_init_worker,initargs=(positions,specs)) as executor:
+            for _ in executor.map(_run_block,tasks):
+                pass
+        result={name:_view(blocks,specs,name).copy() for name in RESULT_ARRAYS}
+    finally:
+        _release(blocks)
+
+    result["cashflows"]=(result["principal"]+result["interest"]).sum(axis=0)
+    result["deals"]=[_position_name(position) for position in positions]
+    result["scenarios"]=scenarios
+    return result
+
+
+def portfolio_summary(result,quantiles=(0.05,0.5,0.95)):
+    """Per-period expected principal, interest and total portfolio cashflow, plus quantiles of the total across scenarios"""
+    table=pd.DataFrame({
+        "period":np.arange(1,result["cashflows"].shape[1]+1),
+        "principal":result["principal"].sum(axis=0).mean(axis=0),
+        "interest":result["interest"].sum(axis=0).mean(axis=0),
+        "total":result["cashflows"].mean(axis=0),
+    })
+    for q in quantiles:
+        table[f"total_q{q:g}"]=np.quantile(result["cashflows"],q,axis=0)
+    return table
+
+
+if __name__=="__main__":
+    positions=[
+        {"name":"senior","holdings":{"A-1":10_000_000}},
+        {"name":"mezz","holdings":{"D-1a":5_000_000,"E":2_000_000}},
+    ]
+    result=run_portfolio(positions,n_scenarios=200,default_rates=np.linspace(0.0,0.06,200),seed=0)
+    print(result["defaulted"].mean(axis=1))
+    print(portfolio_summary(result).head(12).round(0).to_string(index=False))
@@ -0,0 +1,111 @@
+from time import perf_counter
+
+
+STAT_FIELDS=("calls","seconds","self_seconds","cash")
+
+
+class WaterfallProfiler:
+    """Call counts, wall time and cash moved per waterfall action, overall and per period.
+
+    Attach one with ``CashflowEngine.enable_profiling`` (or
+    ``BatchCashflowEngine.enable_profiling``): the engines then run wrapped
+    copies of their step handlers. Nothing is wrapped while no profiler is
+    attached, so a disabled profiler costs nothing.
+
+    ``seconds`` includes nested work (a failed coverage test runs the
+    principal waterfall), ``self_seconds`` excludes it. ``cash`` is what the
+    step added to its own ledger column, summed over scenarios for batch runs.
+    Hooks are called after every step with an event dict:
+    ``waterfall``, ``period``, ``priority``, ``action``, ``seconds``, ``cash``.
+    """
+    def __init__(self,per_period=True):
+        self.per_period=per_period
+        self.hooks=[]
+        self.reset()
+
+    def reset(self):
+        self.actions={}
+        self.periods={}
+        self._stack=[]
+
+    def add_hook(self,hook):
+        self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self,hook):
+        self.hooks.remove(hook)
+
+    def _record(self,key,period,priority,seconds,self_seconds,cash):
+        stats=self.actions.get(key)
+        if stats is None:
+            stats=self.actions[key]=[0,0.0,0.0,0.0]
+        stats[0]+=1
+        stats[1]+=seconds
+        stats[2]+=self_seconds
+        stats[3]+=cash
+        if self.per_period:
+            by_action=self.periods.setdefault(period,{})
+            stats=by_action.get(key)
+            if stats is None:
+                stats=by_action[key]=[0,0.0,0.0,0.0]
+            stats[0]+=1
+            stats[1]+=seconds
+            stats[2]+=self_seconds
+            stats[3]+=cash
+        if self.hooks:
+            event={"waterfall":key[0],"period":period,"priority":priority,"action":key[1],"seconds":seconds,"cash":cash}
+            for hook in self.hooks:
+                hook(event)
+
+    def wrap(self,waterfall,action,handler,priority=None,cash_at=None):
+        """``handler`` timed under ``(waterfall, action)``; its first argument must be the period.
+
+        ``cash_at(period)`` is read before and after the call and the
+        difference is recorded as the cash moved.
+        """
+        key=(waterfall,action)
+        stack=self._stack
+
+        def profiled(period,*args,**kwargs):
+            before=0.0 if cash_at is None else cash_at(period)
+            stack.append(0.0)
+            start=perf_counter()
+            try:
+                return handler(period,*args,**kwargs)
+            finally:
+                seconds=perf_counter()-start
+                children=stack.pop()
+                if stack:
+                    stack[-1]+=seconds
+                cash=0.0 if cash_at is None else cash_at(period)-before
+                self._record(key,period,priority,seconds,seconds-children,cash)
+        return profiled
+
+    def instrument(self,waterfall,steps,cash_at):
+        """Wrapped copy of a ``(priority, action, handler, tranche)`` list; ``cash_at(period, priority, action)`` reads the step's ledger cell"""
+        return [(priority,action,self.wrap(waterfall,action,handler,priority,
+                                           lambda period,priority=priority,action=action:cash_at(period,priority,action)),tranche)
+                for priority,action,handler,tranche in steps]
+
+    @staticmethod
+    def _nest(flat):
+        nested={}
+        for (waterfall,action),stats in flat.items():
+            nested.setdefault(waterfall,{})[action]=dict(zip(STAT_FIELDS,stats))
+        return nested
+
+    def report(self):
+        """``{"actions": {waterfall: {action: stats}}, "periods": {period: {waterfall: {action: stats}}}, "total_seconds": ...}``"""
+        return {
+            "actions":self._nest(self.actions),
+            "periods":{period:self._nest(by_action) for period,by_action in sorted(self.periods.items())},
+            "total_seconds":sum(stats[2] for stats in self.actions.values()),
+        }
+
+    def split(self):
+        """Share of profiled self time per ``"waterfall:action"``, largest first"""
+        total=sum(stats[2] for stats in self.actions.values())
+        if not total:
+            return {}
+        ranked=sorted(self.actions.items(),key=lambda item:-item[1][2])
+        return {f"{waterfall}:{action}":stats[2]/total for (waterfall,action),stats in ranked}
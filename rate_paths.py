@@ -0,0 +1,197 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+
+SAMPLING_METHODS=("random","antithetic","sobol")
+
+SOBOL_DIRECTIONS_PATH=os.path.join(os.path.dirname(os.path.abspath(__file__)),"sobol_directions.txt")
+
+_SOBOL_BITS=30
+
+
+@dataclass(frozen=True)
+class FlatShockModel:
+    """The original SOFR assumption: an independent shock around a flat level each period.
+
+    ``rate = max(floor, base_sofr - mean_reversion + vol*z)``. Despite the
+    parameter name nothing reverts; use ``VasicekModel`` for that.
+    """
+    base_sofr: float = 0.053
+    mean_reversion: float = 0.0002
+    vol: float = 0.0005
+    floor: float = 0.002
+
+    def n_shocks(self,n_periods):
+        return n_periods
+
+    def paths(self,shocks,n_periods,periods_per_year):
+        return np.maximum(self.floor,self.base_sofr-self.mean_reversion+self.vol*shocks)
+
+
+@dataclass(frozen=True)
+class VasicekModel:
+    """Mean-reverting short rate around a forward curve.
+
+    ``rate_t = forward_t + x_t`` where ``x`` is an Ornstein-Uhlenbeck process
+    with speed ``kappa`` and annual volatility ``sigma``, stepped exactly:
+    ``x_t+1 = x_t*exp(-kappa*dt) + sigma*sqrt((1-exp(-2*kappa*dt))/(2*kappa))*z``.
+    ``forward_curve`` holds one rate per period and is extended flat; without
+    one the curve is flat at ``base_sofr``. Column 0 is ``initial_rate``
+    (the forward at period 0 by default) and is not random.
+    """
+    kappa: float = 0.5
+    sigma: float = 0.01
+    base_sofr: float = 0.053
+    forward_curve: tuple = None
+    initial_rate: float = None
+    floor: float = 0.002
+
+    def n_shocks(self,n_periods):
+        return max(n_periods-1,0)
+
+    def forwards(self,n_periods):
+        if self.forward_curve is None:
+            return np.full(n_periods,float(self.base_sofr))
+        curve=np.asarray(self.forward_curve,dtype=float)
+        if len(curve)>=n_periods:
+            return curve[:n_periods].copy()
+        return np.concatenate([curve,np.full(n_periods-len(curve),curve[-1])])
+
+    def paths(self,shocks,n_periods,periods_per_year):
+        forwards=self.forwards(n_periods)
+        dt=1/periods_per_year
+        decay=np.exp(-self.kappa*dt)
+        if self.kappa>0:
+            step_vol=self.sigma*np.sqrt((1-decay**2)/(2*self.kappa))
+        else:
+            step_vol=self.sigma*np.sqrt(dt)
+        initial_rate=forwards[0] if self.initial_rate is None else self.initial_rate
+        deviation=np.empty((shocks.shape[0],n_periods))
+        deviation[:,0]=initial_rate-forwards[0]
+        for t in range(1,n_periods):
+            deviation[:,t]=deviation[:,t-1]*decay+step_vol*shocks[:,t-1]
+        return np.maximum(self.floor,forwards+deviation)
+
+
+@lru_cache(maxsize=None)
+def _sobol_table():
+    """Joe-Kuo (new-joe-kuo-6.21201) ``(degree, a, initial m)`` rows for Sobol dimensions 2, 3, ..."""
+    rows=[]
+    with open(SOBOL_DIRECTIONS_PATH) as f:
+        next(f)
+        for line in f:
+            d,degree,a,*m=(int(value) for value in line.split())
+            rows.append((degree,a,tuple(m)))
+    return tuple(rows)
+
+
+@lru_cache(maxsize=None)
+def _sobol_directions(dimensions):
+    """Direction numbers, one row of ``_SOBOL_BITS`` per dimension.
+
+    Dimension 0 is the van der Corput sequence; the others use the Joe-Kuo
+    primitive polynomials and initial values (``sobol_directions.txt``).
+    Every dimension is stratified on its own; pairs of dimensions are
+    (t,m,2)-nets with t kept small by the Joe-Kuo search, but apart from
+    the first pair t is not zero.
+    """
+    table=_sobol_table()
+    if dimensions>len(table)+1:
+        raise ValueError(f"Sobol sampling supports up to {len(table)+1} dimensions (periods), got {dimensions}")
+    directions=np.zeros((dimensions,_SOBOL_BITS),dtype=np.int64)
+    directions[0]=[1<<(_SOBOL_BITS-1-k) for k in range(_SOBOL_BITS)]
+    for dim in range(1,dimensions):
+        degree,a,initial=table[dim-1]
+        m=list(initial)
+        for k in range(degree,_SOBOL_BITS):
+            value=m[k-degree]^(m[k-degree]<<degree)
+            for j in range(1,degree):
+                if a>>(degree-1-j)&1:
+                    value^=m[k-j]<<j
+            m.append(value)
+        directions[dim]=[m[k]<<(_SOBOL_BITS-1-k) for k in range(_SOBOL_BITS)]
+    return directions
+
+
+def sobol_uniforms(n_points,dimensions,rng):
+    """(n_points, dimensions) Sobol points in (0, 1) with a random digital shift from ``rng``"""
+    if n_points>=1<<_SOBOL_BITS:
+        raise ValueError(f"Sobol sampling supports fewer than {1<<_SOBOL_BITS} paths")
+    directions=_sobol_directions(dimensions)
+    index=np.arange(n_points,dtype=np.int64)
+    gray=index^(index>>1)
+    points=np.zeros((n_points,dimensions),dtype=np.int64)
+    for bit in range(_SOBOL_BITS):
+        on=(gray>>bit)&1
+        if not on.any():
+            break
+        points^=on[:,None]*directions[:,bit][None,:]
+    points^=rng.integers(0,1<<_SOBOL_BITS,size=dimensions,dtype=np.int64)[None,:]
+    return (points+0.5)/(1<<_SOBOL_BITS)
+
+
+def _inv_cdf(p):
+    """Standard normal quantiles of an array of probabilities in (0, 1).
+
+    Wichura's AS241 rational approximations (the ones ``statistics.NormalDist``
+    uses), evaluated on whole arrays; accurate to about 1e-16.
+    """
+    p=np.asarray(p,dtype=float)
+    q=p-0.5
+    central=np.abs(q)<=0.425
+    x=np.empty_like(p)
+
+    r=0.180625-q[central]**2
+    x[central]=q[central]*np.polyval(_AS241_A,r)/np.polyval(_AS241_B,r)
+
+    tail=~central
+    r=np.sqrt(-np.log(np.where(q[tail]<=0,p[tail],1-p[tail])))
+    near=r<=5.0
+    tail_x=np.where(near,
+                    np.polyval(_AS241_C,r-1.6)/np.polyval(_AS241_D,r-1.6),
+                    np.polyval(_AS241_E,r-5.0)/np.polyval(_AS241_F,r-5.0))
+    x[tail]=np.where(q[tail]<0,-tail_x,tail_x)
+    return x
+
+
+# AS241 coefficients, highest power first for np.polyval
+_AS241_A=(2.5090809287301226727e+3,3.3430575583588128105e+4,6.7265770927008700853e+4,4.5921953931549871457e+4,
+          1.3731693765509461125e+4,1.9715909503065514427e+3,1.3314166789178437745e+2,3.3871328727963666080e+0)
+_AS241_B=(5.2264952788528545610e+3,2.8729085735721942674e+4,3.9307895800092710610e+4,2.1213794301586595867e+4,
+          5.3941960214247511077e+3,6.8718700749205790830e+2,4.2313330701600911252e+1,1.0)
+_AS241_C=(7.74545014278341407640e-4,2.27238449892691845833e-2,2.41780725177450611770e-1,1.27045825245236838258e+0,
+          3.64784832476320460504e+0,5.76949722146069140550e+0,4.63033784615654529590e+0,1.42343711074968357734e+0)
+_AS241_D=(1.05075007164441684324e-9,5.47593808499534494600e-4,1.51986665636164571966e-2,1.48103976427480074590e-1,
+          6.89767334985100004550e-1,1.67638483018380384940e+0,2.05319162663775882187e+0,1.0)
+_AS241_E=(2.01033439929228813265e-7,2.71155556874348757815e-5,1.24266094738807843860e-3,2.65321895265761230930e-2,
+          2.96560571828504891230e-1,1.78482653991729133580e+0,5.46378491116411436990e+0,6.65790464350110377720e+0)
+_AS241_F=(2.04426310338993978564e-15,1.42151175831644588870e-7,1.84631831751005468180e-5,7.86869131145613259100e-4,
+          1.48753612908506148525e-2,1.36929880922735805310e-1,5.99832206555887937690e-1,1.0)
+
+
+def standard_normals(n_paths,n_steps,rng,sampling="random"):
+    if sampling not in SAMPLING_METHODS:
+        raise ValueError(f"Unknown sampling {sampling!r}; expected one of {SAMPLING_METHODS}")
+    if sampling=="random":
+        return rng.standard_normal((n_paths,n_steps))
+    if sampling=="antithetic":
+        half=rng.standard_normal(((n_paths+1)//2,n_steps))
+        return np.concatenate([half,-half])[:n_paths]
+    if n_steps==0:
+        return np.zeros((n_paths,0))
+    return _inv_cdf(sobol_uniforms(n_paths,n_steps,rng))
+
+
+def generate_sofr_paths(n_paths,n_periods,model=None,seed=None,sampling="random",periods_per_year=4):
+    """(n_paths, n_periods) matrix of SOFR fractions; column p is the rate for period p+1.
+
+    ``seed`` seeds a ``np.random.Generator`` (or pass a Generator), so the
+    same arguments always give the same matrix.
+    """
+    model=FlatShockModel() if model is None else model
+    rng=seed if isinstance(seed,np.random.Generator) else np.random.default_rng(seed)
+    shocks=standard_normals(n_paths,model.n_shocks(n_periods),rng,sampling)
+    return model.paths(shocks,n_periods,periods_per_year)
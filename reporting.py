@@ -0,0 +1,118 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+TABLE_FORMATS=("csv","parquet")
+
+EXCEL_SHEETS={"payments":"Payments","coverage_tests":"Coverage_Tests","deferred_interest":"deferred_interest"}
+
+COVERAGE_TYPES=("oc","ic")
+
+
+def payment_labels(plan):
+    """Payment column names in compiled waterfall order: interest steps, principal steps, reserves"""
+    return [f"{beneficiary}_{payment_type}" for beneficiary,payment_type in plan.columns]
+
+
+def payments_table(data):
+    """One row per period up to the last recorded one, one column per payment of the compiled waterfall"""
+    ledger=data["payment_history"]
+    return ledger.frame().reset_index()
+
+
+def coverage_table(data):
+    rows=[(tranche,event["period"],event["ic/oc"] if isinstance(event["ic/oc"],str) else "",event["amount"])
+          for tranche,events in data["coverage_test_history"].items() for event in events]
+    table=pd.DataFrame(rows,columns=["tranche","period","test_type","diverted_amount"]).astype({"period":int,"diverted_amount":float})
+    return table.sort_values(by=["period","tranche","test_type"]).reset_index(drop=True)
+
+
+def deferred_table(data):
+    accounts=data["deferred_interest"]
+    tranches=[np.full(int(account.recorded.sum()),name,dtype=object) for name,account in accounts.items()]
+    periods=[np.flatnonzero(account.recorded) for account in accounts.values()]
+    amounts=[account.amounts[account.recorded] for account in accounts.values()]
+    table=pd.DataFrame({
+        "tranche":np.concatenate(tranches) if tranches else np.array([],dtype=object),
+        "period":np.concatenate(periods) if periods else np.array([],dtype=int),
+        "differed_amount":np.concatenate(amounts) if amounts else np.array([]),
+    })
+    return table.sort_values(by=["period","tranche","differed_amount"]).reset_index(drop=True)
+
+
+def run_tables(data):
+    """Payment, coverage test and deferred interest tables of one run, from ``dm.data`` (or ``BatchCashflowEngine.scenario_data``)"""
+    return {"payments":payments_table(data),"coverage_tests":coverage_table(data),"deferred_interest":deferred_table(data)}
+
+
+def _scenario_periods(batch):
+    """(periods, scenarios) mask of the periods each scenario actually ran"""
+    periods=np.arange(batch.payments.shape[0])[:,None]
+    return (periods>=batch.start_period) & (periods<=batch.last_period[None,:])
+
+
+def batch_payments_table(batch):
+    """Long table of a ``BatchCashflowEngine`` run: one row per (scenario, period), one column per payment"""
+    ran=_scenario_periods(batch).T
+    scenario,period=np.nonzero(ran)
+    amounts=batch.payments.transpose(2,0,1)[ran]
+    table=pd.DataFrame(amounts,columns=payment_labels(batch.plan),copy=False)
+    table.insert(0,"period",period)
+    table.insert(0,"scenario",scenario)
+    return table
+
+
+def batch_coverage_table(batch):
+    group,test,period,scenario=np.nonzero(batch.coverage_failed)
+    table=pd.DataFrame({
+        "scenario":scenario,
+        "tranche":np.array(batch.plan.coverage_groups,dtype=object)[group],
+        "period":period,
+        "test_type":np.array(COVERAGE_TYPES,dtype=object)[test],
+        "diverted_amount":batch.coverage_amounts[group,test,period,scenario],
+    })
+    return table.sort_values(by=["scenario","period","tranche","test_type"]).reset_index(drop=True)
+
+
+def batch_deferred_table(batch):
+    """Deferred interest of every tranche that deferred in a scenario, for each period that scenario ran"""
+    deferred=batch.deferred_interest[:,:batch.payments.shape[0]]
+    keep=deferred.any(axis=1)[:,None,:] & _scenario_periods(batch)[None,:,:]
+    tranche,period,scenario=np.nonzero(keep)
+    table=pd.DataFrame({
+        "scenario":scenario,
+        "tranche":np.array(batch.plan.tranche_names,dtype=object)[tranche],
+        "period":period,
+        "differed_amount":deferred[tranche,period,scenario],
+    })
+    return table.sort_values(by=["scenario","period","tranche"]).reset_index(drop=True)
+
+
+def batch_tables(batch):
+    return {"payments":batch_payments_table(batch),"coverage_tests":batch_coverage_table(batch),"deferred_interest":batch_deferred_table(batch)}
+
+
+def write_tables(tables,directory,fmt="csv"):
+    """Write each table to ``directory/<name>.<fmt>`` and return the paths; Parquet needs pyarrow or fastparquet"""
+    if fmt not in TABLE_FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of {TABLE_FORMATS}")
+    os.makedirs(directory,exist_ok=True)
+    paths={}
+    for name,table in tables.items():
+        paths[name]=os.path.join(directory,f"{name}.{fmt}")
+        if fmt=="csv":
+            table.to_csv(paths[name],index=False)
+        else:
+            table.to_parquet(paths[name],index=False)
+    return paths
+
+
+def write_excel(tables,path):
+    """Single-deal workbook with one sheet per table; bulk runs should use ``write_tables``"""
+    if any("scenario" in table.columns for table in tables.values()):
+        raise ValueError("Excel output is for single runs; write batch tables with write_tables")
+    with pd.ExcelWriter(path) as writer:
+        for name,table in tables.items():
+            table.to_excel(writer,sheet_name=EXCEL_SHEETS.get(name,name),index=False)
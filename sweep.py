@@ -0,0 +1,133 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+from cash_flow_engine import CLODataManager, CashflowEngine, compile_plan, load_deal, default_inputs, DEFAULT_DEAL_PATH
+from batch_engine import BatchCashflowEngine
+from rate_paths import generate_sofr_paths
+from collateral import LoanTape
+
+
+_worker_deal=None
+
+
+def scenario_grid(default_rates,prepayment_rates,sofr_seeds=(None,),reinvestment_period_ends=(None,)):
+    """Cartesian product of the sweep dimensions as a list of scenario dicts"""
+    return [{"default_rate":default_rate,"prepayment_rate":prepayment_rate,"sofr_seed":sofr_seed,"reinvestment_period_end":reinvestment_period_end}
+            for default_rate,prepayment_rate,sofr_seed,reinvestment_period_end
+            in itertools.product(default_rates,prepayment_rates,sofr_seeds,reinvestment_period_ends)]
+
+
+def sofr_path(seed,periods,model=None):
+    return generate_sofr_paths(1,periods+1,model,seed)[0]
+
+
+def deal_periods(inputs_dict):
+    start=CashflowEngine.convert_date_to_period(inputs_dict["run_date"],inputs_dict["first_coupon_date"],inputs_dict["payment_frequency"])
+    end=CashflowEngine.convert_date_to_period(inputs_dict["legal_maturity"],inputs_dict["first_coupon_date"],inputs_dict["payment_frequency"])
+    return end-start+1
+
+
+def summarize(data,scenario,status,error=None):
+    """Reduce a finished run to a small picklable summary"""
+    paid=data["payment_history"].totals()
+    last_period=data["payment_history"].last_period()
+
+    coverage_failures={}
+    first_coverage_failure=None
+    for tranche,events in data["coverage_test_history"].items():
+        coverage_failures[tranche]=len(events)-1
+        for event in events[1:]:
+            if first_coverage_failure is None or event["period"]<first_coverage_failure:
+                first_coverage_failure=event["period"]
+
+    return {
+        **scenario,
+        "status":status,
+        "error":error,
+        "last_period":last_period,
+        "collateral_value":data["deal_info"]["current_collateral_value"],
+        "tranche_balances":data["tranches"].balance_dict(),
+        "paid":paid,
+        "coverage_failures":coverage_failures,
+        "first_coverage_failure":first_coverage_failure,
+    }
+
+
+def _init_worker(deal_path,inputs_dict):
+    global _worker_deal
+    _worker_deal=load_deal(deal_path)
+    _worker_deal["inputs_dict"]=inputs_dict
+    loan_tape=_worker_deal.get("loan_tape")
+    _worker_deal["loan_tape"]=None if loan_tape is None else LoanTape.from_frame(loan_tape)
+    _worker_deal["plan"]=compile_plan(_worker_deal["tranche_info"],_worker_deal["interest_waterfall_info"],
+                                      _worker_deal["principal_payment_waterfall"],_worker_deal["coverage_test_info"])
+
+
+def _scenario_inputs(scenario):
+    inputs=dict(_worker_deal["inputs_dict"])
+    if scenario.get("reinvestment_period_end") is not None:
+        inputs["reinvestment_period_end"]=scenario["reinvestment_period_end"]
+    return inputs
+
+
+def _run_scenario(scenario):
+    inputs=_scenario_inputs(scenario)
+    path=sofr_path(scenario.get("sofr_seed"),deal_periods(inputs))
+
+    dm=CLODataManager(file_path=None)
+    cf_engine=CashflowEngine(_worker_deal["tranche_info"],_worker_deal["interest_waterfall_info"],_worker_deal["principal_payment_waterfall"],
+                             _worker_deal["coverage_test_info"],dm,scenario["prepayment_rate"],scenario["default_rate"],inputs,sofr_path=path,plan=_worker_deal["plan"],
+                             loan_tape=_worker_deal["loan_tape"])
+    try:
+        cf_engine.run()
+    except RuntimeError as e:
+        return summarize(dm.data,scenario,"default",str(e))
+    except Exception as e:
+        return summarize(dm.data,scenario,"error",repr(e))
+    return summarize(dm.data,scenario,"complete")
+
+
+def _run_batch(scenarios):
+    inputs=dict(_worker_deal["inputs_dict"])
+    inputs["reinvestment_period_end"]=[_scenario_inputs(s)["reinvestment_period_end"] for s in scenarios]
+    periods=deal_periods(inputs)
+    paths=[sofr_path(s.get("sofr_seed"),periods) for s in scenarios]
+
+    engine=BatchCashflowEngine(_worker_deal["tranche_info"],_worker_deal["interest_waterfall_info"],_worker_deal["principal_payment_waterfall"],
+                               _worker_deal["coverage_test_info"],[s["prepayment_rate"] for s in scenarios],[s["default_rate"] for s in scenarios],
+                               inputs,sofr_paths=paths,plan=_worker_deal["plan"],loan_tape=_worker_deal["loan_tape"])
+    engine.run()
+    summaries=[]
+    for i,scenario in enumerate(scenarios):
+        status=engine.status[i]
+        error=f"STOP: senior tranche payment due / default at period {engine.last_period[i]}" if status=="default" else None
+        summaries.append(summarize(engine.scenario_data(i),scenario,status,error))
+    return summaries
+
+
+def run_sweep(scenarios,deal_path=DEFAULT_DEAL_PATH,inputs_dict=None,max_workers=None,chunksize=1,batch_size=None):
+    """Fan scenarios out over a process pool and yield one summary per scenario.
+
+    The deal workbook is parsed and compiled once in each worker's initializer. With
+    ``batch_size`` set, each task runs a block of scenarios through
+    ``BatchCashflowEngine`` instead of one ``CashflowEngine`` per scenario.
+    Summaries are yielded in scenario order as soon as they are available.
+    """
+    if inputs_dict is None:
+        inputs_dict=default_inputs()
+    scenarios=[dict(scenario,id=i) for i,scenario in enumerate(scenarios)]
+
+    with ProcessPoolExecutor(max_workers=max_workers,initializer=_init_worker,initargs=(deal_path,inputs_dict)) as executor:
+        if batch_size:
+            blocks=[scenarios[i:i+batch_size] for i in range(0,len(scenarios),batch_size)]
+            for summaries in executor.map(_run_batch,blocks):
+                yield from summaries
+        else:
+            yield from executor.map(_run_scenario,scenarios,chunksize=chunksize)
+
+
+if __name__=="__main__":
+    grid=scenario_grid(default_rates=[0.01,0.02,0.04],prepayment_rates=[0.02,0.10],sofr_seeds=[0,1])
+    for summary in run_sweep(grid):
+        print(summary["id"],summary["default_rate"],summary["prepayment_rate"],summary["sofr_seed"],summary["status"],summary["last_period"],
+              round(summary["paid"].get("Subordinated notes_residual",0),2))
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from analytics import irr, tranche_analytics, tranche_cashflows, engine_analytics, analytics_frame
+from cash_flow_engine import DEFERRED_INTEREST_PAID
+
+
+def test_irr_by_hand():
+    cashflows=np.array([[0.0,110.0,0.0],[0.0,5.0,105.0],[0.0,0.0,0.0]])
+    rates=irr(cashflows,[100.0,100.0,100.0])
+    assert rates[0]==pytest.approx(0.10,abs=1e-12)
+    assert rates[1]==pytest.approx(0.05,abs=1e-12)
+    assert np.isnan(rates[2])
+
+
+def test_bullet_note_by_hand(plan):
+    pay_freq=4
+    tranche=plan.tranche_index["A-1"]
+    payments=np.zeros((4,len(plan.columns)))
+    payments[1,plan.column_index[("A-1","interest")]]=2.0
+    payments[2,plan.column_index[("A-1","interest")]]=2.0
+    payments[2,plan.column_index[("A-1","principal")]]=100.0
+    prices=np.zeros(len(plan.tranche_names))
+    prices[tranche]=100.0
+    metrics=tranche_analytics(plan,payments,pay_freq,prices)
+
+    rate=0.02
+    macaulay=(2.0/(1+rate)*1+102.0/(1+rate)**2*2)/100.0/pay_freq
+    assert metrics["wal"][tranche,0]==pytest.approx(2/pay_freq)
+    assert metrics["yield"][tranche,0]==pytest.approx(rate*pay_freq)
+    assert metrics["irr"][tranche,0]==pytest.approx((1+rate)**pay_freq-1)
+    assert metrics["modified_duration"][tranche,0]==pytest.approx(macaulay/(1+rate))
+
+
+def test_deferred_interest_paid_counts_as_interest(plan):
+    payments=np.zeros((3,len(plan.columns)))
+    payments[2,plan.column_index[("C","principal_deferred_interest")]]=80.0
+    payments[2,plan.column_index[("C",DEFERRED_INTEREST_PAID)]]=20.0
+    principal,interest=tranche_cashflows(plan,payments)
+    tranche=plan.tranche_index["C"]
+    assert principal[tranche,0,2]==80.0
+    assert interest[tranche,0,2]==20.0
+
+
+def test_batch_analytics_match_scalar(inputs,scenarios,sofr_paths,make_engine,make_batch,run_engine):
+    batch=make_batch(inputs,scenarios,sofr_paths)
+    batch.run()
+    metrics=engine_analytics(batch)
+    for i,(prepayment_rate,default_rate) in enumerate(scenarios):
+        cf_engine=make_engine(inputs,sofr_paths[i],prepayment_rate,default_rate)
+        run_engine(cf_engine)
+        expected=engine_analytics(cf_engine)
+        for metric,values in expected.items():
+            np.testing.assert_allclose(metrics[metric][:,i],values[:,0],rtol=1e-10)
+
+    table=analytics_frame(batch.plan,metrics)
+    assert len(table)==len(scenarios)*len(batch.plan.tranche_names)
@@ -0,0 +1,32 @@
+import numpy as np
+
+import reporting
+
+
+def test_batch_matches_scalar_pool(inputs,scenarios,sofr_paths,make_engine,make_batch,run_engine,assert_batch_matches):
+    scalars=[make_engine(inputs,sofr_paths[i],prepayment_rate,default_rate) for i,(prepayment_rate,default_rate) in enumerate(scenarios)]
+    statuses=[run_engine(cf_engine) for cf_engine in scalars]
+    batch=make_batch(inputs,scenarios,sofr_paths)
+    batch.run()
+    assert_batch_matches(batch,scalars,statuses)
+
+
+def test_per_scenario_reinvestment_end(inputs,sofr_paths,make_engine,make_batch,run_engine,assert_batch_matches):
+    reinvestment_period_end=[4,16,24]
+    scalars=[make_engine(dict(inputs,reinvestment_period_end=end),sofr_paths[i]) for i,end in enumerate(reinvestment_period_end)]
+    statuses=[run_engine(cf_engine) for cf_engine in scalars]
+    batch=make_batch(dict(inputs,reinvestment_period_end=reinvestment_period_end),[(0.02,0.02)]*3,sofr_paths[:3])
+    batch.run()
+    assert_batch_matches(batch,scalars,statuses)
+
+
+def test_scenario_data_matches_scalar_tables(inputs,scenarios,sofr_paths,make_engine,make_batch,run_engine):
+    batch=make_batch(inputs,scenarios,sofr_paths)
+    batch.run()
+    for i,(prepayment_rate,default_rate) in enumerate(scenarios):
+        cf_engine=make_engine(inputs,sofr_paths[i],prepayment_rate,default_rate)
+        run_engine(cf_engine)
+        expected=reporting.run_tables(cf_engine.dm.data)
+        actual=reporting.run_tables(batch.scenario_data(i))
+        np.testing.assert_array_equal(actual["payments"].to_numpy(),expected["payments"].to_numpy())
+        np.testing.assert_array_equal(actual["coverage_tests"]["diverted_amount"].to_numpy(),expected["coverage_tests"]["diverted_amount"].to_numpy())
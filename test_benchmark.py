@@ -0,0 +1,24 @@
+import json
+
+from benchmark import compare, load_baseline
+
+
+def _result(case,scalar,save):
+    return {"case":case,"scalar_periods_per_sec":scalar,"save_data_seconds":save}
+
+
+def test_compare_flags_regressions_past_the_threshold():
+    baseline={"results":[_result("sample",1000.0,0.10),_result("gone",1000.0,0.10)]}
+    results=[_result("sample",850.0,0.105),_result("new",1.0,1.0)]
+    regressions=compare(results,baseline,threshold=0.10)
+    assert [(case,metric) for case,metric,*_ in regressions]==[("sample","scalar_periods_per_sec")]
+    assert compare(results,baseline,threshold=0.20)==[]
+
+
+def test_baseline_is_only_used_in_its_own_mode(tmp_path,capsys):
+    path=tmp_path/"baseline.json"
+    assert load_baseline(str(path),quick=True) is None
+    path.write_text(json.dumps({"quick":True,"results":[]}))
+    assert load_baseline(str(path),quick=True)=={"quick":True,"results":[]}
+    assert load_baseline(str(path),quick=False) is None
+    assert "quick run; not comparing" in capsys.readouterr().out
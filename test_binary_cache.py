@@ -0,0 +1,95 @@
+import os
+import shutil
+import stat
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import cash_flow_engine
+from cash_flow_engine import DEFAULT_DEAL_PATH, load_deal
+from binary_cache import save_deal, load_cached_deal, save_results, load_results, payments_frame, coverage_frame, deferred_frame
+import reporting
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path=tmp_path/"deal.xlsx"
+    shutil.copyfile(DEFAULT_DEAL_PATH,path)
+    yield str(path)
+    cash_flow_engine._deal_cache.pop(str(path),None)
+
+
+@pytest.fixture
+def umask():
+    old=os.umask(0o022)
+    yield 0o022
+    os.umask(old)
+
+
+def assert_same_deal(actual,expected):
+    assert actual.keys()==expected.keys()
+    for name,frame in expected.items():
+        pd.testing.assert_frame_equal(actual[name],frame)
+
+
+def test_deal_cache_round_trip(workbook,tmp_path):
+    deal=load_deal(workbook,cache_dir=False)
+    save_deal(deal,tmp_path/"cache",workbook)
+    assert_same_deal(load_cached_deal(tmp_path/"cache",workbook),deal)
+
+
+def test_stale_deal_cache_is_a_miss(workbook,tmp_path):
+    save_deal(load_deal(workbook,cache_dir=False),tmp_path/"cache",workbook)
+    stat=os.stat(workbook)
+    os.utime(workbook,ns=(stat.st_atime_ns,stat.st_mtime_ns+1_000_000_000))
+    assert load_cached_deal(tmp_path/"cache",workbook) is None
+
+
+@pytest.mark.parametrize("damage",["delete","truncate","empty"])
+def test_damaged_deal_cache_is_rebuilt(workbook,tmp_path,damage):
+    cache_dir=tmp_path/"cache"
+    deal=load_deal(workbook,cache_dir=False)
+    save_deal(deal,cache_dir,workbook)
+    array=sorted(name for name in os.listdir(cache_dir) if name.endswith(".npy"))[0]
+    if damage=="delete":
+        os.remove(cache_dir/array)
+    else:
+        data=(cache_dir/array).read_bytes()
+        (cache_dir/array).write_bytes(data[:len(data)//2] if damage=="truncate" else b"")
+    assert load_cached_deal(cache_dir,workbook) is None
+
+    cash_flow_engine._deal_cache.pop(workbook,None)
+    assert_same_deal(load_deal(workbook,cache_dir=cache_dir),deal)
+    assert_same_deal(load_cached_deal(cache_dir,workbook),deal)
+
+
+def test_results_cache_round_trip(inputs,sofr_paths,make_engine,run_engine,tmp_path):
+    cf_engine=make_engine(inputs,sofr_paths[0],0.02,0.12)
+    run_engine(cf_engine)
+    data=cf_engine.dm.data
+    save_results(data,tmp_path/"results")
+    results=load_results(tmp_path/"results")
+
+    expected=data["payment_history"].frame()
+    cached=payments_frame(results)
+    assert list(cached.columns)==list(expected.columns)
+    np.testing.assert_array_equal(cached.to_numpy(),expected.to_numpy())
+    np.testing.assert_array_equal(results["sofr"],data["sofr"])
+    assert {name:tranche["Balance"] for name,tranche in results["tranches"].items()}==data["tranches"].balance_dict()
+
+    tables=reporting.run_tables(data)
+    coverage=coverage_frame(results).sort_values(by=["period","tranche","test_type"]).reset_index(drop=True)
+    deferred=deferred_frame(results).sort_values(by=["period","tranche","differed_amount"]).reset_index(drop=True)
+    assert len(coverage)==len(tables["coverage_tests"]) and len(deferred)>0
+    np.testing.assert_array_equal(coverage["diverted_amount"].to_numpy(),tables["coverage_tests"]["diverted_amount"].to_numpy())
+    np.testing.assert_array_equal(deferred["differed_amount"].to_numpy(),tables["deferred_interest"]["differed_amount"].to_numpy())
+
+
+def test_cache_directories_keep_their_mode(workbook,tmp_path,umask):
+    deal=load_deal(workbook,cache_dir=False)
+    save_deal(deal,tmp_path/"cache",workbook)
+    assert stat.S_IMODE(os.stat(tmp_path/"cache").st_mode)==0o777 & ~umask
+    os.chmod(tmp_path/"cache",0o750)
+    save_deal(deal,tmp_path/"cache",workbook)
+    assert stat.S_IMODE(os.stat(tmp_path/"cache").st_mode)==0o750
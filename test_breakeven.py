@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import breakeven
+from breakeven import SENIOR_INTEREST, breakeven_rates, rated_tranches, run_candidates, _shared_prefix
+from rate_paths import generate_sofr_paths
+
+
+@pytest.fixture(scope="module")
+def sofr_path(inputs,end_period):
+    return generate_sofr_paths(1,end_period+1,seed=0)[0]
+
+
+@pytest.fixture(scope="module")
+def default_table(deal,inputs,sofr_path):
+    return breakeven_rates(deal,"default_rate",inputs,sofr_path=sofr_path,tol=1e-4)
+
+
+def test_breakevens_converge(deal,inputs,plan,sofr_path,default_table):
+    rated=rated_tranches(plan)
+    for tranche in rated:
+        entry=default_table[plan.tranche_names[tranche]]
+        assert entry["passes_below"]
+        assert entry["upper"]-entry["lower"]<=1e-4
+        assert entry["breakeven"]==entry["lower"]
+        impaired,_=run_candidates(deal,inputs,"default_rate",[entry["lower"],entry["upper"]],0.02,sofr_path,plan)
+        assert impaired[tranche].tolist()==[False,True]
+    breakevens=[default_table[plan.tranche_names[tranche]]["breakeven"] for tranche in rated]
+    assert breakevens==sorted(breakevens,reverse=True)
+
+
+def test_matches_plain_bisection(deal,inputs,plan,sofr_path,default_table):
+    tranche=plan.tranche_index["E"]
+    lo,hi=0.0,1.0
+    while hi-lo>1e-5:
+        mid=(lo+hi)/2
+        impaired,_=run_candidates(deal,inputs,"default_rate",[mid],0.02,sofr_path,plan)
+        lo,hi=(lo,mid) if impaired[tranche,0] else (mid,hi)
+    entry=default_table["E"]
+    assert entry["lower"]-1e-5<=lo<=entry["upper"]+1e-5
+
+
+def test_warm_start_needs_fewer_runs(deal,inputs,sofr_path,default_table,monkeypatch):
+    calls=[]
+    run=breakeven.run_candidates
+    monkeypatch.setattr(breakeven,"run_candidates",lambda *args,**kwargs:calls.append(1) or run(*args,**kwargs))
+    cold=breakeven_rates(deal,"default_rate",inputs,sofr_path=sofr_path,tol=1e-4)
+    cold_runs=len(calls)
+    calls.clear()
+    warm=breakeven_rates(deal,"default_rate",inputs,sofr_path=sofr_path,tol=1e-4,
+                         warm_start={target:entry["breakeven"] for target,entry in default_table.items()})
+    assert len(calls)<cold_runs
+    for target,entry in cold.items():
+        if entry["breakeven"] is not None:
+            assert abs(warm[target]["breakeven"]-entry["breakeven"])<=1e-4
+
+
+def test_targets_skip_unrated_and_residual(deal,inputs,sofr_path,default_table):
+    assert SENIOR_INTEREST in default_table
+    assert "Subordinated notes" not in default_table
+    tranche_info=deal["tranche_info"].copy()
+    tranche_info.loc[tranche_info["Class"]=="E","Preliminary rating"]="NR"
+    table=breakeven_rates(dict(deal,tranche_info=tranche_info),"default_rate",inputs,sofr_path=sofr_path,tol=1e-2)
+    assert "E" not in table and "D-2" in table
+
+
+def test_prepayment_prefix_is_shared(deal,inputs,plan,sofr_path):
+    state=_shared_prefix(deal,inputs,"prepayment_rate",0.02,sofr_path,plan,None)
+    assert state is not None and state.period==inputs["reinvestment_period_end"]
+    candidates=np.linspace(0.0,0.5,6)
+    shared=run_candidates(deal,inputs,"prepayment_rate",candidates,0.02,sofr_path,plan,state=state)
+    full=run_candidates(deal,inputs,"prepayment_rate",candidates,0.02,sofr_path,plan)
+    np.testing.assert_array_equal(shared[0],full[0])
+    np.testing.assert_array_equal(shared[1],full[1])
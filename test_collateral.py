@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cash_flow_engine import CashflowEngine
+from collateral import LoanTape, LoanCollateral, read_loan_tape
+
+
+def test_from_frame_requires_core_columns():
+    with pytest.raises(ValueError,match="Maturity"):
+        LoanTape.from_frame(pd.DataFrame({"Balance":[1.0],"Spread":[3.0]}))
+
+
+def test_maturity_periods_accepts_periods_and_dates(inputs):
+    tape=LoanTape([1.0]*5,[3.0]*5,[20,"24","15/03/2030","2030-03-15",pd.Timestamp("2030-03-15")])
+    convert=lambda date:CashflowEngine.convert_date_to_period(date,inputs["first_coupon_date"],inputs["payment_frequency"])
+    periods=tape.maturity_periods(convert)
+    assert periods[:2].tolist()==[20,24]
+    assert len(set(periods[2:].tolist()))==1
+    assert periods[2]==convert("15/03/2030")
+
+
+def test_read_loan_tape_csv(loan_tape,tmp_path):
+    loan_tape.to_csv(tmp_path/"tape.csv",index=False)
+    tape=read_loan_tape(tmp_path/"tape.csv")
+    assert len(tape)==len(loan_tape)
+    assert tape.total()==pytest.approx(loan_tape["Balance"].sum())
+
+
+def test_one_loan_by_hand():
+    tape=LoanTape([1000.0],[4.0],[3],floor=[0.05],default_rate=[0.08],prepayment_rate=[np.nan])
+    collateral=LoanCollateral(tape,[3],4,10,default_rate=0.02,prepayment_rate=0.04)
+    assert collateral.default(1)==pytest.approx(1000*0.08/4)
+    balance=1000-20
+    assert collateral.principal(1)=={"prepaid_value":pytest.approx(balance*0.04/4),"balloon_payment":0.0}
+    assert collateral.interest(0.03)==pytest.approx(balance*((0.05+4.0)/100)/4)
+    collateral.pay_down()
+    balance-=balance*0.04/4
+    assert collateral.total()==pytest.approx(balance)
+
+    collateral.default(3)
+    balance-=balance*0.08/4
+    assert collateral.principal(3)["balloon_payment"]==pytest.approx(balance)
+    collateral.pay_down()
+    assert collateral.total()==pytest.approx(0.0)
+
+
+def test_reinvestment_only_shrinks_by_defaults():
+    tape=LoanTape([600.0,400.0],[3.0,3.0],[2,8])
+    collateral=LoanCollateral(tape,[2,8],4,10,default_rate=0.04,prepayment_rate=0.1)
+    for period in (1,2,3):
+        defaults=collateral.default(period)
+        before=collateral.total()+defaults
+        collateral.principal(period)
+        collateral.reinvest()
+        assert collateral.total()==pytest.approx(before-defaults)
+
+
+def test_tape_rates_fall_back_per_scenario():
+    tape=LoanTape([1.0,1.0],[3.0,3.0],[8,8],default_rate=[0.1,np.nan])
+    collateral=LoanCollateral(tape,[8,8],4,10,default_rate=[0.01,0.02,0.03],prepayment_rate=0.0,n_scenarios=3)
+    np.testing.assert_array_equal(collateral.default_rate,[[0.1,0.1,0.1],[0.01,0.02,0.03]])
+
+
+def test_batch_matches_scalar_loan_tape(inputs,scenarios,sofr_paths,loan_tape,make_engine,make_batch,run_engine,assert_batch_matches):
+    scalars=[make_engine(inputs,sofr_paths[i],prepayment_rate,default_rate,loan_tape) for i,(prepayment_rate,default_rate) in enumerate(scenarios)]
+    statuses=[run_engine(cf_engine) for cf_engine in scalars]
+    batch=make_batch(inputs,scenarios,sofr_paths,loan_tape)
+    batch.run()
+    assert_batch_matches(batch,scalars,statuses,rtol=1e-7,atol=1e-6)
@@ -0,0 +1,58 @@
+import json
+import os
+import stat
+
+import pytest
+
+from cash_flow_engine import CashflowEngine, CLODataManager
+
+
+@pytest.fixture
+def umask():
+    old=os.umask(0o022)
+    yield 0o022
+    os.umask(old)
+
+
+def run_with(deal,inputs,plan,sofr_path,dm):
+    engine=CashflowEngine(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"],
+                          dm,0.02,0.02,inputs,sofr_path=sofr_path,plan=plan)
+    engine.run()
+    return engine
+
+
+@pytest.mark.parametrize("persistence,checkpoint_every,writes",[("never",1,0),("end",1,1),("periodic",10,None)])
+def test_checkpoint_policy(deal,inputs,plan,sofr_paths,tmp_path,monkeypatch,persistence,checkpoint_every,writes):
+    dm=CLODataManager(str(tmp_path/"clo_data.json"),persistence,checkpoint_every)
+    saves=[]
+    save_data=dm.save_data
+    monkeypatch.setattr(dm,"save_data",lambda:saves.append(1) or save_data())
+    engine=run_with(deal,inputs,plan,sofr_paths[0],dm)
+    last_period=engine.dm.ledger.last_period()
+    expected=last_period//checkpoint_every+1 if writes is None else writes
+    assert len(saves)==expected
+    assert os.path.exists(tmp_path/"clo_data.json")==(expected>0)
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        CLODataManager(persistence="sometimes")
+    with pytest.raises(ValueError):
+        CLODataManager(checkpoint_every=0)
+
+
+def test_saved_state_reloads(deal,inputs,plan,sofr_paths,tmp_path):
+    engine=run_with(deal,inputs,plan,sofr_paths[0],CLODataManager(str(tmp_path/"clo_data.json")))
+    with open(tmp_path/"clo_data.json") as f:
+        saved=json.load(f)
+    assert saved["tranches"]==json.loads(json.dumps(engine.dm.data["tranches"].to_dict()))
+    assert len(saved["payment_history"])==len(engine.dm.ledger)
+
+
+def test_save_data_keeps_file_mode(deal,inputs,plan,sofr_paths,tmp_path,umask):
+    path=tmp_path/"clo_data.json"
+    run_with(deal,inputs,plan,sofr_paths[0],CLODataManager(str(path)))
+    assert stat.S_IMODE(os.stat(path).st_mode)==0o666 & ~umask
+    os.chmod(path,0o640)
+    run_with(deal,inputs,plan,sofr_paths[0],CLODataManager(str(path)))
+    assert stat.S_IMODE(os.stat(path).st_mode)==0o640
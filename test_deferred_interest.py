@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from batch_engine import BatchCashflowEngine
+from cash_flow_engine import DeferredInterestAccount, DEFERRED_INTEREST_PAID
+
+
+def test_account_accrue_and_pay_down():
+    account=DeferredInterestAccount(4)
+    account.accrue(2,100.0)
+    account.accrue(2,50.0)
+    account.pay_down(2,30.0)
+    assert account.balance_at(2)==120.0
+    assert account.balance_at(1)==0.0
+    assert account.balance_at(99)==0.0
+    account.pay_down(2,500.0)
+    assert account.balance_at(2)==0.0
+    assert [event["period"] for event in account]==[0,2]
+
+
+def test_account_grows_past_its_sizing():
+    account=DeferredInterestAccount(4)
+    account.accrue(10,7.0)
+    assert account.balance_at(10)==7.0
+    assert len(account.amounts)>10
+
+
+def test_stress_scenarios_complete(inputs,scenarios,sofr_paths,make_engine,run_engine):
+    for prepayment_rate,default_rate in scenarios:
+        cf_engine=make_engine(inputs,sofr_paths[0],prepayment_rate,default_rate)
+        run_engine(cf_engine)
+        assert cf_engine.dm.ledger.last_period()>0
+
+
+@pytest.mark.parametrize("carried",[1_000_000.0,0.0])
+def test_principal_pays_down_deferred_interest(deal,inputs,plan,sofr_paths,make_engine,carried):
+    period,previous,principal_received=20,1_000_000.0,5_000_000.0
+    tranche=plan.tranche_index["C"]
+    cf_engine=make_engine(inputs,sofr_paths[0])
+    cf_engine.start()
+    cf_engine.dm.add_deferred_interest(period-1,"C",previous)
+    cf_engine.dm.add_deferred_interest(period,"C",carried)
+    balance=cf_engine.dm.tranches.balances[tranche]
+    cf_engine.principal_engine.pay_principal_deferred_interest(period,"C","principal_deferred_interest",tranche,principal_received)
+
+    paid=previous/(balance+previous)*principal_received
+    ledger=cf_engine.dm.ledger
+    assert ledger.amounts[period,ledger.column_index[("C",DEFERRED_INTEREST_PAID)]]==pytest.approx(paid)
+    assert cf_engine.dm.deferred_interest_balance("C",period)==pytest.approx(max(carried-paid,0.0))
+
+    batch=BatchCashflowEngine(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],deal["coverage_test_info"],
+                              0.02,0.02,inputs,sofr_paths=sofr_paths[:1],plan=plan)
+    batch.deferred_interest[tranche,period-1]=previous
+    batch.deferred_interest[tranche,period]=carried
+    batch.distribute_principal_deferred_interest(period,"C","principal_deferred_interest",tranche,np.array([principal_received]),np.array([True]))
+    np.testing.assert_array_equal(batch.deferred_interest[tranche,period],[cf_engine.dm.deferred_interest_balance("C",period)])
+    np.testing.assert_array_equal(batch.payments[period,:,0],ledger.amounts[period])
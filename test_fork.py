@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+
+@pytest.mark.parametrize("with_tape",[False,True])
+def test_fork_matches_full_run(inputs,sofr_paths,loan_tape,make_engine,run_engine,assert_same_run,with_tape):
+    tape=loan_tape if with_tape else None
+    full=make_engine(inputs,sofr_paths[0],loan_tape=tape)
+    run_engine(full)
+
+    cf_engine=make_engine(inputs,sofr_paths[0],loan_tape=tape)
+    state=cf_engine.advance(16)
+    first=cf_engine.fork(state)
+    second=cf_engine.fork(state)
+    run_engine(first)
+    run_engine(second)
+    run_engine(cf_engine)
+    assert_same_run(first,full)
+    assert_same_run(second,full)
+    assert_same_run(cf_engine,full)
+
+    spliced=np.concatenate([sofr_paths[0][:16],sofr_paths[1][16:]])
+    expected=make_engine(inputs,spliced,loan_tape=tape)
+    run_engine(expected)
+    forked=make_engine(inputs,sofr_paths[0],loan_tape=tape).fork(state,sofr_path=sofr_paths[1])
+    run_engine(forked)
+    assert_same_run(forked,expected)
+
+
+def test_fork_keeps_the_shared_prefix(inputs,sofr_paths,make_engine,run_engine):
+    cf_engine=make_engine(inputs,sofr_paths[0])
+    state=cf_engine.advance(16)
+    prefix=state.data["payment_history"].amounts[:17].copy()
+    low=cf_engine.fork(state,default_rate=0.0)
+    high=cf_engine.fork(state,default_rate=0.08)
+    run_engine(low)
+    run_engine(high)
+    np.testing.assert_array_equal(low.dm.ledger.amounts[:17],prefix)
+    np.testing.assert_array_equal(high.dm.ledger.amounts[:17],prefix)
+    np.testing.assert_array_equal(state.data["payment_history"].amounts[:17],prefix)
+    assert not np.array_equal(low.dm.ledger.amounts[17:],high.dm.ledger.amounts[17:])
+
+
+def test_batch_continues_from_a_snapshot(inputs,sofr_paths,make_engine,make_batch,run_engine,assert_batch_matches):
+    cf_engine=make_engine(inputs,sofr_paths[0])
+    state=cf_engine.advance(16)
+    default_rates=[0.0,0.02,0.08]
+    forks=[cf_engine.fork(state,default_rate=default_rate) for default_rate in default_rates]
+    statuses=[run_engine(fork) for fork in forks]
+    batch=make_batch(inputs,[(0.02,default_rate) for default_rate in default_rates],None,state=state)
+    batch.run()
+    assert_batch_matches(batch,forks,statuses)
@@ -0,0 +1,101 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from job_server import LocalClient, job_key
+
+
+SEEDED={"default_rate":0.02,"prepayment_rate":0.02,"sofr_seed":7}
+
+
+class GatedExecutor(ThreadPoolExecutor):
+    """Thread pool whose jobs wait until ``gate`` is set, so tests control when runs finish"""
+    def __init__(self):
+        super().__init__(max_workers=4)
+        self.gate=threading.Event()
+
+    def submit(self,fn,*args,**kwargs):
+        return super().submit(self._gated,fn,*args,**kwargs)
+
+    def _gated(self,fn,*args,**kwargs):
+        self.gate.wait(30)
+        return fn(*args,**kwargs)
+
+
+@pytest.fixture
+def executor():
+    executor=GatedExecutor()
+    executor.gate.set()
+    yield executor
+    executor.gate.set()
+    executor.shutdown()
+
+
+def test_in_flight_requests_share_one_run(deal,executor):
+    executor.gate.clear()
+    with LocalClient(executor=executor) as client:
+        first=client.submit(deal,SEEDED)
+        second=client.submit(deal,dict(SEEDED))
+        other=client.submit(deal,dict(SEEDED,default_rate=0.03))
+        assert client.status(first)==client.status(second)=="pending"
+        assert client.server.stats["in_flight_hits"]==1
+        executor.gate.set()
+        results=[client.result(job) for job in (first,second,other)]
+        assert results[0]["summary"]==results[1]["summary"]
+        assert results[0]["summary"]!=results[2]["summary"]
+        assert client.server.stats["runs"]==2
+        assert client.server.jobs=={} and client.server.in_flight=={}
+
+
+def test_cache_hits_and_eviction(deal,executor):
+    with LocalClient(executor=executor,cache_size=2) as client:
+        a,b,c=SEEDED,dict(SEEDED,sofr_seed=8),dict(SEEDED,sofr_seed=9)
+        first=client.run(deal,a)
+        client.run(deal,b)
+        again=client.run(deal,a)
+        assert again["summary"]==first["summary"]
+        assert client.server.stats["cache_hits"]==1 and client.server.stats["runs"]==2
+
+        again["summary"]["status"]="edited"
+        assert client.run(deal,a)["summary"]==first["summary"]
+
+        client.run(deal,c)
+        assert len(client.server.cache)==2
+        client.run(deal,a)
+        assert client.server.stats["runs"]==3
+        client.run(deal,b)
+        assert client.server.stats["runs"]==4
+
+
+def test_results_release_their_job(deal,executor):
+    with LocalClient(executor=executor) as client:
+        job=client.submit(deal,SEEDED)
+        client.result(job)
+        assert client.server.jobs=={}
+        with pytest.raises(KeyError):
+            client.status(job)
+
+
+def test_random_sofr_bypasses_the_cache(deal,executor):
+    with LocalClient(executor=executor) as client:
+        scenario={"default_rate":0.02,"prepayment_rate":0.02}
+        client.run(deal,scenario)
+        client.run(deal,scenario)
+        stats=client.server.stats
+        assert stats["runs"]==2 and stats["cache_hits"]==0 and stats["in_flight_hits"]==0
+        assert len(client.server.cache)==0
+
+
+def test_job_key_reads_only_run_fields(deal,inputs):
+    key=job_key(deal,SEEDED,inputs)
+    assert job_key(deal,dict(SEEDED,label="ignored"),inputs)==key
+    assert job_key(deal,dict(SEEDED,sofr_seed=8),inputs)!=key
+    assert job_key(deal,dict(SEEDED,sofr_path=[0.05]*41),inputs)!=key
+    assert job_key(deal,SEEDED,dict(inputs,portfolio_was=3.0))!=key
+
+
+def test_missing_rates_are_rejected(deal,executor):
+    with LocalClient(executor=executor) as client:
+        with pytest.raises(ValueError):
+            client.submit(deal,{"default_rate":0.02})
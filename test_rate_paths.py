@@ -0,0 +1,71 @@
+from statistics import NormalDist
+
+import numpy as np
+import pytest
+
+from rate_paths import FlatShockModel, VasicekModel, SAMPLING_METHODS, generate_sofr_paths, sobol_uniforms, standard_normals, _inv_cdf
+
+
+MODELS=[FlatShockModel(),VasicekModel(),VasicekModel(kappa=0.0,forward_curve=(0.05,0.045,0.04))]
+
+
+class _NoShift:
+    def integers(self,low,high,size,dtype):
+        return np.zeros(size,dtype=dtype)
+
+
+@pytest.mark.parametrize("model",MODELS)
+@pytest.mark.parametrize("sampling",SAMPLING_METHODS)
+def test_seeded_paths_are_reproducible(model,sampling):
+    paths=generate_sofr_paths(64,41,model,seed=7,sampling=sampling)
+    assert paths.shape==(64,41)
+    np.testing.assert_array_equal(generate_sofr_paths(64,41,model,seed=7,sampling=sampling),paths)
+    np.testing.assert_array_equal(generate_sofr_paths(64,41,model,seed=np.random.default_rng(7),sampling=sampling),paths)
+    assert not np.array_equal(generate_sofr_paths(64,41,model,seed=8,sampling=sampling),paths)
+
+
+def test_antithetic_pairs_mirror():
+    shocks=standard_normals(7,5,np.random.default_rng(0),"antithetic")
+    assert shocks.shape==(7,5)
+    np.testing.assert_array_equal(shocks[4:],-shocks[:3])
+
+
+def test_sobol_points_without_shift():
+    points=sobol_uniforms(4,2,_NoShift())
+    np.testing.assert_allclose(points,[[0.0,0.0],[0.5,0.5],[0.75,0.25],[0.25,0.75]],atol=1e-8)
+
+
+def test_sobol_dimensions_are_stratified():
+    n=256
+    points=sobol_uniforms(n,40,np.random.default_rng(3))
+    for dim in range(points.shape[1]):
+        np.testing.assert_array_equal(np.sort(np.floor(points[:,dim]*n)),np.arange(n))
+
+
+def test_sobol_dimension_limit():
+    with pytest.raises(ValueError):
+        sobol_uniforms(4,1001,np.random.default_rng(0))
+
+
+def test_inv_cdf_matches_statistics():
+    p=np.concatenate([np.linspace(1e-12,1-1e-12,2001),[1e-300,0.02425,0.425,0.575,0.97575,1-1e-16]])
+    expected=[NormalDist().inv_cdf(value) for value in p]
+    np.testing.assert_allclose(_inv_cdf(p),expected,rtol=1e-14,atol=1e-14)
+
+
+def test_vasicek_without_volatility_follows_the_forward_curve():
+    model=VasicekModel(sigma=0.0,forward_curve=(0.05,0.045,0.04))
+    paths=generate_sofr_paths(3,6,model,seed=0)
+    np.testing.assert_allclose(paths,np.tile([0.05,0.045,0.04,0.04,0.04,0.04],(3,1)))
+
+
+def test_vasicek_reverts_to_the_forward():
+    model=VasicekModel(kappa=2.0,sigma=0.0,base_sofr=0.04,initial_rate=0.06)
+    path=generate_sofr_paths(1,9,model,seed=0)[0]
+    assert path[0]==0.06
+    np.testing.assert_allclose(path-0.04,0.02*np.exp(-2.0*np.arange(9)/4))
+
+
+def test_rates_respect_the_floor():
+    assert generate_sofr_paths(200,40,FlatShockModel(base_sofr=0.0025,vol=0.01),seed=0).min()>=0.002
+    assert generate_sofr_paths(200,40,VasicekModel(base_sofr=0.0025,sigma=0.05),seed=0).min()>=0.002
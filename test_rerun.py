@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from cash_flow_engine import CashflowEngine, CLODataManager
+
+
+@pytest.mark.parametrize("edit",[
+    {"inputs":{"reinvestment_period_end":12}},
+    {"inputs":{"portfolio_was":3.0}},
+    {"sofr":{25:0.08}},
+    {"default_rate":0.03},
+    {"prepayment_rate":0.1},
+    {},
+])
+def test_rerun_matches_fresh_run(inputs,sofr_paths,make_engine,run_engine,assert_same_run,edit):
+    base=make_engine(inputs,sofr_paths[0],record_states=True)
+    run_engine(base)
+    rerun=base.rerun(**edit)
+
+    path=np.array(sofr_paths[0])
+    for period,rate in edit.get("sofr",{}).items():
+        path[period-1]=rate
+    fresh=make_engine(dict(inputs,**edit.get("inputs",{})),path,edit.get("prepayment_rate",0.02),edit.get("default_rate",0.02))
+    run_engine(fresh)
+    assert_same_run(rerun,fresh)
+
+
+@pytest.mark.parametrize("column,required",[("O/C required",110.0),("I/C required",585.0)])
+def test_rerun_with_new_coverage_threshold(deal,inputs,sofr_paths,make_engine,run_engine,assert_same_run,column,required):
+    coverage_test_info=deal["coverage_test_info"].copy()
+    coverage_test_info.loc[2,column]=required
+    base=make_engine(inputs,sofr_paths[0],record_states=True)
+    run_engine(base)
+    first_period=base.first_affected_period(coverage_test_info=coverage_test_info)
+    rerun=base.rerun(coverage_test_info=coverage_test_info)
+
+    fresh=CashflowEngine(deal["tranche_info"],deal["interest_waterfall_info"],deal["principal_payment_waterfall"],coverage_test_info,
+                         CLODataManager(file_path=None),0.02,0.02,inputs,sofr_path=sofr_paths[0])
+    run_engine(fresh)
+    assert_same_run(rerun,fresh)
+    assert first_period>base.start_period
+    np.testing.assert_array_equal(fresh.dm.ledger.amounts[:first_period],base.dm.ledger.amounts[:first_period])
+    assert not np.array_equal(fresh.dm.ledger.amounts,base.dm.ledger.amounts)
+
+
+def test_first_affected_period(inputs,sofr_paths,make_engine,run_engine):
+    base=make_engine(inputs,sofr_paths[0],record_states=True)
+    run_engine(base)
+    start=base.start_period
+    assert base.first_affected_period() is None
+    assert base.first_affected_period(sofr={25:0.08})==25
+    assert base.first_affected_period(sofr={25:float(base.dm.data["sofr"][24])}) is None
+    assert base.first_affected_period(inputs={"reinvestment_period_end":12})==13
+    assert base.first_affected_period(prepayment_rate=0.1)==inputs["reinvestment_period_end"]+1
+    assert base.first_affected_period(default_rate=0.03)==start
+    assert base.first_affected_period(inputs={"run_date":"15/06/2025"})==start
+
+
+def test_reruns_chain(inputs,sofr_paths,make_engine,run_engine,assert_same_run):
+    base=make_engine(inputs,sofr_paths[0],record_states=True)
+    run_engine(base)
+    chained=base.rerun(sofr={25:0.08}).rerun(inputs={"reinvestment_period_end":20})
+    path=np.array(sofr_paths[0])
+    path[24]=0.08
+    fresh=make_engine(dict(inputs,reinvestment_period_end=20),path)
+    run_engine(fresh)
+    assert_same_run(chained,fresh)
+
+
+def test_rerun_without_states_runs_from_the_start(inputs,sofr_paths,make_engine,run_engine,assert_same_run):
+    base=make_engine(inputs,sofr_paths[0])
+    run_engine(base)
+    fresh=make_engine(inputs,sofr_paths[0],default_rate=0.03)
+    run_engine(fresh)
+    assert_same_run(base.rerun(default_rate=0.03),fresh)